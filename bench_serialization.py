@@ -0,0 +1,102 @@
+"""Benchmark the response_model serialization path against the orjson fast path.
+
+Builds in-memory ORM objects (no database or server needed) and times how long
+each path takes to turn them into a response body.
+
+    python bench_serialization.py
+"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from database import Run
+from schemas import RunResponse, RunSummary
+from serialization import json_response, run_to_dict
+
+MESSAGE_TEXT = (
+    "Thank you both for sharing. It sounds like there is a lot of frustration "
+    "about how decisions get made, and a shared wish to feel heard. "
+) * 6
+
+def make_run(message_count: int) -> Run:
+    started = datetime.utcnow()
+    return Run(
+        id=uuid.uuid4(),
+        scenario_id=uuid.uuid4(),
+        timestamp=started,
+        starred=False,
+        status="completed",
+        log=[
+            {
+                "speaker": "AI" if index % 2 else f"Participant {index}",
+                "content": MESSAGE_TEXT,
+                "timestamp": (started + timedelta(seconds=index)).isoformat(),
+            }
+            for index in range(message_count)
+        ],
+    )
+
+def make_summaries(count: int) -> List[dict]:
+    return [
+        {
+            "id": uuid.uuid4(),
+            "scenario_id": uuid.uuid4(),
+            "timestamp": datetime.utcnow(),
+            "starred": index % 7 == 0,
+            "status": "completed",
+            "scenario_name": f"Scenario {index}",
+        }
+        for index in range(count)
+    ]
+
+def time_call(function, repeat: int) -> float:
+    """Best-of-three average seconds per call"""
+    best = float("inf")
+    for _ in range(3):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            function()
+        best = min(best, (time.perf_counter() - started) / repeat)
+    return best
+
+_loop = asyncio.new_event_loop()
+
+def response_model_body(field, content) -> bytes:
+    """What FastAPI does for a route that returns `content` with a response_model"""
+    serialized = _loop.run_until_complete(serialize_response(field=field, response_content=content))
+    return JSONResponse(content=serialized).body
+
+def report(label: str, baseline: float, fast: float, size: int):
+    print(
+        f"{label:<32} {baseline * 1000:>10.2f} ms {fast * 1000:>10.2f} ms "
+        f"{baseline / fast:>8.1f}x {size / 1024:>10.0f} KiB"
+    )
+
+def main():
+    run_field = create_model_field("response", RunResponse)
+    summaries_field = create_model_field("response", List[RunSummary])
+
+    print(f"{'payload':<32} {'response_model':>13} {'orjson':>13} {'speedup':>9} {'body size':>14}")
+
+    for message_count in (10, 100, 1000, 5000):
+        run = make_run(message_count)
+        repeat = max(3, 2000 // message_count)
+        baseline = time_call(lambda: response_model_body(run_field, run), repeat)
+        fast = time_call(lambda: json_response(run_to_dict(run)).body, repeat)
+        report(f"GET /runs/{{id}} ({message_count} messages)", baseline, fast, len(json_response(run_to_dict(run)).body))
+
+    for run_count in (100, 1000, 10000):
+        summaries = make_summaries(run_count)
+        repeat = max(3, 20000 // run_count)
+        baseline = time_call(lambda: response_model_body(summaries_field, summaries), repeat)
+        fast = time_call(lambda: json_response(summaries).body, repeat)
+        report(f"GET /runs ({run_count} runs)", baseline, fast, len(json_response(summaries).body))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are written without it
+    brotli = None
+
+# Static asset build.
+#
+#   python build_static.py
+#
+# Minifies the scripts and stylesheets in static/, names each copy after a
+# hash of its content (app.3f9c2e1a7b.js) and writes gzip and, when the
+# brotli package is installed, brotli variants next to it in static/dist/.
+# index.html is rewritten to reference the fingerprinted names. A changed
+# file gets a new name, so browsers may cache the fingerprinted files
+# forever; index.html itself is always revalidated (see static_assets.py).
+#
+# The minifiers are deliberately conservative: they drop comments and
+# indentation but keep line breaks and the contents of strings, template
+# literals and regular expressions, so the output behaves exactly like the
+# source.
+
+STATIC_DIR = "static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+
+# Characters after which a "/" starts a regular expression rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw"}
+
+def _skip_quoted(source: str, start: int, quote: str) -> int:
+    """Index just past the string or regex literal that opens at `start`"""
+    i = start + 1
+    in_class = False
+    while i < len(source):
+        char = source[i]
+        if char == "\\":
+            i += 2
+            continue
+        if quote == "/" and char == "[":
+            in_class = True
+        elif quote == "/" and char == "]":
+            in_class = False
+        elif char == quote and not in_class:
+            return i + 1
+        elif char == "\n" and quote != "`":
+            break  # Unterminated; leave the rest of the line untouched
+        i += 1
+    return i
+
+def _previous_word(out: list) -> str:
+    text = "".join(out[-12:]).rstrip()
+    match = re.search(r"[A-Za-z_$][\w$]*$", text)
+    return match.group(0) if match else ""
+
+def minify_js(source: str) -> str:
+    """Drop comments, indentation and blank lines outside literals"""
+    out = []
+    braces = []  # For each open "{": whether it opened a ${...} substitution
+    i = 0
+    while i < len(source):
+        char = source[i]
+        following = source[i + 1] if i + 1 < len(source) else ""
+
+        if char == "/" and following == "/":
+            while i < len(source) and source[i] != "\n":
+                i += 1
+        elif char == "/" and following == "*":
+            end = source.find("*/", i + 2)
+            i = len(source) if end == -1 else end + 2
+            out.append(" ")
+        elif char in "'\"":
+            end = _skip_quoted(source, i, char)
+            out.append(source[i:end])
+            i = end
+        elif char == "/":
+            last = "".join(out[-20:]).rstrip()[-1:]
+            if last in _REGEX_PRECEDERS or _previous_word(out) in _REGEX_KEYWORDS:
+                end = _skip_quoted(source, i, "/")
+                while end < len(source) and source[end].isalpha():
+                    end += 1  # Flags
+                out.append(source[i:end])
+                i = end
+            else:
+                out.append(char)
+                i += 1
+        elif char == "`" or (char == "}" and braces and braces[-1]):
+            # Template literal text, up to its end or the next ${ substitution
+            if char == "}":
+                braces.pop()
+            out.append(char)
+            i += 1
+            while i < len(source):
+                if source[i] == "\\":
+                    out.append(source[i:i + 2])
+                    i += 2
+                elif source[i] == "`":
+                    out.append("`")
+                    i += 1
+                    break
+                elif source.startswith("${", i):
+                    out.append("${")
+                    braces.append(True)
+                    i += 2
+                    break
+                else:
+                    out.append(source[i])
+                    i += 1
+        elif char.isspace():
+            end = i
+            while end < len(source) and source[end].isspace():
+                end += 1
+            newline = "\n" in source[i:end]
+            # Line breaks are kept so automatic semicolon insertion is unaffected
+            if out and not out[-1].endswith("\n"):
+                out.append("\n" if newline else " ")
+            i = end
+        else:
+            if char == "{":
+                braces.append(False)
+            elif char == "}" and braces:
+                braces.pop()
+            out.append(char)
+            i += 1
+    return "".join(out).strip() + "\n"
+
+def minify_css(source: str) -> str:
+    """Drop comments and whitespace that does not separate tokens"""
+    parts = re.split(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')", source)
+    for index in range(0, len(parts), 2):  # Even parts are outside strings
+        text = re.sub(r"/\*.*?\*/", "", parts[index], flags=re.DOTALL)
+        text = re.sub(r"\s+", " ", text)
+        text = re.sub(r"\s*([{};,>])\s*", r"\1", text)
+        text = re.sub(r":\s+", ":", text)  # Spaces before ":" can be selector combinators
+        parts[index] = text.replace(";}", "}")
+    return "".join(parts).strip() + "\n"
+
+def fingerprint(name: str, content: bytes) -> str:
+    stem, extension = os.path.splitext(name)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{extension}"
+
+def write_asset(path: str, content: bytes) -> dict:
+    """Write a file with its precompressed variants; returns the sizes written"""
+    sizes = {"raw": len(content)}
+    with open(path, "wb") as asset_file:
+        asset_file.write(content)
+    compressed = gzip.compress(content, compresslevel=9, mtime=0)
+    with open(path + ".gz", "wb") as asset_file:
+        asset_file.write(compressed)
+    sizes["gzip"] = len(compressed)
+    if brotli is not None:
+        compressed = brotli.compress(content, quality=11)
+        with open(path + ".br", "wb") as asset_file:
+            asset_file.write(compressed)
+        sizes["br"] = len(compressed)
+    return sizes
+
+def build(static_dir: str = STATIC_DIR, dist_dir: str = DIST_DIR) -> dict:
+    """Build static/dist from static/ and return the manifest (source name -> fingerprinted name)"""
+    if os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for name in sorted(os.listdir(static_dir)):
+        minify = {".js": minify_js, ".css": minify_css}.get(os.path.splitext(name)[1])
+        if minify is None:
+            continue
+        with open(os.path.join(static_dir, name), encoding="utf-8") as source_file:
+            content = minify(source_file.read()).encode("utf-8")
+        manifest[name] = fingerprint(name, content)
+        sizes = write_asset(os.path.join(dist_dir, manifest[name]), content)
+        print(f"   {name} -> dist/{manifest[name]}  {_format_sizes(sizes)}")
+
+    with open(os.path.join(static_dir, "index.html"), encoding="utf-8") as index_file:
+        index = index_file.read()
+    for name, built_name in manifest.items():
+        index = index.replace(f'"/static/{name}"', f'"/static/dist/{built_name}"')
+    sizes = write_asset(os.path.join(dist_dir, "index.html"), index.encode("utf-8"))
+    print(f"   index.html -> dist/index.html  {_format_sizes(sizes)}")
+
+    # Written last: its presence marks a complete build
+    with open(os.path.join(dist_dir, MANIFEST_NAME), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    return manifest
+
+def _format_sizes(sizes: dict) -> str:
+    return ", ".join(f"{kind} {size / 1024:.1f} KiB" for kind, size in sizes.items())
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build fingerprinted, precompressed static assets")
+    parser.add_argument("--static-dir", default=STATIC_DIR, help="Source directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    print(f"📦 Building {args.static_dir}/dist")
+    if brotli is None:
+        print("   brotli is not installed; writing gzip variants only (pip install brotli)")
+    build(args.static_dir, os.path.join(args.static_dir, "dist"))
+    print("✅ Build complete")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,178 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+# Record/replay of LLM traffic.
+#
+# LLM_CASSETTE_MODE
+#   off      (default) every request goes to the provider
+#   record   requests go to the provider and each request/response pair is
+#            appended to the cassette
+#   replay   requests are answered from the cassette without network access
+# LLM_CASSETTE_MISS (replay mode, when no recording matches a request)
+#   error    (default) fail the request with CassetteMiss
+#   passthrough  call the provider without recording
+#   record   call the provider and add the pair to the cassette
+#
+# A cassette is a gzipped JSON-lines file, LLM_CASSETTE_DIR/LLM_CASSETTE_NAME.jsonl.gz,
+# with one {"key", "request", "response"} record per call. Requests are matched
+# on a hash of everything sent to the model (model, messages, temperature,
+# max_tokens). Repeated identical requests are replayed in recording order,
+# cycling, so sampled runs recorded several times replay their variety.
+# Streaming and non-streaming requests share recordings: a response is stored
+# as its list of text chunks.
+
+CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off")
+CASSETTE_MISS = os.getenv("LLM_CASSETTE_MISS", "error")
+CASSETTE_DIR = os.getenv("LLM_CASSETTE_DIR", "cassettes")
+CASSETTE_NAME = os.getenv("LLM_CASSETTE_NAME", "default")
+
+MATCHED_FIELDS = ("model", "messages", "temperature", "max_tokens")
+
+class CassetteMiss(Exception):
+    """Replay mode found no recording for a request"""
+
+def request_key(request: Dict[str, Any]) -> str:
+    matched = {field: request.get(field) for field in MATCHED_FIELDS}
+    payload = json.dumps(matched, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class Cassette:
+    """Recorded LLM request/response pairs, loaded lazily from one file"""
+
+    def __init__(self, path: str, mode: str = "off", miss: str = "error"):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"Unknown LLM_CASSETTE_MODE: {mode}")
+        if miss not in ("error", "passthrough", "record"):
+            raise ValueError(f"Unknown LLM_CASSETTE_MISS: {miss}")
+        self.path = path
+        self.mode = mode
+        self.miss = miss
+
+        self._recordings: Dict[str, List[List[str]]] = defaultdict(list)
+        self._next: Dict[str, int] = defaultdict(int)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        with gzip.open(self.path, "rt", encoding="utf-8") as cassette_file:
+            for line in cassette_file:
+                if line.strip():
+                    record = json.loads(line)
+                    self._recordings[record["key"]].append(record["response"]["chunks"])
+
+    def _lookup(self, key: str):
+        """Next recorded chunks for a request key, or None"""
+        self._load()
+        recordings = self._recordings.get(key)
+        if not recordings:
+            return None
+        index = self._next[key] % len(recordings)
+        self._next[key] += 1
+        return recordings[index]
+
+    def _record(self, key: str, request: Dict[str, Any], chunks: List[str]):
+        record = {
+            "key": key,
+            "request": {field: request.get(field) for field in MATCHED_FIELDS},
+            "response": {"chunks": chunks},
+        }
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Each append adds a gzip member; readers see the members as one stream
+            with gzip.open(self.path, "at", encoding="utf-8") as cassette_file:
+                cassette_file.write(line)
+            self._load()
+            self._recordings[key].append(chunks)
+            self.recorded += 1
+
+    def _should_record(self, replaying_miss: bool) -> bool:
+        return self.mode == "record" or (replaying_miss and self.miss == "record")
+
+    def _replay_or_miss(self, key: str):
+        """Recorded chunks in replay mode; None means call the provider"""
+        if self.mode != "replay":
+            return None
+        chunks = self._lookup(key)
+        if chunks is not None:
+            self.hits += 1
+            return chunks
+        self.misses += 1
+        if self.miss == "error":
+            raise CassetteMiss(f"No recording matches this request (key {key[:12]}) in {self.path}")
+        return None
+
+    async def complete(self, request: Dict[str, Any], call: Callable[[Dict[str, Any]], Awaitable[str]]) -> str:
+        """Answer a non-streaming request from the cassette or via `call`, recording as configured"""
+        if not self.enabled:
+            return await call(request)
+
+        key = request_key(request)
+        chunks = self._replay_or_miss(key)
+        if chunks is not None:
+            return "".join(chunks)
+
+        content = await call(request)
+        if self._should_record(self.mode == "replay"):
+            self._record(key, request, [content])
+        return content
+
+    async def stream(
+        self,
+        request: Dict[str, Any],
+        call: Callable[[Dict[str, Any]], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """Stream a response from the cassette or via `call`; only complete streams are recorded"""
+        if not self.enabled:
+            async for delta in call(request):
+                yield delta
+            return
+
+        key = request_key(request)
+        chunks = self._replay_or_miss(key)
+        if chunks is not None:
+            for delta in chunks:
+                yield delta
+            return
+
+        received = []
+        async for delta in call(request):
+            received.append(delta)
+            yield delta
+        if self._should_record(self.mode == "replay"):
+            self._record(key, request, received)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "miss": self.miss,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+# Global cassette used by the simulation engine
+llm_cassette = Cassette(
+    os.path.join(CASSETTE_DIR, f"{CASSETTE_NAME}.jsonl.gz"),
+    mode=CASSETTE_MODE,
+    miss=CASSETTE_MISS
+)
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable
+import uuid
+
+from sqlalchemy import func, insert, text
+from sqlalchemy.orm import Session
+
+from database import Run, RunChange
+
+# Run change feed.
+#
+# Every write that changes what the history list shows (a run saved, starred,
+# scored or deleted) records the run in run_changes with a new sequence
+# number, replacing the run's previous entry; deletions are kept as
+# tombstones. A client that remembers the highest sequence number it has seen
+# asks for the changes after it and receives only the runs that changed since.
+#
+# On PostgreSQL, sequence numbers are handed out under a transaction-level
+# advisory lock, so they become visible in order: a reader never sees change
+# n+1 while change n is still uncommitted (and would skip it). SQLite
+# serializes writers anyway.
+
+CHANGE_LOCK_KEY = 7340046
+
+def record_run_changes(db: Session, run_ids: Iterable[uuid.UUID], deleted: bool = False):
+    """Record that runs changed (or were deleted); committed with the caller's transaction"""
+    run_ids = list(run_ids)
+    if not run_ids:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CHANGE_LOCK_KEY})
+
+    now = datetime.utcnow()
+    db.query(RunChange).filter(RunChange.run_id.in_(run_ids)).delete(synchronize_session=False)
+    db.execute(insert(RunChange), [{"run_id": run_id, "deleted": deleted, "changed_at": now} for run_id in run_ids])
+
+def changes_since(db: Session, since: int, limit: int) -> Dict[str, Any]:
+    """Run IDs changed and deleted after sequence number `since`, oldest change first
+
+    `version` is the sequence number to pass as `since` next time. `reset`
+    means `since` is ahead of this database (it was replaced or restored), so
+    the client should drop what it has and start again from 0.
+    """
+    latest = db.query(func.max(RunChange.seq)).scalar() or 0
+    if since > latest:
+        return {"version": latest, "reset": True, "changed": [], "deleted": [], "has_more": False}
+
+    rows = (
+        db.query(RunChange.seq, RunChange.run_id, RunChange.deleted)
+        .filter(RunChange.seq > since)
+        .order_by(RunChange.seq)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "version": rows[-1][0] if rows else since,
+        "reset": False,
+        "changed": [run_id for _, run_id, deleted in rows if not deleted],
+        "deleted": [run_id for _, run_id, deleted in rows if deleted],
+        "has_more": has_more,
+    }
+
+def ensure_run_changes(db: Session):
+    """Record the runs that have no entry in the feed, e.g. saved before it existed"""
+    recorded = db.query(RunChange.run_id)
+    run_ids = [
+        run_id for (run_id,) in db.query(Run.id).filter(Run.id.not_in(recorded)).order_by(Run.timestamp, Run.id)
+    ]
+    for start in range(0, len(run_ids), 500):
+        record_run_changes(db, run_ids[start:start + 500])
+    db.commit()
@@ -0,0 +1,137 @@
+import difflib
+import re
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Iterable
+import uuid
+
+from database import Run
+from token_budget import count_tokens
+
+# Number of comparison results kept in memory
+COMPARISON_CACHE_SIZE = 128
+
+_WORD_PATTERN = re.compile(r"\S+")
+
+class ComparisonCache:
+    """LRU cache of comparison results keyed by the set of run ids.
+
+    Run logs never change after they are written, so an entry stays valid
+    until one of its runs is deleted.
+    """
+
+    def __init__(self, max_entries: int = COMPARISON_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[frozenset, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, run_ids: Iterable[uuid.UUID]):
+        key = frozenset(run_ids)
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+        return result
+
+    def put(self, run_ids: Iterable[uuid.UUID], result: Dict[str, Any]):
+        key = frozenset(run_ids)
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_run(self, run_id: uuid.UUID):
+        """Drop every cached comparison that includes the given run"""
+        for key in [key for key in self._entries if run_id in key]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+def estimate_tokens(text: str) -> int:
+    """Token count (tiktoken when installed, otherwise ~4 characters per token)"""
+    return count_tokens(text)
+
+def compare_runs(runs: List[Run]) -> Dict[str, Any]:
+    """Compare the logs of several runs.
+
+    Runs are ordered oldest first and the oldest run is the baseline that
+    every other mediator response is diffed against.
+    """
+    runs = sorted(runs, key=lambda run: (run.timestamp, str(run.id)))
+    baseline = runs[0]
+
+    return {
+        "run_ids": [run.id for run in runs],
+        "baseline_run_id": baseline.id,
+        "aligned_messages": _align_messages(runs),
+        "mediator_diffs": [
+            _diff_mediator_responses(baseline, run) for run in runs[1:]
+        ],
+        "run_stats": [_run_stats(run) for run in runs],
+    }
+
+def _align_messages(runs: List[Run]) -> List[Dict[str, Any]]:
+    """Align messages across runs by speaker and turn.
+
+    The n-th message of a speaker in one run lines up with the n-th message
+    of the same speaker in every other run, in order of first appearance.
+    """
+    slots: "OrderedDict[Tuple[str, int], Dict[str, Any]]" = OrderedDict()
+
+    for run_index, run in enumerate(runs):
+        seen: Dict[str, int] = {}
+        for message in run.log:
+            speaker = message["speaker"]
+            turn = seen.get(speaker, 0)
+            seen[speaker] = turn + 1
+
+            slot = slots.get((speaker, turn))
+            if slot is None:
+                slot = {"speaker": speaker, "turn": turn, "contents": [None] * len(runs)}
+                slots[(speaker, turn)] = slot
+            slot["contents"][run_index] = message["content"]
+
+    aligned = []
+    for slot in slots.values():
+        present = [content for content in slot["contents"] if content is not None]
+        slot["identical"] = len(present) == len(runs) and len(set(present)) == 1
+        aligned.append(slot)
+    return aligned
+
+def _mediator_text(run: Run) -> str:
+    return "\n\n".join(
+        message["content"] for message in run.log if message["speaker"] == "AI"
+    )
+
+def _diff_mediator_responses(baseline: Run, run: Run) -> Dict[str, Any]:
+    """Word-level diff of a run's mediator response against the baseline"""
+    baseline_words = _WORD_PATTERN.findall(_mediator_text(baseline))
+    run_words = _WORD_PATTERN.findall(_mediator_text(run))
+
+    matcher = difflib.SequenceMatcher(None, baseline_words, run_words, autojunk=False)
+    operations = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        operations.append({
+            "op": tag,
+            "baseline": " ".join(baseline_words[i1:i2]),
+            "other": " ".join(run_words[j1:j2]),
+        })
+
+    return {
+        "run_id": run.id,
+        "similarity": round(matcher.ratio(), 4),
+        "operations": operations,
+    }
+
+def _run_stats(run: Run) -> Dict[str, Any]:
+    mediator_text = _mediator_text(run)
+    return {
+        "run_id": run.id,
+        "timestamp": run.timestamp,
+        "message_count": len(run.log),
+        "mediator_characters": len(mediator_text),
+        "mediator_words": len(_WORD_PATTERN.findall(mediator_text)),
+        "mediator_tokens": estimate_tokens(mediator_text),
+        "total_tokens": sum(estimate_tokens(message["content"]) for message in run.log),
+    }
+
+# Global comparison cache instance
+comparison_cache = ComparisonCache()
@@ -0,0 +1,350 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Run, RunScore
+from changes import record_run_changes
+from scheduler import simulation_scheduler
+from simulation import simulation_engine
+
+# Post-run evaluation.
+#
+# Every saved run is scored by each enabled scorer after it is persisted, off
+# the request path: save_run hands the run ID to the pipeline, whose workers
+# score it in the background. Rule scorers are local functions of the
+# conversation log; LLM judges ask a model for a rating and are only enabled
+# when listed in EVAL_LLM_JUDGES, since every run then costs extra requests.
+#
+# A score is stored per (run, scorer, version) in run_scores, written in the
+# run writer's batches (see run_writer.py), and never recomputed. Bumping a scorer's version makes it score every run again: on
+# startup the pipeline sweeps for runs missing a score from any enabled scorer
+# version, which also picks up runs saved while it was not running.
+#
+# A run whose scorer fails (e.g. the judge model is unreachable) is queued
+# again after EVAL_RETRY_DELAY_SECONDS, doubling for each further failure, up
+# to EVAL_MAX_RETRIES times. After that it stays unscored until the next
+# startup sweep.
+
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "2"))  # 0 disables the pipeline
+EVAL_LLM_JUDGES = [name for name in os.getenv("EVAL_LLM_JUDGES", "").split(",") if name]
+EVAL_JUDGE_MODEL = os.getenv("EVAL_JUDGE_MODEL", "gpt-4o-mini")
+EVAL_MAX_RETRIES = int(os.getenv("EVAL_MAX_RETRIES", "3"))
+EVAL_RETRY_DELAY_SECONDS = float(os.getenv("EVAL_RETRY_DELAY_SECONDS", "30"))
+
+QUEUE_SIZE = 1000
+SWEEP_PAGE_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Scorer:
+    name: str
+    version: int  # Bump when the scoring logic changes
+    kind: str  # "rule" (sync function) or "llm" (coroutine function)
+    description: str
+    score: Callable[..., Any]  # (conversation_log, scenario) -> (value, details)
+
+SCORERS: Dict[str, Scorer] = {}
+
+def scorer(name: str, version: int, description: str, kind: str = "rule"):
+    """Register a scorer; rule scorers are functions, LLM scorers coroutine functions"""
+    def register(score: Callable[..., Any]):
+        SCORERS[name] = Scorer(name, version, kind, description, score)
+        return score
+    return register
+
+def enabled_scorers() -> List[Scorer]:
+    return [s for s in SCORERS.values() if s.kind == "rule" or s.name in EVAL_LLM_JUDGES]
+
+def _mediator_replies(conversation_log: List[Dict[str, Any]]) -> List[str]:
+    return [message["content"] for message in conversation_log if message["speaker"] == "AI"]
+
+_WORD_PATTERN = re.compile(r"[A-Za-z']+")
+
+@scorer("reply_length", 1, "Average words per mediator reply")
+def score_reply_length(conversation_log, scenario):
+    replies = _mediator_replies(conversation_log)
+    words = sum(len(_WORD_PATTERN.findall(reply)) for reply in replies)
+    return (words / len(replies) if replies else 0.0), {"replies": len(replies), "words": words}
+
+@scorer("question_count", 1, "Questions the mediator asks, across all replies")
+def score_question_count(conversation_log, scenario):
+    replies = _mediator_replies(conversation_log)
+    questions = sum(len(re.findall(r"[^.!?]*\?", reply)) for reply in replies)
+    return float(questions), {"replies": len(replies)}
+
+# Judgmental or absolute wording a neutral mediator avoids
+NEUTRALITY_LEXICON = [
+    "wrong", "fault", "blame", "should have", "shouldn't have", "ridiculous", "obviously",
+    "clearly", "always", "never", "lazy", "selfish", "unreasonable", "irrational", "stupid",
+    "crazy", "overreacting", "dramatic", "you must", "you need to", "no excuse", "childish",
+]
+_NEUTRALITY_PATTERN = re.compile(r"\b(" + "|".join(re.escape(term) for term in NEUTRALITY_LEXICON) + r")\b", re.IGNORECASE)
+
+@scorer("neutrality", 1, "1.0 minus 0.25 per loaded term per 100 words of mediator text (floor 0)")
+def score_neutrality(conversation_log, scenario):
+    text = " ".join(_mediator_replies(conversation_log))
+    words = len(_WORD_PATTERN.findall(text))
+    terms = [match.lower() for match in _NEUTRALITY_PATTERN.findall(text)]
+    per_hundred = len(terms) * 100 / words if words else 0.0
+    return max(0.0, 1.0 - 0.25 * per_hundred), {"terms": sorted(set(terms)), "hits": len(terms), "words": words}
+
+@scorer("addresses_participants", 1, "Share of participants the mediator mentions by name")
+def score_addresses_participants(conversation_log, scenario):
+    text = " ".join(_mediator_replies(conversation_log)).lower()
+    names = [participant["name"] for participant in scenario["participants"]]
+    missing = [name for name in names if name.lower() not in text]
+    return ((len(names) - len(missing)) / len(names) if names else 1.0), {"missing": missing}
+
+JUDGE_PROMPT = (
+    "You evaluate an AI mediator in a group conversation. Rate how well the mediator's "
+    "replies stay neutral, acknowledge every participant and move the conversation forward, "
+    "from 1 (poor) to 10 (excellent). Answer with JSON only: "
+    '{"score": <1-10>, "reason": "<one sentence>"}'
+)
+
+@scorer("judge_mediation", 1, "LLM-rated mediation quality, 1-10", kind="llm")
+async def judge_mediation(conversation_log, scenario):
+    transcript = "\n\n".join(
+        f"{'MEDIATOR' if message['speaker'] == 'AI' else message['speaker']}: {message['content']}"
+        for message in conversation_log
+    )
+    messages = [
+        {"role": "system", "content": JUDGE_PROMPT},
+        {"role": "user", "content": f"Mediator instructions:\n{scenario['system_prompt']}\n\nConversation:\n{transcript}"},
+    ]
+    settings = {"model": EVAL_JUDGE_MODEL, "temperature": 0, "max_tokens": 150, "budget_strategy": "truncate"}
+
+    # Judging is background work: it queues behind interactive simulations
+    async with simulation_scheduler.slot("bulk"):
+        reply = await simulation_engine.complete(messages, settings)
+
+    match = re.search(r"\{.*\}", reply, re.DOTALL)
+    if match is None:
+        raise ValueError(f"Judge reply is not JSON: {reply[:100]}")
+    verdict = json.loads(match.group(0))
+    return float(min(10, max(1, verdict["score"]))), {"reason": verdict.get("reason"), "model": EVAL_JUDGE_MODEL}
+
+def _run_rule_scorers(scorers: List[Scorer], conversation_log, scenario) -> List[Tuple[Scorer, Any]]:
+    results = []
+    for rule in scorers:
+        try:
+            results.append((rule, rule.score(conversation_log, scenario)))
+        except Exception as e:
+            results.append((rule, e))
+    return results
+
+def current_scores(db: Session, run_ids: List[uuid.UUID]) -> Dict[uuid.UUID, Dict[str, float]]:
+    """Values from the enabled scorer versions, per run; runs not scored yet map to {}"""
+    scores: Dict[uuid.UUID, Dict[str, float]] = {run_id: {} for run_id in run_ids}
+    versions = {s.name: s.version for s in enabled_scorers()}
+    if not run_ids or not versions:
+        return scores
+    rows = db.query(RunScore.run_id, RunScore.scorer, RunScore.version, RunScore.value).filter(
+        RunScore.run_id.in_(run_ids), RunScore.scorer.in_(list(versions))
+    ).all()
+    for run_id, name, version, value in rows:
+        if versions[name] == version:
+            scores[run_id][name] = value
+    return scores
+
+def list_run_scores(db: Session, run_id: uuid.UUID) -> List[RunScore]:
+    """Stored scores of a run from the enabled scorer versions"""
+    versions = {s.name: s.version for s in enabled_scorers()}
+    rows = db.query(RunScore).filter(RunScore.run_id == run_id).order_by(RunScore.scorer).all()
+    return [row for row in rows if versions.get(row.scorer) == row.version]
+
+class EvaluationPipeline:
+    """Scores saved runs in the background with a pool of `concurrency` workers"""
+
+    def __init__(self, concurrency: int = EVAL_WORKERS):
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._overflowed = asyncio.Event()
+        self._retries: Dict[uuid.UUID, int] = {}  # Failed attempts per run awaiting a retry
+        self._retry_tasks: Set[asyncio.Task] = set()
+        self.evaluated = 0
+        self.failed = 0
+
+    def start(self):
+        if self.concurrency <= 0 or self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._sweep_loop()))
+
+    async def stop(self):
+        tasks = self._tasks + list(self._retry_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._retry_tasks.clear()
+        self._retries.clear()
+        self._queue = None
+
+    def submit(self, run_id: uuid.UUID):
+        """Queue a newly saved run for scoring; never blocks the caller"""
+        if self._queue is None:
+            return  # Not running; the startup sweep scores it later
+        try:
+            self._queue.put_nowait(run_id)
+        except asyncio.QueueFull:
+            self._overflowed.set()  # Picked up by the next sweep instead
+
+    def _retry_later(self, run_id: uuid.UUID):
+        """Queue a run with a failed scorer again after a backoff, or give up on it"""
+        if self._queue is None:
+            return
+        attempt = self._retries.get(run_id, 0) + 1
+        if attempt > EVAL_MAX_RETRIES:
+            self._retries.pop(run_id, None)
+            logger.warning("Giving up on scoring run %s after %d retries; the next startup sweep tries again", run_id, EVAL_MAX_RETRIES)
+            return
+        self._retries[run_id] = attempt
+        task = asyncio.create_task(self._resubmit(run_id, EVAL_RETRY_DELAY_SECONDS * 2 ** (attempt - 1)))
+        self._retry_tasks.add(task)
+        task.add_done_callback(self._retry_tasks.discard)
+
+    async def _resubmit(self, run_id: uuid.UUID, delay: float):
+        await asyncio.sleep(delay)
+        self.submit(run_id)
+
+    async def _sweep_loop(self):
+        while True:
+            self._overflowed.clear()
+            await self._sweep()
+            await self._overflowed.wait()
+
+    async def _sweep(self):
+        """Queue every run that lacks a score from an enabled scorer version, oldest first"""
+        scorers = enabled_scorers()
+        if not scorers:
+            return
+        current = or_(*(and_(RunScore.scorer == s.name, RunScore.version == s.version) for s in scorers))
+        fully_scored = (
+            select(RunScore.run_id).where(current)
+            .group_by(RunScore.run_id).having(func.count() == len(scorers))
+        )
+
+        after: Optional[Tuple[datetime, uuid.UUID]] = None
+        while True:
+            db = SessionLocal()
+            try:
+                query = db.query(Run.id, Run.timestamp).filter(Run.id.not_in(fully_scored))
+                if after is not None:
+                    query = query.filter(or_(Run.timestamp > after[0], and_(Run.timestamp == after[0], Run.id > after[1])))
+                page = query.order_by(Run.timestamp, Run.id).limit(SWEEP_PAGE_SIZE).all()
+            finally:
+                db.close()
+
+            for run_id, _ in page:
+                await self._queue.put(run_id)
+            if len(page) < SWEEP_PAGE_SIZE:
+                return
+            after = (page[-1][1], page[-1][0])
+
+    async def _worker(self):
+        while True:
+            run_id = await self._queue.get()
+            try:
+                await self.evaluate(run_id)
+            except Exception:
+                logger.exception("Evaluating run %s failed", run_id)
+            finally:
+                self._queue.task_done()
+
+    async def evaluate(self, run_id: uuid.UUID) -> int:
+        """Score a run with every enabled scorer it has no stored score from; returns scores added"""
+        db = SessionLocal()
+        try:
+            run = db.query(Run).filter(Run.id == run_id).first()
+            if run is None:
+                self._retries.pop(run_id, None)
+                return 0  # Deleted before its turn came
+
+            done = set(db.query(RunScore.scorer, RunScore.version).filter(RunScore.run_id == run_id).all())
+            pending = [s for s in enabled_scorers() if (s.name, s.version) not in done]
+            if not pending:
+                self._retries.pop(run_id, None)
+                return 0
+
+            scenario = {
+                "participants": run.scenario.participants,
+                "system_prompt": run.scenario.system_prompt,
+                "settings": run.scenario.settings,
+            }
+            conversation_log = run.log
+
+            rules = [s for s in pending if s.kind == "rule"]
+            judges = [s for s in pending if s.kind == "llm"]
+            # Rule scorers are CPU work; keep them off the event loop
+            results = await asyncio.to_thread(_run_rule_scorers, rules, conversation_log, scenario)
+            verdicts = await asyncio.gather(
+                *(judge.score(conversation_log, scenario) for judge in judges),
+                return_exceptions=True
+            )
+            results.extend(zip(judges, verdicts))
+
+            scores = []
+            failed = False
+            for evaluated_scorer, result in results:
+                if isinstance(result, BaseException):
+                    # Left unscored; retried after a backoff
+                    self.failed += 1
+                    failed = True
+                    logger.warning("Scorer %s failed on run %s: %s", evaluated_scorer.name, run_id, result)
+                    continue
+                value, details = result
+                scores.append({
+                    "run_id": run_id,
+                    "scorer": evaluated_scorer.name,
+                    "version": evaluated_scorer.version,
+                    "kind": evaluated_scorer.kind,
+                    "value": value,
+                    "details": details,
+                    "created_at": datetime.utcnow(),
+                })
+
+            def store_scores(session: Session) -> Optional[int]:
+                # The run may have been deleted while it was scored. This no-op
+                # update holds it until the batch commits (a row lock on
+                # PostgreSQL, the write lock on SQLite), so a delete either
+                # happened before and is seen here, or waits and takes the
+                # scores with it.
+                if session.execute(update(Run).where(Run.id == run_id).values(id=Run.id)).rowcount == 0:
+                    return None
+                for score in scores:
+                    session.merge(RunScore(**score))
+                if scores:
+                    record_run_changes(session, [run_id])  # Scores show in the history list
+                return len(scores)
+
+            # Committed with the run writer's next batch (imported here, as it submits runs to this pipeline)
+            from run_writer import run_writer
+            added = await run_writer.write(db, store_scores)
+            if added is None:
+                # No scores without their run, and its deletion stays recorded
+                self._retries.pop(run_id, None)
+                return 0
+            self.evaluated += 1
+            if failed:
+                self._retry_later(run_id)
+            else:
+                self._retries.pop(run_id, None)
+            return added
+        finally:
+            db.close()
+
+# Global evaluation pipeline, started with the application
+evaluation_pipeline = EvaluationPipeline()
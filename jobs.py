@@ -0,0 +1,374 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set
+
+from sqlalchemy import func, insert, or_, and_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Scenario, Run, SimulationJob
+from persistence import store_trace
+from run_writer import run_writer
+from simulation import simulation_engine, SimulationTimeout
+from tracing import start_trace
+from token_budget import track_usage, PromptBudgetExceeded
+
+# Durable simulation queue.
+#
+# Jobs live in the simulation_jobs table, so queued work survives restarts.
+# A worker claims a job by atomically setting its lease; while the simulation
+# runs it extends the lease with heartbeats. If the process dies, the lease
+# expires and any worker (including the restarted one) claims the job again,
+# so every job runs at least once. Each job's run ID is assigned at enqueue
+# time and the run is inserted with it, so a job executed twice still
+# produces one run.
+#
+# A job that fails is queued again after a backoff, JOB_RETRY_DELAY_SECONDS
+# doubled for each attempt already made (at most JOB_RETRY_MAX_DELAY_SECONDS),
+# until it runs out of attempts. Failures that would recur on every attempt,
+# such as a prompt too long for the model, fail the job straight away.
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))  # Concurrent jobs per process; 0 disables the worker
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+RETRY_DELAY_SECONDS = float(os.getenv("JOB_RETRY_DELAY_SECONDS", "5"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("JOB_RETRY_MAX_DELAY_SECONDS", "300"))
+
+logger = logging.getLogger(__name__)
+
+def enqueue_jobs(
+    db: Session,
+    scenario_id: uuid.UUID,
+    count: int,
+    priority: str = "bulk",
+    max_attempts: int = 3,
+    batch_id: Optional[uuid.UUID] = None,
+    commit: bool = True
+) -> uuid.UUID:
+    """Queue `count` runs of a scenario as one batch and return the batch ID
+
+    Passing `batch_id` adds the jobs to an existing batch; with commit=False
+    they are committed together with the caller's other changes.
+    """
+    batch_id = batch_id or uuid.uuid4()
+    now = datetime.utcnow()
+    db.execute(insert(SimulationJob), [
+        {
+            "id": uuid.uuid4(),
+            "batch_id": batch_id,
+            "scenario_id": scenario_id,
+            "run_id": uuid.uuid4(),
+            "priority": priority,
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for _ in range(count)
+    ])
+    if commit:
+        db.commit()
+    return batch_id
+
+def batch_progress(db: Session, batch_id: uuid.UUID) -> Optional[Dict[str, Any]]:
+    """Job counts per status for a batch, or None if it does not exist"""
+    counts = dict(
+        db.query(SimulationJob.status, func.count(SimulationJob.id))
+        .filter(SimulationJob.batch_id == batch_id)
+        .group_by(SimulationJob.status)
+        .all()
+    )
+    if not counts:
+        return None
+
+    return {
+        "batch_id": batch_id,
+        "total": sum(counts.values()),
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "completed": counts.get("completed", 0),
+        "failed": counts.get("failed", 0),
+        "cancelled": counts.get("cancelled", 0),
+    }
+
+def cancel_batch(db: Session, batch_id: uuid.UUID) -> int:
+    """Cancel a batch's jobs that have not started; running jobs finish normally"""
+    result = db.execute(
+        update(SimulationJob)
+        .where(SimulationJob.batch_id == batch_id, SimulationJob.status == "queued")
+        .values(status="cancelled", updated_at=datetime.utcnow())
+    )
+    db.commit()
+    return result.rowcount
+
+def _claimable(now: datetime):
+    """Queued jobs not waiting out a retry delay, and running jobs whose worker stopped heartbeating"""
+    return or_(
+        and_(SimulationJob.status == "queued", or_(SimulationJob.retry_at.is_(None), SimulationJob.retry_at <= now)),
+        and_(SimulationJob.status == "running", SimulationJob.lease_expires_at < now),
+    )
+
+def retry_delay(attempts: int) -> float:
+    """Seconds a job waits before its next attempt, after `attempts` failed ones"""
+    return min(RETRY_DELAY_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_DELAY_SECONDS)
+
+class JobWorker:
+    """Claims queued jobs and runs them, up to `concurrency` at a time"""
+
+    def __init__(self, concurrency: int = JOB_WORKERS, lease_seconds: float = LEASE_SECONDS, poll_seconds: float = POLL_SECONDS):
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._active: Set[asyncio.Task] = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self.concurrency > 0 and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._claim_loop())
+
+    def wake(self):
+        """Look for work now instead of at the next poll"""
+        self._wake.set()
+
+    async def stop(self):
+        """Stop claiming, cancel running jobs and hand their leases back"""
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        for task in list(self._active):
+            task.cancel()
+        await asyncio.gather(self._loop_task, *self._active, return_exceptions=True)
+        self._loop_task = None
+
+    async def _claim_loop(self):
+        while True:
+            free = self.concurrency - len(self._active)
+            claimed = self._claim(free) if free > 0 else []
+            for job_id in claimed:
+                task = asyncio.create_task(self._execute(job_id))
+                self._active.add(task)
+                task.add_done_callback(self._job_finished)
+
+            if len(claimed) < free:
+                # Queue drained (or all slots busy): wait for a poll or a wake-up
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(0)
+
+    def _job_finished(self, task: asyncio.Task):
+        self._active.discard(task)
+        self._wake.set()
+
+    def _claim(self, limit: int) -> List[uuid.UUID]:
+        """Lease up to `limit` jobs; the conditional UPDATE makes each claim atomic across workers"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            self._fail_exhausted(db, now)
+            candidates = [
+                job_id for (job_id,) in db.query(SimulationJob.id)
+                .filter(_claimable(now))
+                .order_by(SimulationJob.created_at)
+                .limit(limit * 2)
+                .all()
+            ]
+
+            claimed = []
+            for job_id in candidates:
+                if len(claimed) == limit:
+                    break
+                result = db.execute(
+                    update(SimulationJob)
+                    .where(SimulationJob.id == job_id, _claimable(now))
+                    .values(
+                        status="running",
+                        attempts=SimulationJob.attempts + 1,
+                        retry_at=None,
+                        lease_owner=self.worker_id,
+                        lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                        updated_at=now,
+                    )
+                )
+                db.commit()
+                if result.rowcount == 1:
+                    claimed.append(job_id)
+            return claimed
+        finally:
+            db.close()
+
+    def _fail_exhausted(self, db: Session, now: datetime):
+        """Give up on jobs whose lease expired after their last allowed attempt"""
+        db.execute(
+            update(SimulationJob)
+            .where(
+                SimulationJob.status == "running",
+                SimulationJob.lease_expires_at < now,
+                SimulationJob.attempts >= SimulationJob.max_attempts,
+            )
+            .values(status="failed", last_error="Lease expired on the final attempt", updated_at=now)
+        )
+        db.commit()
+
+    def _heartbeat(self, db: Session, job_id: uuid.UUID) -> bool:
+        """Extend our lease; False if another worker has taken the job over"""
+        now = datetime.utcnow()
+        result = db.execute(
+            update(SimulationJob)
+            .where(SimulationJob.id == job_id, SimulationJob.lease_owner == self.worker_id)
+            .values(lease_expires_at=now + timedelta(seconds=self.lease_seconds), updated_at=now)
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    async def _heartbeat_loop(self, db: Session, job_id: uuid.UUID, work: asyncio.Task):
+        while not work.done():
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self._heartbeat(db, job_id):
+                logger.warning("Lost lease on job %s; abandoning it", job_id)
+                work.cancel()
+                return
+
+    def _finish(
+        self,
+        db: Session,
+        job: SimulationJob,
+        status: str,
+        error: Optional[str] = None,
+        retry_at: Optional[datetime] = None
+    ):
+        """Record the outcome, unless the lease has passed to another worker"""
+        db.execute(self._outcome(job.id, status, error, retry_at))
+        db.commit()
+
+    def _outcome(
+        self,
+        job_id: uuid.UUID,
+        status: str,
+        error: Optional[str] = None,
+        retry_at: Optional[datetime] = None
+    ):
+        return (
+            update(SimulationJob)
+            .where(SimulationJob.id == job_id, SimulationJob.lease_owner == self.worker_id)
+            .values(
+                status=status,
+                last_error=error,
+                retry_at=retry_at,
+                lease_owner=None,
+                lease_expires_at=None,
+                updated_at=datetime.utcnow()
+            )
+        )
+
+    async def _save_run_once(
+        self,
+        db: Session,
+        job: SimulationJob,
+        log: List[Dict[str, Any]],
+        latency_ms: int,
+        status: str,
+        settings: Dict[str, Any],
+        usage: Dict[str, Any]
+    ):
+        try:
+            await run_writer.save(
+                db, job.scenario_id, log, latency_ms=latency_ms, status=status, run_id=job.run_id,
+                model=settings.get("model", "gpt-4"), endpoint=settings.get("endpoint"), usage=usage
+            )
+        except IntegrityError:
+            db.rollback()  # An earlier attempt of this job already saved the run
+
+    async def _execute(self, job_id: uuid.UUID):
+        db = SessionLocal()
+        try:
+            job = db.query(SimulationJob).filter(SimulationJob.id == job_id).first()
+
+            if db.query(Run.id).filter(Run.id == job.run_id).first() is not None:
+                # A previous attempt saved the run but died before marking the job
+                self._finish(db, job, "completed")
+                return
+
+            scenario = db.query(Scenario).filter(Scenario.id == job.scenario_id).first()
+            if scenario is None:
+                self._finish(db, job, "failed", "Scenario not found")
+                return
+
+            settings = scenario.settings
+            with start_trace("job", job_id=str(job.id), batch_id=str(job.batch_id), priority=job.priority, attempt=job.attempts) as trace, \
+                    track_usage() as usage:
+                started = time.perf_counter()
+                work = asyncio.ensure_future(simulation_engine.run_simulation(
+                    participants=scenario.participants,
+                    system_prompt=scenario.system_prompt,
+                    settings=settings,
+                    priority=job.priority
+                ))
+                heartbeat = asyncio.create_task(self._heartbeat_loop(db, job.id, work))
+                try:
+                    conversation_log = await work
+                    status = "completed"
+                except SimulationTimeout as e:
+                    conversation_log = e.conversation_log
+                    status = "timed_out"
+                finally:
+                    heartbeat.cancel()
+                latency_ms = int((time.perf_counter() - started) * 1000)
+
+                await self._save_run_once(db, job, conversation_log, latency_ms, status, settings, usage)
+            run_id = job.run_id
+
+            def complete(session: Session):
+                store_trace(session, run_id, trace)
+                session.execute(self._outcome(job_id, "completed"))
+
+            # In the run writer's next batch rather than a commit of its own
+            await run_writer.write(db, complete)
+
+        except asyncio.CancelledError:
+            # Shutting down or lease lost: hand the job back without using up an attempt
+            db.rollback()
+            db.execute(
+                update(SimulationJob)
+                .where(SimulationJob.id == job_id, SimulationJob.lease_owner == self.worker_id)
+                .values(
+                    status="queued",
+                    attempts=SimulationJob.attempts - 1,
+                    lease_owner=None,
+                    lease_expires_at=None,
+                    updated_at=datetime.utcnow(),
+                )
+            )
+            db.commit()
+            raise
+        except PromptBudgetExceeded as e:
+            # The same prompt is rejected on every attempt
+            db.rollback()
+            job = db.query(SimulationJob).filter(SimulationJob.id == job_id).first()
+            self._finish(db, job, "failed", str(e))
+        except Exception as e:
+            logger.exception("Job %s failed", job_id)
+            db.rollback()
+            job = db.query(SimulationJob).filter(SimulationJob.id == job_id).first()
+            if job.attempts < job.max_attempts:
+                retry_at = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+                self._finish(db, job, "queued", str(e), retry_at=retry_at)
+            else:
+                self._finish(db, job, "failed", str(e))
+        finally:
+            db.close()
+
+# Global job worker, started with the application
+job_worker = JobWorker()
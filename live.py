@@ -0,0 +1,317 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import orjson
+from fastapi import WebSocket, WebSocketDisconnect
+from sqlalchemy.orm import Session
+
+from cassettes import CassetteMiss
+from database import Scenario
+from run_writer import run_writer
+from scheduler import simulation_scheduler
+from serialization import run_to_dict
+from simulation import simulation_engine, SimulationTimeout, DEFAULT_DEADLINE_SECONDS
+from token_budget import track_usage, PromptBudgetExceeded
+
+# Live simulation channel (/ws/simulate)
+#
+# Server -> client events:
+#   status           {"status": "running" | "paused" | "waiting" | "cancelled" | "completed" | "timed_out" | "error"}
+#   message          a participant message appended to the log (initial or injected)
+#   mediator_start   a mediator reply is starting ("in_reply_to" set in per-participant mode)
+#   mediator_chunk   {"delta": "..."} text of the reply as it streams in
+#   mediator_done    the complete mediator message as stored in the log
+#   metrics          timing of the finished reply (latency, time to first token, chunks)
+#   run              the persisted run, sent once when the simulation completes
+#                    or times out
+#   error            {"detail": "..."} for rejected control messages, or when the
+#                    simulation fails, e.g. its prompt does not fit the model's
+#                    context window (followed by status "error"), or times out
+#                    (followed by the run and status "timed_out")
+#
+# Client -> server control messages:
+#   {"type": "pause"} / {"type": "resume"}
+#                        a reply already streaming is finished first; a paused
+#                        session holds no scheduler slot or upstream stream
+#   {"type": "cancel"}   stop immediately without saving
+#   {"type": "inject", "speaker": "<participant name>", "content": "..."}
+#                        add a participant message; the mediator answers it next
+#   {"type": "finish"}   save the conversation once the current step is done
+#
+# Non-interactive sessions finish after the opening mediator reply unless
+# messages were injected in the meantime; interactive sessions wait for
+# further injections until the client sends "finish".
+#
+# The scenario's deadline (settings.deadline_seconds, default
+# RUN_DEADLINE_SECONDS) bounds the time spent on mediator steps, including the
+# wait for a scheduler slot; time paused or waiting for the client does not
+# count. Past it, the conversation so far is saved as a "timed_out" run.
+
+logger = logging.getLogger(__name__)
+
+class LiveSimulationSession:
+    """Drives one simulation over a WebSocket, pushing events as they are produced"""
+
+    def __init__(self, websocket: WebSocket, db: Session, scenario: Scenario, interactive: bool = False):
+        self.websocket = websocket
+        self.db = db
+        self.scenario = scenario
+        self.interactive = interactive
+
+        self.conversation_log: List[Dict[str, Any]] = []
+        self.pending_injections: List[Dict[str, Any]] = []
+        self.latency_ms = 0
+        self.step = 0
+        self.waiting = False
+        self.finish_requested = False
+        self.deadline = scenario.settings.get("deadline_seconds") or DEFAULT_DEADLINE_SECONDS
+        self.step_seconds = 0.0  # Counted against the deadline
+
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._wake = asyncio.Event()
+        self._outbox: asyncio.Queue = asyncio.Queue()
+
+    async def run(self):
+        sender = asyncio.create_task(self._send_loop())
+        receiver = asyncio.create_task(self._receive_loop())
+        driver = asyncio.create_task(self._drive())
+
+        try:
+            await asyncio.wait({receiver, driver}, return_when=asyncio.FIRST_COMPLETED)
+
+            if not driver.done():
+                if receiver.result() == "disconnected" and self.waiting:
+                    # Nothing in flight: keep the steps completed so far
+                    self.finish_requested = True
+                    self._wake.set()
+                    self._resumed.set()
+                else:
+                    driver.cancel()
+                    self.emit({"type": "status", "status": "cancelled"})
+
+            try:
+                await driver
+            except asyncio.CancelledError:
+                pass
+        except Exception as e:
+            logger.exception("Live simulation of scenario %s failed", self.scenario.id)
+            self.emit({"type": "error", "detail": f"Simulation failed: {e}"})
+            self.emit({"type": "status", "status": "error"})
+        finally:
+            # Neither task outlives the session, whatever ended it
+            driver.cancel()
+            receiver.cancel()
+            await asyncio.gather(driver, receiver, return_exceptions=True)
+            self._outbox.put_nowait(None)
+            await sender
+            try:
+                await self.websocket.close()
+            except RuntimeError:
+                pass  # Already closed by the client
+
+    def emit(self, event: Dict[str, Any]):
+        self._outbox.put_nowait(event)
+
+    async def _send_loop(self):
+        while True:
+            event = await self._outbox.get()
+            if event is None:
+                return
+            try:
+                await self.websocket.send_text(orjson.dumps(event).decode())
+            except (WebSocketDisconnect, RuntimeError):
+                pass  # Keep draining so producers never block on a closed socket
+
+    async def _receive_loop(self) -> str:
+        """Handle control messages; returns why the loop ended"""
+        while True:
+            try:
+                control = await self.websocket.receive_json()
+            except WebSocketDisconnect:
+                return "disconnected"
+            except ValueError:
+                self.emit({"type": "error", "detail": "Control messages must be JSON"})
+                continue
+
+            control_type = control.get("type") if isinstance(control, dict) else None
+            if control_type == "pause":
+                self._resumed.clear()
+                self.emit({"type": "status", "status": "paused"})
+            elif control_type == "resume":
+                self._resumed.set()
+                self.emit({"type": "status", "status": "waiting" if self.waiting else "running"})
+            elif control_type == "cancel":
+                return "cancelled"
+            elif control_type == "inject":
+                self._inject(control)
+            elif control_type == "finish":
+                self.finish_requested = True
+                self._wake.set()
+            else:
+                self.emit({"type": "error", "detail": f"Unknown control message: {control_type}"})
+
+    def _inject(self, control: Dict[str, Any]):
+        speaker = control.get("speaker")
+        content = (control.get("content") or "").strip()
+        participant_names = {participant["name"] for participant in self.scenario.participants}
+
+        if speaker not in participant_names:
+            self.emit({"type": "error", "detail": f"Unknown participant: {speaker}"})
+            return
+        if not content:
+            self.emit({"type": "error", "detail": "Injected message is empty"})
+            return
+
+        self.pending_injections.append({"speaker": speaker, "content": content})
+        self._wake.set()
+
+    def _append_participant_message(self, speaker: str, content: str):
+        message = {
+            "speaker": speaker,
+            "content": content,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        self.conversation_log.append(message)
+        self.emit({"type": "message", "message": message})
+
+    async def _converse(self):
+        """Run the conversation until it is complete, appending to the log"""
+        participants = self.scenario.participants
+        settings = self.scenario.settings
+
+        self.emit({"type": "status", "status": "running"})
+
+        # Step 1: All participants share their initial messages first
+        for participant in participants:
+            self._append_participant_message(participant["name"], participant["initial_message"])
+
+        # Step 2: Opening mediator reply, per the scenario's mediation mode
+        if settings.get("mediation_mode", "group") == "per_participant":
+            await self._mediator_step(participants)
+        else:
+            await self._mediator_step()
+
+        # Further steps: the mediator answers injected participant messages
+        while True:
+            if self.pending_injections:
+                injections, self.pending_injections = self.pending_injections, []
+                for injection in injections:
+                    self._append_participant_message(injection["speaker"], injection["content"])
+
+                await self._mediator_step()
+            elif self.interactive and not self.finish_requested:
+                self.waiting = True
+                self._wake.clear()
+                self.emit({"type": "status", "status": "waiting"})
+                await self._wake.wait()
+                self.waiting = False
+                if not self.finish_requested and self._resumed.is_set():
+                    self.emit({"type": "status", "status": "running"})
+            else:
+                break
+
+    async def _mediator_step(self, answering: Optional[List[Dict[str, Any]]] = None):
+        """Run one mediator step, within what is left of the deadline
+
+        `answering` lists the participants to reply to individually; without
+        it the mediator sends one reply to the group. The step holds an
+        interactive scheduler slot while it runs; pausing takes effect before
+        it starts, outside the slot.
+        """
+        await self._resumed.wait()
+        requested = time.perf_counter()
+        try:
+            replies, step_started = await asyncio.wait_for(
+                self._replies_in_slot(answering),
+                timeout=self.deadline - self.step_seconds
+            )
+        except asyncio.TimeoutError:
+            raise SimulationTimeout(self.deadline, self.conversation_log)
+        finally:
+            self.step_seconds += time.perf_counter() - requested
+        self.conversation_log.extend(replies)
+        self.latency_ms += int((time.perf_counter() - step_started) * 1000)
+
+    async def _replies_in_slot(self, answering: Optional[List[Dict[str, Any]]]):
+        async with simulation_scheduler.slot("interactive"):
+            step_started = time.perf_counter()
+            if answering is None:
+                return [await self._mediator_reply()], step_started
+            replies = await asyncio.gather(*(self._mediator_reply(participant) for participant in answering))
+            return replies, step_started
+
+    async def _drive(self):
+        settings = self.scenario.settings
+        status = "completed"
+        with track_usage() as usage:
+            try:
+                await self._converse()
+            except SimulationTimeout as e:
+                status = "timed_out"
+                self.emit({"type": "error", "detail": str(e)})
+
+        db_run = await run_writer.save(
+            self.db,
+            self.scenario.id,
+            self.conversation_log,
+            latency_ms=self.latency_ms,
+            status=status,
+            model=settings.get("model", "gpt-4"),
+            endpoint=settings.get("endpoint"),
+            usage=usage
+        )
+        self.emit({"type": "run", "run": run_to_dict(db_run)})
+        self.emit({"type": "status", "status": status})
+
+    async def _mediator_reply(self, participant: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Stream one mediator reply to the client and return it as a log entry"""
+        self.step += 1
+        step = self.step
+        in_reply_to = participant["name"] if participant is not None else None
+        self.emit({"type": "mediator_start", "step": step, "in_reply_to": in_reply_to})
+
+        started = time.perf_counter()
+        first_token_at = None
+        chunks = []
+        try:
+            async for delta in simulation_engine.stream_mediator_reply(
+                self.scenario.participants,
+                self.scenario.system_prompt,
+                self.scenario.settings,
+                self.conversation_log,
+                participant
+            ):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                chunks.append(delta)
+                self.emit({"type": "mediator_chunk", "step": step, "in_reply_to": in_reply_to, "delta": delta})
+            content = "".join(chunks).strip()
+        except (asyncio.CancelledError, PromptBudgetExceeded, CassetteMiss):
+            raise
+        except Exception as e:
+            content = f"[AI Error: Unable to generate response - {str(e)}]"
+
+        message = {
+            "speaker": "AI",
+            "content": content,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        if in_reply_to is not None:
+            message["in_reply_to"] = in_reply_to
+
+        finished = time.perf_counter()
+        self.emit({"type": "mediator_done", "step": step, "message": message})
+        self.emit({
+            "type": "metrics",
+            "step": step,
+            "in_reply_to": in_reply_to,
+            "latency_ms": int((finished - started) * 1000),
+            "first_token_ms": int((first_token_at - started) * 1000) if first_token_at else None,
+            "chunks": len(chunks),
+            "characters": len(content)
+        })
+        return message
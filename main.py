@@ -1,23 +1,52 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import uvicorn
 import os
-from database import init_db
-from routes import router
 
-# Load environment variables from .env file
+# Load environment variables from .env file (before the modules that read them)
 load_dotenv()
 
+from database import engine
+from persistence import prepare_database
+from routes import router
+from jobs import job_worker
+from evaluation import evaluation_pipeline
+from templates import template_feeder
+from run_writer import run_writer
+from scheduler import simulation_scheduler
+from static_assets import PrecompressedStaticFiles, index_path
+
 # Create FastAPI app
 app = FastAPI(title="Driftwood LLM Simulation Lab", version="1.0.0")
 
+# False until startup has finished and again once shutdown begins (see /ready)
+accepting_work = False
+
 # Initialize database on startup
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    global accepting_work
+    prepare_database()
+    # Save finished runs in batched transactions
+    run_writer.start()
+    # Resume queued jobs, including any left running by a previous process
+    job_worker.start()
+    # Keep running template expansions fed into the job queue
+    template_feeder.start()
+    # Score new runs in the background, after catching up on unscored ones
+    evaluation_pipeline.start()
+    accepting_work = True
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    global accepting_work
+    accepting_work = False  # Drain: the load balancer stops sending new runs
+    await template_feeder.stop()
+    await job_worker.stop()
+    await run_writer.stop()
+    await evaluation_pipeline.stop()
 
 # Add CORS middleware
 app.add_middleware(
@@ -31,21 +60,40 @@ app.add_middleware(
 # Include API routes
 app.include_router(router)
 
-# Mount static files
+# Mount static files (precompressed and cached when built with build_static.py)
 if os.path.exists("static"):
-    app.mount("/static", StaticFiles(directory="static"), name="static")
+    static_files = PrecompressedStaticFiles(directory="static")
+    app.mount("/static", static_files, name="static")
 
 @app.get("/")
-async def read_root():
+async def read_root(request: Request):
     """Serve the main HTML file"""
     if os.path.exists("static/index.html"):
-        return FileResponse("static/index.html")
+        return await static_files.get_response(index_path(), request.scope)
     return {"message": "Driftwood LLM Simulation Lab - Backend Running"}
 
 @app.get("/health")
 async def health_check():
     """Basic health check endpoint"""
-    return {"status": "healthy", "message": "Server is running"}
+    return {"status": "healthy", "message": "Server is running", "database": engine.dialect.name}
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness for new simulations: 503 while starting, draining or saturated
+
+    Unlike /health, which only says the process is up, this tells a load
+    balancer whether to route new /run requests here.
+    """
+    state = simulation_scheduler.readiness()
+    if not accepting_work:
+        state.update(ready=False, reasons=["starting up or shutting down"])
+    if state["ready"]:
+        return state
+    return JSONResponse(
+        state,
+        status_code=503,
+        headers={"Retry-After": str(state["retry_after"] or 1)}
+    )
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
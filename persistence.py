@@ -0,0 +1,115 @@
+from typing import List, Dict, Any, Optional
+import uuid
+
+from sqlalchemy.orm import Session
+
+from database import init_db, SessionLocal, Run, ResponseSignature, RunTrace, RunScore
+from stats import ensure_scenario_stats, record_runs_added, record_runs_removed
+from similarity import store_signatures
+from comparison import comparison_cache
+from tracing import Trace, TRACE_RETENTION, span
+from evaluation import evaluation_pipeline
+from changes import ensure_run_changes, record_run_changes
+from versioning import ensure_scenario_lineage
+
+def prepare_database():
+    """Create missing tables and backfill what older databases lack; run by every entry point on startup
+    
+    Each backfill looks for rows it has not covered yet, so a database written
+    to by a process that skipped them is caught up the next time.
+    """
+    init_db()
+    db = SessionLocal()
+    try:
+        ensure_scenario_stats(db)
+        ensure_scenario_lineage(db)
+        ensure_run_changes(db)
+    finally:
+        db.close()
+
+def save_run(
+    db: Session,
+    scenario_id: uuid.UUID,
+    log: List[Dict[str, Any]],
+    latency_ms: Optional[int] = None,
+    status: str = "completed",
+    run_id: Optional[uuid.UUID] = None,
+    model: Optional[str] = None,
+    endpoint: Optional[str] = None,
+    usage: Optional[Dict[str, Any]] = None
+) -> Run:
+    """Insert a finished run and update everything derived from it in one transaction
+    
+    Passing a pre-assigned `run_id` makes the insert idempotent: the primary
+    key rejects a second run with the same ID (see jobs.py). Once committed,
+    the run is queued for scoring (see evaluation.py).
+    """
+    db_run = Run(
+        id=run_id,
+        scenario_id=scenario_id,
+        log=log,
+        latency_ms=latency_ms,
+        status=status,
+        model=model,
+        endpoint=endpoint,
+        usage=usage
+    )
+    
+    with span("db.insert"):
+        insert_runs(db, [db_run])
+    with span("db.commit"):
+        db.commit()
+    db.refresh(db_run)
+    evaluation_pipeline.submit(db_run.id)
+    
+    return db_run
+
+def insert_runs(db: Session, runs: List[Run]):
+    """Add new runs and everything derived from them to the current transaction"""
+    db.add_all(runs)
+    db.flush()
+    record_runs_added(db, runs)
+    for run in runs:
+        store_signatures(db, run)
+    record_run_changes(db, [run.id for run in runs])
+
+def delete_runs(db: Session, runs: List[Run]) -> int:
+    """Delete runs and everything derived from them in one transaction"""
+    if not runs:
+        return 0
+    
+    run_ids = [run.id for run in runs]
+    # Locked first, so a score write for one of them (see evaluation.py) finishes before or finds it gone
+    db.query(Run.id).filter(Run.id.in_(run_ids)).with_for_update().all()
+    record_runs_removed(db, runs)
+    db.query(ResponseSignature).filter(ResponseSignature.run_id.in_(run_ids)).delete(synchronize_session=False)
+    db.query(RunTrace).filter(RunTrace.run_id.in_(run_ids)).delete(synchronize_session=False)
+    db.query(RunScore).filter(RunScore.run_id.in_(run_ids)).delete(synchronize_session=False)
+    deleted_count = db.query(Run).filter(Run.id.in_(run_ids)).delete(synchronize_session=False)
+    record_run_changes(db, run_ids, deleted=True)
+    db.commit()
+    
+    for run_id in run_ids:
+        comparison_cache.invalidate_run(run_id)
+    
+    return deleted_count
+
+def store_trace(db: Session, run_id: uuid.UUID, trace: Trace):
+    """Add a finished trace for a run to the current transaction and drop the oldest beyond the retention cap"""
+    db.merge(RunTrace(
+        run_id=run_id,
+        created_at=trace.started_at,
+        duration_ms=trace.duration_ms,
+        trace=trace.to_dict()
+    ))
+    db.flush()
+    
+    expired = [
+        expired_id for (expired_id,) in db.query(RunTrace.run_id)
+        .order_by(RunTrace.created_at.desc())
+        .offset(TRACE_RETENTION)
+        .limit(500)
+        .all()
+    ]
+    if expired:
+        db.query(RunTrace).filter(RunTrace.run_id.in_(expired)).delete(synchronize_session=False)
@@ -1,29 +1,117 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response, WebSocket
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+from functools import partial
+import asyncio
+import itertools
+import time
 import uuid
 
-from database import get_db, Scenario, Run
-from schemas import ScenarioCreate, ScenarioResponse, RunResponse, RunSummary, StarUpdateRequest
-from simulation import simulation_engine
+from database import (
+    get_db, Scenario, Run, SimulationJob, RunTrace, ScenarioTemplate, TemplateExpansion,
+    run_log_has_speaker, run_log_length, run_log_page
+)
+from schemas import (
+    ScenarioCreate, ScenarioResponse, RunResponse, RunHeader, RunSummary, RunChangesResponse, StarUpdateRequest,
+    RunCompareRequest, RunComparisonResponse, ScenarioStatsResponse, DiversityResponse,
+    SchedulerMetricsResponse, Priority, JobBatchCreate, JobBatchResponse, JobResponse,
+    ScenarioVersionSummary, VersionComparisonResponse, TokenEstimateResponse, RunTraceResponse,
+    RunScoreResponse, ModelFanoutRequest, ModelFanoutResponse, TemplateCreate, TemplateResponse,
+    TemplateVariant, ExpansionCreate, ExpansionResponse
+)
+from simulation import simulation_engine, SimulationTimeout
+from comparison import compare_runs, comparison_cache
+from persistence import delete_runs, store_trace
+from run_writer import run_writer
+from stats import get_scenario_stats, record_star_changed
+from similarity import scenario_diversity
+from serialization import json_response, run_to_dict, scenario_to_dict
+from live import LiveSimulationSession
+from scheduler import simulation_scheduler, SchedulerSaturated
+from jobs import enqueue_jobs, batch_progress, cancel_batch, job_worker
+from versioning import create_version, list_versions, diff_versions
+from token_budget import PromptBudgetExceeded, track_usage
+from tracing import start_trace, span
+from evaluation import current_scores, list_run_scores
+from changes import record_run_changes, changes_since
+from templates import (
+    TemplateError, validate_template, count_variants, iter_variants, build_scenario,
+    create_expansion, template_feeder
+)
 
 router = APIRouter()
 
 # Scenario endpoints
 @router.get("/scenarios", response_model=List[ScenarioResponse])
-async def get_scenarios(db: Session = Depends(get_db)):
-    """Get all saved scenario definitions"""
-    scenarios = db.query(Scenario).order_by(Scenario.created_at.desc()).all()
-    return scenarios
+async def get_scenarios(template_id: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get saved scenario definitions
+
+    Scenarios generated from templates are only listed when `template_id` asks for them.
+    """
+    query = db.query(Scenario)
+    if template_id is None:
+        query = query.filter(Scenario.template_id.is_(None))
+    else:
+        try:
+            query = query.filter(Scenario.template_id == uuid.UUID(template_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid template ID format")
+    scenarios = query.order_by(Scenario.created_at.desc()).all()
+    return json_response([scenario_to_dict(scenario) for scenario in scenarios])
+
+def _estimate_scenario_tokens(scenario: ScenarioCreate) -> dict:
+    return simulation_engine.estimate_tokens(
+        [participant.dict() for participant in scenario.participants],
+        scenario.system_prompt,
+        scenario.settings.dict()
+    )
+
+@router.post("/scenarios/estimate", response_model=TokenEstimateResponse)
+async def estimate_scenario_tokens(scenario: ScenarioCreate):
+    """Estimate a scenario's prompt size against its model's context window, without saving it"""
+    return _estimate_scenario_tokens(scenario)
 
 @router.post("/scenarios", response_model=ScenarioResponse)
 async def create_scenario(scenario: ScenarioCreate, db: Session = Depends(get_db)):
-    """Create or update a scenario"""
+    """Create a scenario, or a new version of `parent_id` storing only what changed
+
+    Scenarios whose prompt cannot fit the model's context window under their
+    budget strategy are rejected with a 422.
+    """
     # Convert Pydantic models to dict for JSON storage
     participants_dict = [participant.dict() for participant in scenario.participants]
     settings_dict = scenario.settings.dict()
     
+    if scenario.settings.endpoint is not None and scenario.settings.endpoint not in simulation_engine.endpoints:
+        raise HTTPException(status_code=422, detail=f"Unknown LLM endpoint: {scenario.settings.endpoint}")
+    
+    estimate = _estimate_scenario_tokens(scenario)
+    if not estimate["fits"] and not estimate["fits_after_strategy"]:
+        raise HTTPException(status_code=422, detail={
+            "message": (
+                f"Prompt of ~{estimate['prompt_tokens']} tokens plus max_tokens={estimate['max_tokens']} "
+                f"exceeds the {estimate['context_window']}-token context window of {estimate['model']}"
+            ),
+            **estimate
+        })
+    
+    if scenario.parent_id is not None:
+        parent = db.get(Scenario, scenario.parent_id)
+        if not parent:
+            raise HTTPException(status_code=404, detail="Parent scenario not found")
+        # Returns the parent itself when nothing changed
+        return create_version(db, parent, scenario.name, {
+            "participants": participants_dict,
+            "system_prompt": scenario.system_prompt,
+            "settings": settings_dict
+        })
+    
+    scenario_id = uuid.uuid4()
     db_scenario = Scenario(
+        id=scenario_id,
+        lineage_id=scenario_id,
         name=scenario.name,
         participants=participants_dict,
         system_prompt=scenario.system_prompt,
@@ -36,25 +124,176 @@ async def create_scenario(scenario: ScenarioCreate, db: Session = Depends(get_db
     
     return db_scenario
 
+def _get_scenario_or_404(db: Session, scenario_id: str) -> Scenario:
+    try:
+        # Convert string to UUID
+        scenario_uuid = uuid.UUID(scenario_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid scenario ID format")
+    
+    scenario = db.get(Scenario, scenario_uuid)
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    return scenario
+
+@router.get("/scenarios/{scenario_id}", response_model=ScenarioResponse)
+async def get_scenario(scenario_id: str, db: Session = Depends(get_db)):
+    """Get one scenario (any version) with its full content"""
+    return json_response(scenario_to_dict(_get_scenario_or_404(db, scenario_id)))
+
+@router.get("/scenarios/{scenario_id}/versions", response_model=List[ScenarioVersionSummary])
+async def get_scenario_versions(scenario_id: str, db: Session = Depends(get_db)):
+    """List every version in the scenario's lineage, oldest first, with run counts"""
+    return list_versions(db, _get_scenario_or_404(db, scenario_id))
+
+@router.get("/scenarios/{scenario_id}/versions/compare", response_model=VersionComparisonResponse)
+async def compare_scenario_versions(scenario_id: str, other: str, db: Session = Depends(get_db)):
+    """Compare two versions: field-level content changes and their run statistics side by side"""
+    base = _get_scenario_or_404(db, scenario_id)
+    other_scenario = _get_scenario_or_404(db, other)
+    
+    summaries = {summary["id"]: summary for summary in list_versions(db, base)}
+    if other_scenario.id not in summaries:
+        raise HTTPException(status_code=400, detail="Scenarios are not versions of the same lineage")
+    
+    return {
+        "base": summaries[base.id],
+        "other": summaries[other_scenario.id],
+        "changes": diff_versions(scenario_to_dict(base), scenario_to_dict(other_scenario)),
+        "stats": [get_scenario_stats(db, base.id), get_scenario_stats(db, other_scenario.id)]
+    }
+
+@router.get("/scenarios/{scenario_id}/stats", response_model=ScenarioStatsResponse)
+async def get_scenario_statistics(scenario_id: str, db: Session = Depends(get_db)):
+    """Get aggregate run statistics for a scenario (counts, length/latency histograms, error rate)"""
+    try:
+        # Convert string to UUID
+        scenario_uuid = uuid.UUID(scenario_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid scenario ID format")
+    
+    if db.get(Scenario, scenario_uuid) is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
+    return get_scenario_stats(db, scenario_uuid)
+
+@router.get("/scenarios/{scenario_id}/diversity", response_model=DiversityResponse)
+async def get_scenario_diversity(
+    scenario_id: str,
+    threshold: float = Query(0.7, ge=0.5, le=1.0),
+    db: Session = Depends(get_db)
+):
+    """Cluster near-duplicate mediator responses across a scenario's runs (MinHash LSH)"""
+    try:
+        # Convert string to UUID
+        scenario_uuid = uuid.UUID(scenario_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid scenario ID format")
+    
+    if db.get(Scenario, scenario_uuid) is None:
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
+    return scenario_diversity(db, scenario_uuid, threshold)
+
 # Run endpoints
+def _run_summary_query(db: Session):
+    """Run list columns with scenario names; the log column is never loaded"""
+    return db.query(
+        Run.id, Run.scenario_id, Run.timestamp, Run.starred, Run.status, Run.model, Scenario.name
+    ).join(Scenario)
+
+def _run_summaries(db: Session, rows) -> List[dict]:
+    scores = current_scores(db, [row[0] for row in rows])
+    return [
+        {
+            "id": run_id,
+            "scenario_id": scenario_id,
+            "timestamp": timestamp,
+            "starred": is_starred,
+            "status": status,
+            "model": model,
+            "scenario_name": scenario_name,
+            "scores": scores[run_id]
+        }
+        for run_id, scenario_id, timestamp, is_starred, status, model, scenario_name in rows
+    ]
+
 @router.get("/runs", response_model=List[RunSummary])
-async def get_runs(db: Session = Depends(get_db)):
-    """Get all past simulation runs (basic metadata)"""
-    runs = db.query(Run).join(Scenario).order_by(Run.timestamp.desc()).all()
-    
-    # Create response with scenario names
-    run_summaries = []
-    for run in runs:
-        run_summary = RunSummary(
-            id=run.id,
-            scenario_id=run.scenario_id,
-            timestamp=run.timestamp,
-            starred=run.starred,
-            scenario_name=run.scenario.name if run.scenario else None
+async def get_runs(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=0, le=500),
+    starred: Optional[bool] = None,
+    speaker: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Get past simulation runs (basic metadata), newest first.
+
+    Without `limit` every run is returned. `speaker` keeps runs with a
+    message from that participant. The total number of runs matching the
+    filters is sent in the `X-Total-Count` header so clients can page.
+    """
+    query = _run_summary_query(db)
+    count_query = db.query(func.count(Run.id))
+    
+    if starred is not None:
+        query = query.filter(Run.starred == starred)
+        count_query = count_query.filter(Run.starred == starred)
+    if speaker is not None:
+        query = query.filter(run_log_has_speaker(speaker))
+        count_query = count_query.filter(run_log_has_speaker(speaker))
+    
+    query = query.order_by(Run.timestamp.desc(), Run.id.desc()).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    
+    total = count_query.scalar()
+    return json_response(_run_summaries(db, query.all()), headers={"X-Total-Count": str(total)})
+
+@router.get("/runs/changes", response_model=RunChangesResponse)
+async def get_run_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    """Runs saved, starred, scored or deleted after version `since` (see changes.py).
+
+    Pass the returned `version` as `since` next time; while `has_more` is
+    true there are further changes to fetch straight away.
+    """
+    changes = changes_since(db, since, limit)
+    rows = _run_summary_query(db).filter(Run.id.in_(changes["changed"])).all() if changes["changed"] else []
+    return json_response({
+        "version": changes["version"],
+        "reset": changes["reset"],
+        "runs": _run_summaries(db, rows),
+        "deleted": changes["deleted"],
+        "has_more": changes["has_more"],
+    })
+
+@router.post("/runs/compare", response_model=RunComparisonResponse)
+async def compare_simulation_runs(compare_request: RunCompareRequest, db: Session = Depends(get_db)):
+    """Compare two or more runs: aligned messages, mediator diffs and length statistics"""
+    run_ids = set(compare_request.run_ids)
+    if len(run_ids) < 2:
+        raise HTTPException(status_code=400, detail="At least two distinct run IDs are required")
+    
+    # Results are cached per set of run ids
+    cached = comparison_cache.get(run_ids)
+    if cached is not None:
+        return json_response(cached)
+    
+    runs = db.query(Run).filter(Run.id.in_(run_ids)).all()
+    missing = run_ids - {run.id for run in runs}
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Runs not found: {', '.join(sorted(str(run_id) for run_id in missing))}"
         )
-        run_summaries.append(run_summary)
     
-    return run_summaries
+    comparison = compare_runs(runs)
+    comparison_cache.put(run_ids, comparison)
+    
+    return json_response(comparison)
 
 @router.get("/runs/{run_id}", response_model=RunResponse)
 async def get_run(run_id: str, db: Session = Depends(get_db)):
@@ -70,44 +309,501 @@ async def get_run(run_id: str, db: Session = Depends(get_db)):
     if not run:
         raise HTTPException(status_code=404, detail="Run not found")
     
-    return run
+    return json_response(run_to_dict(run, current_scores(db, [run.id])[run.id]))
+
+@router.get("/runs/{run_id}/header", response_model=RunHeader)
+async def get_run_header(run_id: str, db: Session = Depends(get_db)):
+    """Get a run's metadata and message count without its log"""
+    try:
+        run_uuid = uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run ID format")
+    
+    row = db.query(
+        Run.id, Run.scenario_id, Run.timestamp, Run.starred, Run.status, Run.model, Run.endpoint, Run.usage,
+        run_log_length()
+    ).filter(Run.id == run_uuid).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    header = dict(zip(
+        ["id", "scenario_id", "timestamp", "starred", "status", "model", "endpoint", "usage", "message_count"], row
+    ))
+    header["scores"] = current_scores(db, [run_uuid])[run_uuid]
+    return json_response(header)
+
+@router.get("/runs/{run_id}/messages", response_model=List[Dict[str, Any]])
+async def get_run_messages(
+    run_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get messages offset..offset+limit-1 of a run's log, in conversation order.
+
+    The run's total message count is sent in the `X-Total-Count` header.
+    """
+    try:
+        run_uuid = uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run ID format")
+    
+    total = db.query(run_log_length()).filter(Run.id == run_uuid).first()
+    if total is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    messages = db.execute(run_log_page(run_uuid, offset, limit)).scalars().all()
+    return json_response(messages, headers={"X-Total-Count": str(total[0])})
+
+@router.get("/runs/{run_id}/scores", response_model=List[RunScoreResponse])
+async def get_run_scores(run_id: str, db: Session = Depends(get_db)):
+    """Get a run's evaluation scores with their details; scorers that have not run yet are absent"""
+    try:
+        run_uuid = uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run ID format")
+    
+    if db.query(Run.id).filter(Run.id == run_uuid).first() is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    
+    return list_run_scores(db, run_uuid)
+
+@router.get("/runs/{run_id}/trace", response_model=RunTraceResponse)
+async def get_run_trace(run_id: str, db: Session = Depends(get_db)):
+    """Get the stage timings recorded while a run was produced"""
+    try:
+        run_uuid = uuid.UUID(run_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid run ID format")
+    
+    run_trace = db.query(RunTrace).filter(RunTrace.run_id == run_uuid).first()
+    if not run_trace:
+        # Runs made before tracing, or whose trace aged out of the retention window
+        raise HTTPException(status_code=404, detail="Trace not found")
+    
+    return json_response({"run_id": run_trace.run_id, **run_trace.trace})
+
+async def _wait_for_disconnect(request: Request):
+    """Return once the client has closed the connection"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def _cancel_on_disconnect(request: Request, coroutine):
+    """Await `coroutine`, cancelling it if the client disconnects first.
+
+    Returns (completed, result); result is None when the client went away.
+    """
+    work = asyncio.ensure_future(coroutine)
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not work.done():
+            work.cancel()
+    
+    if not work.done() or work.cancelled():
+        # Let the cancellation reach the in-flight LLM calls before returning
+        await asyncio.gather(work, return_exceptions=True)
+        return False, None
+    return True, work.result()
+
+def _saturated(e: SchedulerSaturated) -> HTTPException:
+    """429 telling the client when to try again"""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 @router.post("/run", response_model=RunResponse)
-async def run_simulation(scenario_id: str, db: Session = Depends(get_db)):
-    """Run a simulation based on a scenario and return the conversation log"""
+async def run_simulation(
+    scenario_id: str,
+    request: Request,
+    priority: Priority = "interactive",
+    db: Session = Depends(get_db)
+):
+    """Run a simulation based on a scenario and return the conversation log
+
+    Scripted workloads should pass priority=bulk so that queued interactive
+    runs are admitted ahead of them. The simulation (and its in-flight LLM
+    calls) is cancelled if the client disconnects. If it runs past its
+    deadline the participant messages are saved as a "timed_out" run and a
+    504 carrying its ID is returned.
+    
+    When the scheduler is saturated (see "Admission Control" in the README)
+    the run is refused with 429 and a Retry-After header instead of queued.
+    
+    Stage timings of saved runs are available from GET /runs/{run_id}/trace.
+    """
     try:
         # Convert string to UUID
         scenario_uuid = uuid.UUID(scenario_id)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid scenario ID format")
     
-    # Get the scenario
-    scenario = db.query(Scenario).filter(Scenario.id == scenario_uuid).first()
+    run_id = uuid.uuid4()
+    with start_trace("POST /run", scenario_id=scenario_id, priority=priority) as trace, track_usage() as usage:
+        with span("scenario.load"):
+            # Get the scenario (resolving its content if it is a stored version)
+            scenario = db.query(Scenario).filter(Scenario.id == scenario_uuid).first()
+            if not scenario:
+                raise HTTPException(status_code=404, detail="Scenario not found")
+            participants, system_prompt, settings = scenario.participants, scenario.system_prompt, scenario.settings
+        
+        try:
+            # Run the simulation
+            started = time.perf_counter()
+            completed, conversation_log = await _cancel_on_disconnect(
+                request,
+                simulation_engine.run_simulation(
+                    participants=participants,
+                    system_prompt=system_prompt,
+                    settings=settings,
+                    priority=priority,
+                    shed=True
+                )
+            )
+            if not completed:
+                # Nobody is left to read the response; nothing is saved
+                return Response(status_code=499)
+            latency_ms = int((time.perf_counter() - started) * 1000)
+            
+            # Save the run to database
+            db_run = await run_writer.save(
+                db, scenario.id, conversation_log, latency_ms=latency_ms, run_id=run_id,
+                model=settings.get("model", "gpt-4"), endpoint=settings.get("endpoint"), usage=usage
+            )
+            with span("serialize"):
+                response = json_response(run_to_dict(db_run))
+            
+        except PromptBudgetExceeded as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except SchedulerSaturated as e:
+            raise _saturated(e)
+        except SimulationTimeout as e:
+            db_run = await run_writer.save(
+                db,
+                scenario.id,
+                e.conversation_log,
+                latency_ms=int((time.perf_counter() - started) * 1000),
+                status="timed_out",
+                run_id=run_id,
+                model=settings.get("model", "gpt-4"),
+                endpoint=settings.get("endpoint"),
+                usage=usage
+            )
+            response = HTTPException(status_code=504, detail={"message": str(e), "run_id": str(db_run.id)})
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Simulation failed: {str(e)}")
+    
+    await run_writer.write(db, partial(store_trace, run_id=run_id, trace=trace))
+    if isinstance(response, HTTPException):
+        raise response
+    return response
+
+async def _run_model_variant(
+    participants: List[Dict[str, Any]],
+    system_prompt: str,
+    settings: Dict[str, Any],
+    priority: str,
+    scenario_id: str
+) -> dict:
+    """Run one model of a fan-out; the result is saved by the caller"""
+    result = {
+        "model": settings["model"],
+        "endpoint": settings.get("endpoint"),
+        "run_id": uuid.uuid4(),
+        "latency_ms": None,
+        "usage": None,
+        "error": None,
+        "log": []
+    }
+    with start_trace("POST /run/models", scenario_id=scenario_id, model=settings["model"], priority=priority) as trace, \
+            track_usage() as usage:
+        started = time.perf_counter()
+        try:
+            result["log"] = await simulation_engine.run_simulation(participants, system_prompt, settings, priority)
+            result["status"] = "completed"
+        except SimulationTimeout as e:
+            result.update(log=e.conversation_log, status="timed_out", error=str(e))
+        except PromptBudgetExceeded as e:
+            return {**result, "run_id": None, "status": "rejected", "error": str(e)}
+        except Exception as e:
+            return {**result, "run_id": None, "status": "failed", "error": str(e)}
+        result["latency_ms"] = int((time.perf_counter() - started) * 1000)
+    return {**result, "usage": usage, "trace": trace}
+
+@router.post("/run/models", response_model=ModelFanoutResponse)
+async def run_model_fanout(
+    scenario_id: str,
+    fanout: ModelFanoutRequest,
+    request: Request,
+    priority: Priority = "interactive",
+    db: Session = Depends(get_db)
+):
+    """Run a scenario against several models concurrently and return the results side by side
+
+    Each model overrides the scenario's `model` (and `endpoint`) setting and
+    its result is saved as a separate run tagged with the model, so runs can
+    be compared afterwards (POST /runs/compare). Every model's simulation is
+    admitted by the scheduler like a separate /run. A model whose prompt does
+    not fit its context window, or whose requests fail, is reported without
+    a saved run; the others are unaffected. The fan-out is admitted or
+    refused (429 with Retry-After) as a whole.
+    """
+    scenario = _get_scenario_or_404(db, scenario_id)
+    unknown = sorted({target.endpoint for target in fanout.models if target.endpoint is not None} - set(simulation_engine.endpoints))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown LLM endpoint: {', '.join(unknown)}")
+    try:
+        simulation_scheduler.check_admission(priority, count=len(fanout.models))
+    except SchedulerSaturated as e:
+        raise _saturated(e)
+    
+    participants, system_prompt = scenario.participants, scenario.system_prompt
+    completed, results = await _cancel_on_disconnect(request, asyncio.gather(*(
+        _run_model_variant(
+            participants,
+            system_prompt,
+            {**scenario.settings, "model": target.model, "endpoint": target.endpoint},
+            priority,
+            scenario_id
+        )
+        for target in fanout.models
+    )))
+    if not completed:
+        return Response(status_code=499)
+    
+    saved = [result for result in results if result["run_id"] is not None]
+    # Committed together (see run_writer.py), then their traces likewise
+    await asyncio.gather(*(
+        run_writer.save(
+            db, scenario.id, result["log"], latency_ms=result["latency_ms"], status=result["status"],
+            run_id=result["run_id"], model=result["model"], endpoint=result["endpoint"], usage=result["usage"]
+        )
+        for result in saved
+    ))
+    await asyncio.gather(*(
+        run_writer.write(db, partial(store_trace, run_id=result["run_id"], trace=result.pop("trace")))
+        for result in saved
+    ))
+    
+    return json_response({"scenario_id": scenario.id, "results": results})
+
+@router.get("/scheduler/metrics", response_model=SchedulerMetricsResponse)
+async def get_scheduler_metrics():
+    """Queue depth, running count and admission wait times per priority class"""
+    return simulation_scheduler.metrics()
+
+# Job queue endpoints
+@router.post("/jobs", response_model=JobBatchResponse)
+async def create_job_batch(batch: JobBatchCreate, db: Session = Depends(get_db)):
+    """Queue a batch of runs of a scenario; they survive server restarts (see jobs.py)"""
+    scenario = db.query(Scenario).filter(Scenario.id == batch.scenario_id).first()
     if not scenario:
         raise HTTPException(status_code=404, detail="Scenario not found")
     
+    batch_id = enqueue_jobs(db, scenario.id, batch.count, batch.priority, batch.max_attempts)
+    job_worker.wake()
+    return batch_progress(db, batch_id)
+
+@router.get("/jobs/batches/{batch_id}", response_model=JobBatchResponse)
+async def get_job_batch(batch_id: str, db: Session = Depends(get_db)):
+    """Progress of a batch: job counts per status"""
     try:
-        # Run the simulation
-        conversation_log = await simulation_engine.run_simulation(
-            participants=scenario.participants,
-            system_prompt=scenario.system_prompt,
-            settings=scenario.settings
-        )
-        
-        # Save the run to database
-        db_run = Run(
-            scenario_id=scenario.id,
-            log=conversation_log
+        batch_uuid = uuid.UUID(batch_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid batch ID format")
+    
+    progress = batch_progress(db, batch_uuid)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    return progress
+
+@router.get("/jobs/batches/{batch_id}/jobs", response_model=List[JobResponse])
+async def get_batch_jobs(
+    batch_id: str,
+    status: Optional[str] = None,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """List a batch's jobs in queue order, optionally filtered by status"""
+    try:
+        batch_uuid = uuid.UUID(batch_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid batch ID format")
+    
+    query = db.query(SimulationJob).filter(SimulationJob.batch_id == batch_uuid)
+    if status is not None:
+        query = query.filter(SimulationJob.status == status)
+    
+    return query.order_by(SimulationJob.created_at, SimulationJob.id).offset(offset).limit(limit).all()
+
+@router.delete("/jobs/batches/{batch_id}")
+async def cancel_job_batch(batch_id: str, db: Session = Depends(get_db)):
+    """Cancel a batch's queued jobs; jobs already running finish normally"""
+    try:
+        batch_uuid = uuid.UUID(batch_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid batch ID format")
+    
+    if batch_progress(db, batch_uuid) is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    cancelled_count = cancel_batch(db, batch_uuid)
+    return {"message": f"Cancelled {cancelled_count} queued jobs", "cancelled_count": cancelled_count}
+
+# Scenario template endpoints
+def _template_to_dict(template: ScenarioTemplate) -> dict:
+    return {
+        "id": template.id,
+        "name": template.name,
+        "scenario": template.body,
+        "variables": template.variables,
+        "variant_count": count_variants(template.variables),
+        "created_at": template.created_at,
+    }
+
+def _expansion_to_dict(db: Session, expansion: TemplateExpansion) -> dict:
+    return {
+        "id": expansion.id,
+        "template_id": expansion.template_id,
+        "mode": expansion.mode,
+        "seed": expansion.seed,
+        "total": expansion.total,
+        "produced": expansion.cursor,
+        "chunk_size": expansion.chunk_size,
+        "runs_per_variant": expansion.runs_per_variant,
+        "priority": expansion.priority,
+        "status": expansion.status,
+        "last_error": expansion.last_error,
+        "created_at": expansion.created_at,
+        "updated_at": expansion.updated_at,
+        "jobs": batch_progress(db, expansion.id),
+    }
+
+def _get_template_or_404(db: Session, template_id: str) -> ScenarioTemplate:
+    try:
+        template_uuid = uuid.UUID(template_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid template ID format")
+    
+    template = db.get(ScenarioTemplate, template_uuid)
+    if not template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return template
+
+def _get_expansion_or_404(db: Session, expansion_id: str) -> TemplateExpansion:
+    try:
+        expansion_uuid = uuid.UUID(expansion_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid expansion ID format")
+    
+    expansion = db.get(TemplateExpansion, expansion_uuid)
+    if not expansion:
+        raise HTTPException(status_code=404, detail="Expansion not found")
+    return expansion
+
+@router.post("/templates", response_model=TemplateResponse)
+async def create_template(template: TemplateCreate, db: Session = Depends(get_db)):
+    """Save a scenario template; its first variant must be a valid scenario (see templates.py)"""
+    db_template = ScenarioTemplate(
+        id=uuid.uuid4(),
+        name=template.name,
+        body=template.scenario,
+        variables=template.variables
+    )
+    try:
+        validate_template(template.scenario, template.variables)
+        _, _, first_variant = next(iter_variants(template.scenario, template.variables))
+        build_scenario(db_template, first_variant)
+    except TemplateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    db.add(db_template)
+    db.commit()
+    db.refresh(db_template)
+    return _template_to_dict(db_template)
+
+@router.get("/templates", response_model=List[TemplateResponse])
+async def get_templates(db: Session = Depends(get_db)):
+    """Get all scenario templates"""
+    templates = db.query(ScenarioTemplate).order_by(ScenarioTemplate.created_at.desc()).all()
+    return [_template_to_dict(template) for template in templates]
+
+@router.get("/templates/{template_id}/variants", response_model=List[TemplateVariant])
+async def preview_template_variants(
+    template_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """Render a page of a template's variants in product order without saving them"""
+    template = _get_template_or_404(db, template_id)
+    variants = iter_variants(template.body, template.variables, start=offset)
+    return [
+        {"index": index, "variables": assignment, "scenario": rendered}
+        for index, assignment, rendered in itertools.islice(variants, limit)
+    ]
+
+@router.post("/templates/{template_id}/expansions", response_model=ExpansionResponse)
+async def expand_template(template_id: str, expansion: ExpansionCreate, db: Session = Depends(get_db)):
+    """Generate a template's variants and queue runs of them, fed into the job queue in chunks"""
+    template = _get_template_or_404(db, template_id)
+    try:
+        db_expansion = create_expansion(
+            db, template, expansion.mode, expansion.count, expansion.seed, expansion.runs_per_variant,
+            expansion.priority, expansion.max_attempts, expansion.chunk_size
         )
-        
-        db.add(db_run)
+    except TemplateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    template_feeder.wake()
+    return _expansion_to_dict(db, db_expansion)
+
+@router.get("/templates/expansions/{expansion_id}", response_model=ExpansionResponse)
+async def get_template_expansion(expansion_id: str, db: Session = Depends(get_db)):
+    """Progress of an expansion: variants produced and its jobs per status"""
+    return _expansion_to_dict(db, _get_expansion_or_404(db, expansion_id))
+
+@router.delete("/templates/expansions/{expansion_id}")
+async def cancel_template_expansion(expansion_id: str, db: Session = Depends(get_db)):
+    """Stop producing variants and cancel the expansion's queued jobs"""
+    expansion = _get_expansion_or_404(db, expansion_id)
+    if expansion.status in ("running", "completed"):
+        expansion.status = "cancelled"
+        expansion.updated_at = datetime.utcnow()
         db.commit()
-        db.refresh(db_run)
-        
-        return db_run
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Simulation failed: {str(e)}")
+    
+    cancelled_count = cancel_batch(db, expansion.id)
+    return {"message": f"Cancelled {cancelled_count} queued jobs", "cancelled_count": cancelled_count}
+
+@router.websocket("/ws/simulate")
+async def live_simulation(
+    websocket: WebSocket,
+    scenario_id: str,
+    interactive: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Run a simulation over a WebSocket, streaming each event as it is produced (see live.py)"""
+    await websocket.accept()
+    
+    try:
+        # Convert string to UUID
+        scenario_uuid = uuid.UUID(scenario_id)
+    except ValueError:
+        await websocket.send_json({"type": "error", "detail": "Invalid scenario ID format"})
+        await websocket.close(code=1008)
+        return
+    
+    scenario = db.query(Scenario).filter(Scenario.id == scenario_uuid).first()
+    if not scenario:
+        await websocket.send_json({"type": "error", "detail": "Scenario not found"})
+        await websocket.close(code=1008)
+        return
+    
+    await LiveSimulationSession(websocket, db, scenario, interactive=interactive).run()
 
 @router.patch("/runs/{run_id}/star", response_model=RunResponse)
 async def toggle_star(run_id: str, star_request: StarUpdateRequest, db: Session = Depends(get_db)):
@@ -124,11 +820,14 @@ async def toggle_star(run_id: str, star_request: StarUpdateRequest, db: Session
         raise HTTPException(status_code=404, detail="Run not found")
     
     # Update starred status
-    run.starred = star_request.starred
+    if run.starred != star_request.starred:
+        run.starred = star_request.starred
+        record_star_changed(db, run, run.starred)
+        record_run_changes(db, [run.id])
     db.commit()
     db.refresh(run)
     
-    return run
+    return json_response(run_to_dict(run, current_scores(db, [run.id])[run.id]))
 
 @router.delete("/runs/{run_id}")
 async def delete_run(run_id: str, db: Session = Depends(get_db)):
@@ -145,8 +844,7 @@ async def delete_run(run_id: str, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Run not found")
     
     # Delete the run
-    db.delete(run)
-    db.commit()
+    delete_runs(db, [run])
     
     return {"message": "Run deleted successfully"}
 
@@ -154,7 +852,6 @@ async def delete_run(run_id: str, db: Session = Depends(get_db)):
 async def delete_all_unstarred_runs(db: Session = Depends(get_db)):
     """Delete all simulation runs except starred ones"""
     # Delete only unstarred runs
-    deleted_count = db.query(Run).filter(Run.starred == False).delete()
-    db.commit()
+    deleted_count = delete_runs(db, db.query(Run).filter(Run.starred == False).all())
     
     return {"message": f"Deleted {deleted_count} unstarred runs", "deleted_count": deleted_count} 
\ No newline at end of file
@@ -0,0 +1,262 @@
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+# Load environment variables from .env file (before the modules that read them)
+load_dotenv()
+
+from pydantic import ValidationError
+
+from database import SessionLocal, Scenario
+from persistence import prepare_database, store_trace
+from run_writer import run_writer
+from scheduler import simulation_scheduler
+from schemas import ScenarioCreate
+from simulation import simulation_engine, SimulationTimeout
+from token_budget import track_usage
+from tracing import start_trace
+
+# Headless runner for bulk simulations.
+#
+#   python run_scenarios.py scenarios.jsonl --runs 5 --concurrency 16
+#   python run_scenarios.py --scenario-id 3f2c... --runs 100
+#
+# Scenario files hold the same JSON as the body of POST /scenarios: a .jsonl
+# file has one scenario per line, a .json file one scenario or a list of them.
+# They are validated and saved as new scenarios, then every scenario (plus any
+# existing ones named with --scenario-id) is run --runs times.
+#
+# Everything happens in this process, with no HTTP server: a fixed pool of
+# workers on one event loop takes runs from a lazy work list, calls the model
+# and saves each run through the run writer, exactly as POST /run would
+# (statistics, change feed, signatures and trace included; scores are computed
+# by the server's startup sweep). The concurrency limit applies to this process's own
+# scheduler, independently of any running server.
+
+PROGRESS_SECONDS = 2.0
+
+def load_scenario_file(path: str) -> List[Dict[str, Any]]:
+    """Scenario dicts from a .json or .jsonl file"""
+    with open(path, encoding="utf-8") as scenario_file:
+        if path.endswith(".jsonl"):
+            scenarios = []
+            for line_number, line in enumerate(scenario_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    scenarios.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise SystemExit(f"{path}:{line_number}: invalid JSON ({e})")
+            return scenarios
+        try:
+            content = json.load(scenario_file)
+        except json.JSONDecodeError as e:
+            raise SystemExit(f"{path}: invalid JSON ({e})")
+    return content if isinstance(content, list) else [content]
+
+def save_scenarios(db, path: str) -> List[Scenario]:
+    """Validate and save the scenarios of a file, all or none"""
+    scenarios = []
+    for index, data in enumerate(load_scenario_file(path), start=1):
+        try:
+            scenario = ScenarioCreate(**data)
+        except (TypeError, ValidationError) as e:
+            raise SystemExit(f"{path}: scenario {index} is invalid: {e}")
+        if scenario.settings.endpoint is not None and scenario.settings.endpoint not in simulation_engine.endpoints:
+            raise SystemExit(f"{path}: scenario {index} uses unknown LLM endpoint {scenario.settings.endpoint}")
+
+        scenario_id = uuid.uuid4()
+        scenarios.append(Scenario(
+            id=scenario_id,
+            lineage_id=scenario_id,
+            name=scenario.name,
+            participants=[participant.dict() for participant in scenario.participants],
+            system_prompt=scenario.system_prompt,
+            settings=scenario.settings.dict()
+        ))
+    db.add_all(scenarios)
+    db.commit()
+    return scenarios
+
+def existing_scenarios(db, scenario_ids: List[str]) -> List[Scenario]:
+    scenarios = []
+    for scenario_id in scenario_ids:
+        try:
+            scenario = db.get(Scenario, uuid.UUID(scenario_id))
+        except ValueError:
+            raise SystemExit(f"Invalid scenario ID format: {scenario_id}")
+        if scenario is None:
+            raise SystemExit(f"Scenario not found: {scenario_id}")
+        scenarios.append(scenario)
+    return scenarios
+
+@dataclass
+class RunnerStats:
+    total: int
+    started_at: float = field(default_factory=time.perf_counter)
+    completed: int = 0
+    timed_out: int = 0
+    failed: int = 0
+    total_tokens: int = 0
+    latencies_ms: List[int] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def finished(self) -> int:
+        return self.completed + self.timed_out + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def progress(self) -> str:
+        rate = self.finished / self.elapsed if self.elapsed else 0.0
+        return f"   {self.finished}/{self.total} runs, {rate:.1f} runs/s, {self.failed} failed"
+
+    def summary(self) -> List[str]:
+        lines = [
+            f"   Runs: {self.completed} completed, {self.timed_out} timed out, {self.failed} failed of {self.total}",
+            f"   Time: {self.elapsed:.1f}s, {self.finished / self.elapsed if self.elapsed else 0.0:.2f} runs/s",
+            f"   Tokens: {self.total_tokens}",
+        ]
+        if self.latencies_ms:
+            latencies = sorted(self.latencies_ms)
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            lines.append(f"   Latency: median {statistics.median(latencies):.0f} ms, p95 {p95} ms")
+        for error in self.errors[:5]:
+            lines.append(f"   Error: {error}")
+        return lines
+
+@dataclass
+class LoadedScenario:
+    """What a run needs from a scenario, read while its session was open"""
+    id: uuid.UUID
+    name: str
+    participants: List[Dict[str, Any]]
+    system_prompt: str
+    settings: Dict[str, Any]
+
+    @classmethod
+    def load(cls, scenario: Scenario) -> "LoadedScenario":
+        # Versions resolve their content through the session (see versioning.py)
+        return cls(
+            id=scenario.id,
+            name=scenario.name,
+            participants=scenario.participants,
+            system_prompt=scenario.system_prompt,
+            settings=scenario.settings
+        )
+
+def _work(scenarios: List[LoadedScenario], runs: int) -> Iterator[LoadedScenario]:
+    """Each scenario's runs in turn; generated as workers ask for them"""
+    for scenario in scenarios:
+        for _ in range(runs):
+            yield scenario
+
+async def _run_one(db, scenario: LoadedScenario, stats: RunnerStats):
+    run_id = uuid.uuid4()
+    settings = scenario.settings
+    with start_trace("cli", scenario_id=str(scenario.id)) as trace, track_usage() as usage:
+        started = time.perf_counter()
+        try:
+            conversation_log = await simulation_engine.run_simulation(
+                participants=scenario.participants,
+                system_prompt=scenario.system_prompt,
+                settings=settings
+            )
+            status = "completed"
+        except SimulationTimeout as e:
+            conversation_log = e.conversation_log
+            status = "timed_out"
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        await run_writer.save(
+            db, scenario.id, conversation_log, latency_ms=latency_ms, status=status, run_id=run_id,
+            model=settings.get("model", "gpt-4"), endpoint=settings.get("endpoint"), usage=usage
+        )
+    await run_writer.write(db, partial(store_trace, run_id=run_id, trace=trace))
+
+    if status == "completed":
+        stats.completed += 1
+    else:
+        stats.timed_out += 1
+    stats.latencies_ms.append(latency_ms)
+    stats.total_tokens += usage["total_tokens"]
+
+async def _worker(work: Iterator[LoadedScenario], stats: RunnerStats):
+    db = SessionLocal()
+    try:
+        # Workers share one iterator; the event loop runs one next() at a time
+        for scenario in work:
+            try:
+                await _run_one(db, scenario, stats)
+            except Exception as e:
+                db.rollback()
+                stats.failed += 1
+                stats.errors.append(f"{scenario.name}: {e}")
+    finally:
+        db.close()
+
+async def _report_progress(stats: RunnerStats):
+    while True:
+        await asyncio.sleep(PROGRESS_SECONDS)
+        print(stats.progress(), flush=True)
+
+async def run_scenarios(scenarios: List[LoadedScenario], runs: int, concurrency: int, stats: RunnerStats):
+    """Run every scenario `runs` times with at most `concurrency` simulations at once"""
+    # Nothing else competes for this process's scheduler, so every run is interactive
+    simulation_scheduler.resize(concurrency)
+    run_writer.start()
+    work = _work(scenarios, runs)
+    reporter = asyncio.create_task(_report_progress(stats))
+    try:
+        await asyncio.gather(*(_worker(work, stats) for _ in range(min(concurrency, stats.total))))
+    finally:
+        reporter.cancel()
+        await run_writer.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run scenarios in bulk without the HTTP server")
+    parser.add_argument("files", nargs="*", help="Scenario files (.json or .jsonl) to save and run")
+    parser.add_argument("--scenario-id", action="append", default=[], help="Also run an existing scenario (repeatable)")
+    parser.add_argument("--runs", type=int, default=1, help="Runs per scenario (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Simulations at once (default: %(default)s)")
+    args = parser.parse_args(argv)
+    if not args.files and not args.scenario_id:
+        parser.error("give at least one scenario file or --scenario-id")
+    if args.runs < 1 or args.concurrency < 1:
+        parser.error("--runs and --concurrency must be at least 1")
+
+    prepare_database()
+    db = SessionLocal()
+    try:
+        scenarios = existing_scenarios(db, args.scenario_id)
+        for path in args.files:
+            saved = save_scenarios(db, path)
+            print(f"   {path}: saved {len(saved)} scenarios")
+            scenarios.extend(saved)
+        scenarios = [LoadedScenario.load(scenario) for scenario in scenarios]
+    finally:
+        db.close()
+
+    stats = RunnerStats(total=len(scenarios) * args.runs)
+    print(f"🚀 Running {len(scenarios)} scenarios x {args.runs} = {stats.total} runs, {args.concurrency} at a time")
+    try:
+        asyncio.run(run_scenarios(scenarios, args.runs, args.concurrency, stats))
+    except KeyboardInterrupt:
+        print("⚠️  Interrupted; runs in flight were not saved")
+    for line in stats.summary():
+        print(line)
+    print("✅ Done" if stats.failed == 0 else "❌ Some runs failed")
+    return 0 if stats.failed == 0 else 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
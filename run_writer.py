@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Run
+from evaluation import evaluation_pipeline
+from persistence import save_run, insert_runs
+from tracing import Trace, attach_trace, span, start_trace
+
+# Group commit for finished runs.
+#
+# save_run() commits each run in its own transaction: with many simulations
+# finishing at once, every one of them pays for a write lock and a sync to
+# disk (on SQLite, one fsync per run). The run writer collects runs from all
+# callers and saves them in shared transactions instead. Batches are committed
+# one at a time in a worker thread, so the event loop keeps serving while a
+# commit waits for the disk, and the runs that finish meanwhile form the next
+# batch. A batch holds at most RUN_WRITE_BATCH_SIZE runs; RUN_WRITE_MAX_DELAY_MS
+# (default 0) makes a batch that is not full wait that long for more runs.
+# Callers await their run and get it back once its batch has committed,
+# exactly as save_run() returns it; nothing is acknowledged before it is
+# durable.
+#
+# The other writes that follow a run go through the writer as well: its trace
+# (see persistence.store_trace), a job's completion and the evaluator's scores
+# are written by write() as part of the next batch, so a run costs no commit of
+# its own anywhere on its way.
+#
+# If a batch fails (e.g. a job's pre-assigned run ID already exists), its
+# runs and writes are retried one at a time so that only the offending
+# caller sees the error.
+#
+# The commit thread traces each batch (db.insert and db.commit with their SQL
+# statements), and every caller's trace gets a copy of its batch's spans inside
+# its own db.save span.
+
+RUN_WRITE_BATCH_SIZE = int(os.getenv("RUN_WRITE_BATCH_SIZE", "64"))
+RUN_WRITE_MAX_DELAY_MS = float(os.getenv("RUN_WRITE_MAX_DELAY_MS", "0"))
+
+logger = logging.getLogger(__name__)
+
+class RunWriter:
+    """Saves runs and follow-up writes from concurrent callers in batched transactions"""
+
+    def __init__(self, batch_size: int = RUN_WRITE_BATCH_SIZE, max_delay_ms: float = RUN_WRITE_MAX_DELAY_MS):
+        self.batch_size = batch_size
+        self.max_delay = max_delay_ms / 1000
+        self.batches = 0
+        self.runs = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._loop_task is None:
+            self._queue = asyncio.Queue()
+            self._loop_task = asyncio.create_task(self._write_loop())
+
+    async def stop(self):
+        """Write the runs and writes already waiting, then stop; later ones are written directly"""
+        if self._loop_task is None:
+            return
+        loop_task, self._loop_task = self._loop_task, None
+        self._queue.put_nowait(None)  # Reached after everything queued before it
+        await loop_task
+        self._queue = None
+
+    async def save(
+        self,
+        db: Session,
+        scenario_id: uuid.UUID,
+        log: List[Dict[str, Any]],
+        latency_ms: Optional[int] = None,
+        status: str = "completed",
+        run_id: Optional[uuid.UUID] = None,
+        model: Optional[str] = None,
+        endpoint: Optional[str] = None,
+        usage: Optional[Dict[str, Any]] = None
+    ) -> Run:
+        """Save a run like save_run() does, as part of the next batch
+
+        `db` is only used when the writer is not running, in which case the
+        run is saved right away with save_run().
+        """
+        if self._loop_task is None:
+            with span("db.save"):
+                return save_run(
+                    db, scenario_id, log, latency_ms=latency_ms, status=status, run_id=run_id,
+                    model=model, endpoint=endpoint, usage=usage
+                )
+
+        fields = {
+            "id": run_id or uuid.uuid4(),
+            "scenario_id": scenario_id,
+            "log": log,
+            "latency_ms": latency_ms,
+            "status": status,
+            "model": model,
+            "endpoint": endpoint,
+            "usage": usage,
+        }
+        with span("db.save") as record:
+            return await self._enqueue("run", fields, record)
+
+    async def write(self, db: Session, write: Callable[[Session], Any]) -> Any:
+        """Run `write(session)` as part of the next batch and return its result once committed
+
+        `write` adds to the batch's transaction and must not commit; it is
+        called in the commit thread, so it should only use the session it is
+        given and plain values (IDs, finished traces). When the writer is not
+        running it is called with `db`, which is then committed.
+        """
+        if self._loop_task is None:
+            with span("db.write"):
+                result = write(db)
+                db.commit()
+                return result
+
+        with span("db.write") as record:
+            return await self._enqueue("write", write, record)
+
+    async def _enqueue(self, kind: str, payload: Any, record: Optional[Dict[str, Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((kind, payload, future))
+        # Written even if the caller stops waiting for it
+        result, batch_trace = await asyncio.shield(future)
+        attach_trace(batch_trace)
+        if record is not None and batch_trace is not None:
+            record["attributes"].update(batch_trace.attributes)
+        return result
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            batch_trace = None
+            try:
+                outcomes, batch_trace = await asyncio.to_thread(self._commit, [(kind, payload) for kind, payload, _ in batch])
+            except Exception as e:
+                logger.exception("Writing a batch of %d items failed", len(batch))
+                outcomes = [(None, e)] * len(batch)
+            self._resolve(batch, outcomes, batch_trace)
+
+    def _resolve(
+        self,
+        batch: List[Tuple[str, Any, asyncio.Future]],
+        outcomes: List[Tuple[Any, Optional[Exception]]],
+        batch_trace: Optional[Trace]
+    ):
+        """Hand each caller its saved run or write result and the batch's trace, or its error"""
+        self.batches += 1
+        for (kind, _, future), (result, error) in zip(batch, outcomes):
+            if error is None:
+                if kind == "run":
+                    self.runs += 1
+                    evaluation_pipeline.submit(result.id)
+                else:
+                    self.writes += 1
+            if future.done():
+                continue
+            if error is None:
+                future.set_result((result, batch_trace))
+            else:
+                future.set_exception(error)
+
+    def _commit(self, batch: List[Tuple[str, Any]]) -> Tuple[List[Tuple[Any, Optional[Exception]]], Trace]:
+        """Write a batch in one transaction; (result, None) or (None, error) per item, and the batch's trace"""
+        # Saved runs keep their loaded attributes for the callers after commit
+        db = SessionLocal(expire_on_commit=False)
+        try:
+            with start_trace("run_writer.batch", batch_size=len(batch)) as batch_trace:
+                try:
+                    runs = [Run(**payload) for kind, payload in batch if kind == "run"]
+                    if runs:
+                        with span("db.insert"):
+                            insert_runs(db, runs)
+                    saved = iter(runs)
+                    results = [next(saved) if kind == "run" else self._apply(db, payload) for kind, payload in batch]
+                    with span("db.commit"):
+                        db.commit()
+                    db.expunge_all()
+                    return [(result, None) for result in results], batch_trace
+                except Exception:
+                    db.rollback()
+                    logger.warning("Writing a batch of %d items failed; writing them one by one", len(batch))
+                    return [self._commit_one(db, kind, payload) for kind, payload in batch], batch_trace
+        finally:
+            db.close()
+
+    def _apply(self, db: Session, write: Callable[[Session], Any]) -> Any:
+        with span("db.write"):
+            return write(db)
+
+    def _commit_one(self, db: Session, kind: str, payload: Any) -> Tuple[Any, Optional[Exception]]:
+        try:
+            if kind == "run":
+                result = Run(**payload)
+                with span("db.insert"):
+                    insert_runs(db, [result])
+            else:
+                result = self._apply(db, payload)
+            with span("db.commit"):
+                db.commit()
+            # Out of reach of a later rollback, which would expire it
+            db.expunge_all()
+            return result, None
+        except Exception as e:
+            db.rollback()
+            return None, e
+
+# Global run writer, started with the application
+run_writer = RunWriter()
@@ -0,0 +1,264 @@
+import asyncio
+import itertools
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Any, List
+
+from tracing import span
+
+# Priority classes for simulations sharing the upstream LLM capacity.
+#
+# Admission uses start-time fair queuing: each request gets a virtual start tag
+# of max(virtual time, its class's last tag) + 1 / weight, and the queued request
+# with the smallest tag runs next. A class with weight 16 is therefore admitted
+# 16 times as often as a class with weight 1 while both have work queued, so an
+# interactive run jumps ahead of a queued bulk sweep without starving it.
+# Per-class caps keep bulk work from occupying every slot, leaving headroom for
+# interactive runs that arrive mid-sweep. Running simulations are never
+# interrupted; "preemption" happens at admission.
+#
+# Admission control: callers that can be told to come back later (the /run
+# endpoints) ask for a sheddable slot. When one would have to queue behind
+# ADMISSION_MAX_QUEUED others in its class, or the class's oldest waiter has
+# already waited ADMISSION_MAX_QUEUE_WAIT_SECONDS, it is refused with
+# SchedulerSaturated instead, carrying a Retry-After estimate from the recent
+# slot hold times. Background work (jobs, judges, live sessions) always queues.
+
+MAX_CONCURRENCY = int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+BULK_MAX_CONCURRENCY = int(os.getenv("SCHEDULER_BULK_MAX_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "32"))
+ADMISSION_MAX_QUEUE_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT_SECONDS", "30"))
+
+# Slot hold time assumed before any simulation has finished, and the weight of
+# each new sample in the running average
+DEFAULT_HOLD_SECONDS = 10.0
+HOLD_SMOOTHING = 0.2
+MAX_RETRY_AFTER_SECONDS = 120
+
+PRIORITY_CLASSES = {
+    # name: (weight, max concurrent simulations; None for every slot)
+    "interactive": (16, None),
+    "bulk": (1, BULK_MAX_CONCURRENCY),
+}
+
+class SchedulerSaturated(Exception):
+    """A sheddable simulation was refused because its priority class is saturated"""
+
+    def __init__(self, priority: str, queued: int, retry_after: int):
+        self.priority = priority
+        self.queued = queued
+        self.retry_after = retry_after
+        super().__init__(
+            f"Too many {priority} simulations queued ({queued}); retry in {retry_after}s"
+        )
+
+@dataclass
+class _Waiter:
+    tag: float
+    seq: int
+    enqueued_at: float
+    future: asyncio.Future
+
+@dataclass
+class _PriorityClass:
+    name: str
+    weight: int
+    max_concurrency: int
+    queue: Deque[_Waiter] = field(default_factory=deque)
+    last_tag: float = 0.0
+    running: int = 0
+    admitted: int = 0
+    completed: int = 0
+    max_queue_depth: int = 0
+    wait_total_ms: float = 0.0
+    wait_max_ms: float = 0.0
+    rejected: int = 0
+    avg_hold_seconds: float = DEFAULT_HOLD_SECONDS
+
+class SimulationScheduler:
+    """Admits simulations by priority class with weighted fair queuing and per-class caps"""
+
+    def __init__(
+        self,
+        max_concurrency: int = MAX_CONCURRENCY,
+        classes: Dict[str, tuple] = PRIORITY_CLASSES,
+        max_queued: int = ADMISSION_MAX_QUEUED,
+        max_queue_wait_seconds: float = ADMISSION_MAX_QUEUE_WAIT_SECONDS
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.max_queue_wait_seconds = max_queue_wait_seconds
+        self._class_caps = {name: cap for name, (_, cap) in classes.items()}
+        self._classes = {
+            name: _PriorityClass(name, weight, self._class_cap(name))
+            for name, (weight, _) in classes.items()
+        }
+        self._running = 0
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    @property
+    def priorities(self):
+        return list(self._classes)
+
+    def resize(self, max_concurrency: int):
+        """Change the number of simulations allowed to run at once, e.g. for a standalone runner"""
+        self.max_concurrency = max_concurrency
+        for name, priority_class in self._classes.items():
+            priority_class.max_concurrency = self._class_cap(name)
+        self._dispatch()
+
+    def _class_cap(self, name: str) -> int:
+        cap = self._class_caps[name]
+        return self.max_concurrency if cap is None else min(cap, self.max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self, priority: str = "interactive", shed: bool = False):
+        """Wait for a slot in `priority`'s class and hold it for the body of the block
+
+        With shed=True the caller is refused with SchedulerSaturated rather
+        than queued while the class is saturated.
+        """
+        if priority not in self._classes:
+            raise ValueError(f"Unknown priority class: {priority}")
+        priority_class = self._classes[priority]
+        if shed:
+            self.check_admission(priority)
+
+        waiter = self._enqueue(priority_class)
+        try:
+            with span("scheduler.wait", priority=priority):
+                await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(priority_class)  # Admitted just as the caller went away
+            elif waiter in priority_class.queue:
+                priority_class.queue.remove(waiter)
+            raise
+
+        admitted_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            priority_class.completed += 1
+            held = time.perf_counter() - admitted_at
+            priority_class.avg_hold_seconds += HOLD_SMOOTHING * (held - priority_class.avg_hold_seconds)
+            self._release(priority_class)
+
+    def check_admission(self, priority: str, count: int = 1):
+        """Raise SchedulerSaturated unless `count` more simulations may join `priority`'s class"""
+        priority_class = self._classes[priority]
+        if self._saturation(priority_class, count):
+            priority_class.rejected += count
+            raise SchedulerSaturated(priority, len(priority_class.queue), self._retry_after(priority_class))
+
+    def _saturation(self, priority_class: _PriorityClass, count: int = 1) -> List[str]:
+        """Reasons `count` new simulations would be refused; empty while they are welcome"""
+        free = min(
+            self.max_concurrency - self._running,
+            priority_class.max_concurrency - priority_class.running
+        )
+        waiting = len(priority_class.queue) + count - max(free, 0)
+        if waiting <= 0:
+            return []  # Admitted at once
+
+        reasons = []
+        if waiting > self.max_queued:
+            reasons.append(f"{priority_class.name} queue full ({len(priority_class.queue)} queued)")
+        if priority_class.queue and self.max_queue_wait_seconds > 0:
+            oldest_wait = time.perf_counter() - priority_class.queue[0].enqueued_at
+            if oldest_wait > self.max_queue_wait_seconds:
+                reasons.append(f"{priority_class.name} queue stalled (oldest waiting {oldest_wait:.0f}s)")
+        return reasons
+
+    def _retry_after(self, priority_class: _PriorityClass) -> int:
+        """Seconds until the class has likely worked through its current queue"""
+        rounds = (len(priority_class.queue) + 1) / max(priority_class.max_concurrency, 1)
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(rounds * priority_class.avg_hold_seconds)))
+
+    def readiness(self, priority: str = "interactive") -> Dict[str, Any]:
+        """Whether a new sheddable simulation in `priority`'s class would be accepted"""
+        priority_class = self._classes[priority]
+        reasons = self._saturation(priority_class)
+        return {
+            "ready": not reasons,
+            "reasons": reasons,
+            "retry_after": self._retry_after(priority_class) if reasons else None,
+            "running": self._running,
+            "queued": sum(len(c.queue) for c in self._classes.values()),
+        }
+
+    def _enqueue(self, priority_class: _PriorityClass) -> _Waiter:
+        tag = max(self._virtual_time, priority_class.last_tag) + 1 / priority_class.weight
+        priority_class.last_tag = tag
+        waiter = _Waiter(tag, next(self._seq), time.perf_counter(), asyncio.get_running_loop().create_future())
+        priority_class.queue.append(waiter)
+        priority_class.max_queue_depth = max(priority_class.max_queue_depth, len(priority_class.queue))
+        self._dispatch()
+        return waiter
+
+    def _release(self, priority_class: _PriorityClass):
+        priority_class.running -= 1
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admit queued simulations, smallest start tag first, while capacity allows"""
+        while self._running < self.max_concurrency:
+            eligible = [
+                priority_class for priority_class in self._classes.values()
+                if priority_class.queue and priority_class.running < priority_class.max_concurrency
+            ]
+            if not eligible:
+                return
+
+            priority_class = min(eligible, key=lambda c: (c.queue[0].tag, c.queue[0].seq))
+            waiter = priority_class.queue.popleft()
+            if waiter.future.done():
+                continue  # Cancelled while queued
+
+            self._virtual_time = waiter.tag
+            priority_class.running += 1
+            priority_class.admitted += 1
+            self._running += 1
+
+            waited_ms = (time.perf_counter() - waiter.enqueued_at) * 1000
+            priority_class.wait_total_ms += waited_ms
+            priority_class.wait_max_ms = max(priority_class.wait_max_ms, waited_ms)
+            waiter.future.set_result(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queued": self.max_queued,
+            "running": self._running,
+            "queued": sum(len(priority_class.queue) for priority_class in self._classes.values()),
+            "classes": [
+                {
+                    "priority": priority_class.name,
+                    "weight": priority_class.weight,
+                    "max_concurrency": priority_class.max_concurrency,
+                    "queue_depth": len(priority_class.queue),
+                    "max_queue_depth": priority_class.max_queue_depth,
+                    "running": priority_class.running,
+                    "admitted": priority_class.admitted,
+                    "completed": priority_class.completed,
+                    "avg_wait_ms": (
+                        priority_class.wait_total_ms / priority_class.admitted
+                        if priority_class.admitted else None
+                    ),
+                    "max_wait_ms": priority_class.wait_max_ms,
+                    "rejected": priority_class.rejected,
+                    "avg_hold_seconds": round(priority_class.avg_hold_seconds, 3),
+                    "saturated": bool(self._saturation(priority_class)),
+                }
+                for priority_class in self._classes.values()
+            ],
+        }
+
+# Global scheduler shared by every simulation entry point
+simulation_scheduler = SimulationScheduler()
@@ -1,8 +1,11 @@
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Literal
 from datetime import datetime
 import uuid
 
+# Scheduler priority classes (see scheduler.py)
+Priority = Literal["interactive", "bulk"]
+
 class ParticipantModel(BaseModel):
     name: str
     role: str
@@ -12,14 +15,23 @@ class ParticipantModel(BaseModel):
 
 class SettingsModel(BaseModel):
     model: str = "gpt-4"
+    # Named OpenAI-compatible endpoint from LLM_ENDPOINTS; None sends requests to OpenAI
+    endpoint: Optional[str] = None
     temperature: float = Field(ge=0.0, le=2.0, default=0.7)
     max_tokens: int = Field(gt=0, default=400)
+    # Abort the simulation after this many seconds (falls back to RUN_DEADLINE_SECONDS)
+    deadline_seconds: Optional[float] = Field(gt=0, default=None)
+    # "group": one mediator reply to everyone; "per_participant": one reply per participant, requested concurrently
+    mediation_mode: Literal["group", "per_participant"] = "group"
+    # What to do when a request does not fit the model's context window (see token_budget.py)
+    budget_strategy: Literal["error", "truncate", "compact"] = "error"
 
 class ScenarioCreate(BaseModel):
     name: str
     participants: List[ParticipantModel]
     system_prompt: str
     settings: SettingsModel
+    parent_id: Optional[uuid.UUID] = None  # Save as a new version of this scenario
 
 class ScenarioResponse(BaseModel):
     id: uuid.UUID
@@ -28,29 +40,315 @@ class ScenarioResponse(BaseModel):
     system_prompt: str
     settings: Dict[str, Any]
     created_at: datetime
+    parent_id: Optional[uuid.UUID] = None
+    version: int = 1
 
     class Config:
         from_attributes = True
 
+class TokenUsage(BaseModel):
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    requests: int  # Chat requests the totals cover
+    estimated: bool = False  # Counted locally for some requests (e.g. replayed from a cassette)
+
 class RunResponse(BaseModel):
     id: uuid.UUID
     scenario_id: uuid.UUID
     timestamp: datetime
     starred: bool
+    status: str = "completed"
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+    scores: Dict[str, float] = {}  # Value per enabled scorer; filled in shortly after the run is saved
     log: List[Dict[str, Any]]
 
     class Config:
         from_attributes = True
 
+class RunHeader(BaseModel):
+    """A run without its log, for opening large runs page by page"""
+    id: uuid.UUID
+    scenario_id: uuid.UUID
+    timestamp: datetime
+    starred: bool
+    status: str = "completed"
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    usage: Optional[TokenUsage] = None
+    scores: Dict[str, float] = {}
+    message_count: int  # Messages in the log; fetch them with GET /runs/{id}/messages
+
 class RunSummary(BaseModel):
     id: uuid.UUID
     scenario_id: uuid.UUID
     timestamp: datetime
     starred: bool
+    status: str = "completed"
+    model: Optional[str] = None
     scenario_name: Optional[str] = None
+    scores: Dict[str, float] = {}
 
     class Config:
         from_attributes = True
 
 class StarUpdateRequest(BaseModel):
-    starred: bool 
\ No newline at end of file
+    starred: bool
+
+class RunChangesResponse(BaseModel):
+    version: int  # Pass as `since` to get the changes after these
+    reset: bool = False  # `since` is unknown to this database; discard cached runs and start from 0
+    runs: List[RunSummary]  # Runs saved or updated since, in their current state
+    deleted: List[uuid.UUID]  # Runs deleted since
+    has_more: bool = False  # More changes are waiting; ask again with `version`
+
+class RunCompareRequest(BaseModel):
+    run_ids: List[uuid.UUID] = Field(min_length=2, max_length=100)
+
+class AlignedMessage(BaseModel):
+    speaker: str
+    turn: int
+    contents: List[Optional[str]]  # One entry per compared run, None if the run has no such message
+    identical: bool
+
+class DiffOperation(BaseModel):
+    op: str  # equal, replace, insert or delete
+    baseline: str
+    other: str
+
+class MediatorDiff(BaseModel):
+    run_id: uuid.UUID
+    similarity: float
+    operations: List[DiffOperation]
+
+class RunStats(BaseModel):
+    run_id: uuid.UUID
+    timestamp: datetime
+    message_count: int
+    mediator_characters: int
+    mediator_words: int
+    mediator_tokens: int
+    total_tokens: int
+
+class RunComparisonResponse(BaseModel):
+    run_ids: List[uuid.UUID]
+    baseline_run_id: uuid.UUID
+    aligned_messages: List[AlignedMessage]
+    mediator_diffs: List[MediatorDiff]
+    run_stats: List[RunStats]
+
+class HistogramBucket(BaseModel):
+    lower: float
+    upper: Optional[float] = None  # None for the open-ended last bucket
+    count: int
+
+class ScenarioStatsResponse(BaseModel):
+    scenario_id: uuid.UUID
+    run_count: int
+    starred_count: int
+    error_count: int
+    error_rate: float
+    reply_count: int
+    avg_reply_length: Optional[float] = None
+    avg_latency_ms: Optional[float] = None
+    reply_length_histogram: List[HistogramBucket]
+    latency_histogram: List[HistogramBucket]
+    updated_at: Optional[datetime] = None
+
+class ClusterMember(BaseModel):
+    run_id: uuid.UUID
+    message_index: int
+    preview: str
+
+class ResponseCluster(BaseModel):
+    size: int
+    members: List[ClusterMember]
+
+class DiversityResponse(BaseModel):
+    scenario_id: uuid.UUID
+    threshold: float
+    message_count: int
+    cluster_count: int
+    diversity_score: Optional[float] = None  # Clusters per mediator message; None without messages
+    clusters: List[ResponseCluster]  # Near-duplicate clusters (two or more messages), largest first
+
+class SchedulerClassMetrics(BaseModel):
+    priority: str
+    weight: int
+    max_concurrency: int
+    queue_depth: int
+    max_queue_depth: int
+    running: int
+    admitted: int
+    completed: int
+    avg_wait_ms: Optional[float] = None
+    max_wait_ms: float
+    rejected: int  # Sheddable simulations refused with 429
+    avg_hold_seconds: float  # Recent average time a simulation holds its slot
+    saturated: bool
+
+class SchedulerMetricsResponse(BaseModel):
+    max_concurrency: int
+    max_queued: int
+    running: int
+    queued: int
+    classes: List[SchedulerClassMetrics]
+
+class JobBatchCreate(BaseModel):
+    scenario_id: uuid.UUID
+    count: int = Field(ge=1, le=10000, default=1)  # Runs of the scenario to queue
+    priority: Priority = "bulk"
+    max_attempts: int = Field(ge=1, le=10, default=3)
+
+class JobBatchResponse(BaseModel):
+    batch_id: uuid.UUID
+    total: int
+    queued: int
+    running: int
+    completed: int
+    failed: int
+    cancelled: int
+
+class JobResponse(BaseModel):
+    id: uuid.UUID
+    batch_id: uuid.UUID
+    scenario_id: uuid.UUID
+    run_id: uuid.UUID  # The run this job creates, once completed
+    priority: str
+    status: str
+    attempts: int
+    max_attempts: int
+    retry_at: Optional[datetime] = None  # Set while a failed job waits to be retried
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ScenarioVersionSummary(BaseModel):
+    id: uuid.UUID
+    version: int
+    parent_id: Optional[uuid.UUID] = None
+    name: str
+    created_at: datetime
+    storage: str  # "snapshot" (full content) or "delta" (changes against the parent)
+    changed_fields: Optional[List[str]] = None  # Fields stored by a delta version
+    run_count: int
+
+class FieldChange(BaseModel):
+    path: str  # e.g. "system_prompt", "settings.temperature", "participants[1].perspective"
+    before: Any = None
+    after: Any = None
+
+class VersionComparisonResponse(BaseModel):
+    base: ScenarioVersionSummary
+    other: ScenarioVersionSummary
+    changes: List[FieldChange]
+    stats: List[ScenarioStatsResponse]  # Run statistics for base and other, in that order
+
+class TokenEstimateResponse(BaseModel):
+    model: str
+    context_window: int
+    max_tokens: int
+    prompt_tokens: int  # Largest prompt among the simulation's requests
+    requests: int  # Chat requests the opening step sends
+    fits: bool  # Prompt plus max_tokens fits the context window as-is
+    budget_strategy: str
+    fits_after_strategy: Optional[bool] = None  # Set when the prompt does not fit and a strategy applies
+    exact: bool  # Counted with tiktoken rather than estimated from characters
+
+class TraceSpan(BaseModel):
+    id: int
+    parent_id: Optional[int] = None
+    name: str  # Stage, e.g. scheduler.wait, llm.call, http.wait_response, db.commit
+    start_ms: float  # Offset from the start of the trace
+    duration_ms: Optional[float] = None  # None if the span never ended (e.g. cancelled mid-stream)
+    attributes: Dict[str, Any]
+
+class RunTraceResponse(BaseModel):
+    run_id: uuid.UUID
+    name: str  # What was traced, e.g. "POST /run" or "job"
+    attributes: Dict[str, Any]
+    started_at: datetime
+    duration_ms: Optional[float] = None
+    spans: List[TraceSpan]
+
+class RunScoreResponse(BaseModel):
+    scorer: str
+    version: int
+    kind: str  # rule or llm
+    value: float
+    details: Optional[Dict[str, Any]] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ModelTarget(BaseModel):
+    model: str
+    endpoint: Optional[str] = None  # Named endpoint from LLM_ENDPOINTS; None is OpenAI
+
+class ModelFanoutRequest(BaseModel):
+    models: List[ModelTarget] = Field(min_length=1, max_length=10)
+
+class ModelRunResult(BaseModel):
+    model: str
+    endpoint: Optional[str] = None
+    status: str  # completed, timed_out, rejected (prompt does not fit the model) or failed
+    run_id: Optional[uuid.UUID] = None  # Set when a run was saved
+    latency_ms: Optional[int] = None
+    usage: Optional[TokenUsage] = None
+    error: Optional[str] = None
+    log: List[Dict[str, Any]] = []
+
+class ModelFanoutResponse(BaseModel):
+    scenario_id: uuid.UUID
+    results: List[ModelRunResult]  # In request order
+
+class TemplateCreate(BaseModel):
+    name: str
+    # A scenario (name, participants, system_prompt, settings) whose strings may contain {variable} placeholders
+    scenario: Dict[str, Any]
+    variables: Dict[str, List[Any]]  # Values each placeholder takes
+
+class TemplateResponse(BaseModel):
+    id: uuid.UUID
+    name: str
+    scenario: Dict[str, Any]
+    variables: Dict[str, List[Any]]
+    variant_count: int  # Combinations of variable values
+    created_at: datetime
+
+class TemplateVariant(BaseModel):
+    index: int  # Combination number
+    variables: Dict[str, Any]
+    scenario: Dict[str, Any]
+
+class ExpansionCreate(BaseModel):
+    # product: combinations in order; sample: `count` distinct combinations drawn at random
+    mode: Literal["product", "sample"] = "product"
+    count: Optional[int] = Field(ge=1, default=None)  # Variants to produce; product mode defaults to all of them
+    seed: Optional[int] = None  # Sample mode; random when omitted
+    runs_per_variant: int = Field(ge=1, le=100, default=1)
+    priority: Priority = "bulk"
+    max_attempts: int = Field(ge=1, le=10, default=3)
+    chunk_size: int = Field(ge=1, le=500, default=50)  # Variants saved and queued at a time
+
+class ExpansionResponse(BaseModel):
+    id: uuid.UUID  # Also the batch ID of its jobs
+    template_id: uuid.UUID
+    mode: str
+    seed: Optional[int] = None
+    total: int  # Variants to produce
+    produced: int  # Variants saved and queued so far
+    chunk_size: int
+    runs_per_variant: int
+    priority: str
+    status: str  # running, completed (all variants queued), failed or cancelled
+    last_error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    jobs: Optional[JobBatchResponse] = None  # Progress of the queued runs
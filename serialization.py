@@ -0,0 +1,47 @@
+from typing import Any, Dict, Optional
+
+from fastapi.responses import ORJSONResponse
+
+from database import Run, Scenario
+
+# Fast response path.
+#
+# Scenarios and run logs are validated by Pydantic when they are written, so
+# re-validating them through `response_model` on every read is pure overhead.
+# Endpoints that return large payloads build plain dicts straight from the ORM
+# columns and encode them with orjson; returning a Response object makes
+# FastAPI skip response_model validation (the model is still used for docs).
+
+def run_to_dict(run: Run, scores: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    return {
+        "id": run.id,
+        "scenario_id": run.scenario_id,
+        "timestamp": run.timestamp,
+        "starred": run.starred,
+        "status": run.status,
+        "model": run.model,
+        "endpoint": run.endpoint,
+        "usage": run.usage,
+        "scores": scores or {},
+        "log": run.log,
+    }
+
+def scenario_to_dict(scenario: Scenario) -> Dict[str, Any]:
+    return {
+        "id": scenario.id,
+        "name": scenario.name,
+        "participants": scenario.participants,
+        "system_prompt": scenario.system_prompt,
+        "settings": scenario.settings,
+        "created_at": scenario.created_at,
+        "parent_id": scenario.parent_id,
+        "version": scenario.version,
+    }
+
+def json_response(
+    content: Any,
+    status_code: int = 200,
+    headers: Optional[Dict[str, str]] = None
+) -> ORJSONResponse:
+    """Encode already-validated content with orjson, bypassing response_model validation"""
+    return ORJSONResponse(content=content, status_code=status_code, headers=headers)
@@ -0,0 +1,203 @@
+import re
+import zlib
+from typing import List, Dict, Any, Tuple
+import uuid
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from database import Run, ResponseSignature
+
+# MinHash / LSH parameters. The signature is split into bands of rows per
+# clustering threshold (see lsh_banding): a pair with estimated Jaccard
+# similarity s shares at least one of b bands of r rows with probability
+# 1 - (1 - s ** r) ** b, which must reach LSH_MIN_RECALL at the threshold.
+NUM_PERMUTATIONS = 128
+LSH_MIN_RECALL = 0.99
+SHINGLE_SIZE = 3  # Words per shingle
+PREVIEW_LENGTH = 160
+UNSIGNED_MARKER_INDEX = -1  # message_index of the row marking a run without mediator messages
+
+_WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+# Multiply-shift hash family: h(x) = ((a * x + b) mod 2**64) >> 32 with odd a
+_rng = np.random.default_rng(20240717)
+_HASH_A = _rng.integers(1, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_HASH_B = _rng.integers(0, 2**63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """32-bit hashes of the word shingles in a text"""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) >= SHINGLE_SIZE:
+        shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    else:
+        shingles = {" ".join(words)}
+    return np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature of a text as NUM_PERMUTATIONS uint32 values"""
+    hashes = _shingle_hashes(text)
+    # (shingles, permutations) matrix of permuted hashes; uint64 arithmetic wraps mod 2**64
+    permuted = (hashes[:, None] * _HASH_A[None, :] + _HASH_B[None, :]) >> np.uint64(32)
+    return permuted.min(axis=0).astype(np.uint32)
+
+def store_signatures(db: Session, run: Run):
+    """Compute and store signatures for every mediator message of a run
+
+    A run without mediator messages gets an empty marker row instead, so the
+    backfill in ensure_signatures does not pick it up again.
+    """
+    signed = False
+    for index, message in enumerate(run.log):
+        if message["speaker"] != "AI":
+            continue
+        db.add(ResponseSignature(
+            run_id=run.id,
+            scenario_id=run.scenario_id,
+            message_index=index,
+            signature=minhash_signature(message["content"]).tobytes(),
+            preview=message["content"][:PREVIEW_LENGTH]
+        ))
+        signed = True
+    if not signed:
+        db.add(ResponseSignature(
+            run_id=run.id,
+            scenario_id=run.scenario_id,
+            message_index=UNSIGNED_MARKER_INDEX,
+            signature=b"",
+            preview=""
+        ))
+
+def ensure_signatures(db: Session, scenario_id: uuid.UUID):
+    """Backfill signatures for runs persisted before signatures were stored"""
+    signed = db.query(ResponseSignature.run_id).filter(ResponseSignature.scenario_id == scenario_id)
+    unsigned_runs = db.query(Run).filter(
+        Run.scenario_id == scenario_id,
+        Run.id.notin_(signed)
+    ).all()
+    for run in unsigned_runs:
+        store_signatures(db, run)
+    if unsigned_runs:
+        db.commit()
+
+class _UnionFind:
+    def __init__(self, size: int):
+        self.parent = np.arange(size)
+
+    def find(self, item: int) -> int:
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+def lsh_banding(threshold: float) -> Tuple[int, int]:
+    """(bands, rows) with the fewest candidates that still find pairs at threshold with LSH_MIN_RECALL"""
+    rows = NUM_PERMUTATIONS
+    while rows > 1:
+        bands = NUM_PERMUTATIONS // rows
+        if 1 - (1 - threshold ** rows) ** bands >= LSH_MIN_RECALL:
+            break
+        rows //= 2
+    return NUM_PERMUTATIONS // rows, rows
+
+def cluster_signatures(signatures: np.ndarray, threshold: float) -> List[List[int]]:
+    """Group rows of a (messages, permutations) signature matrix into near-duplicate clusters.
+
+    LSH banding proposes candidates that share a band; a candidate is merged
+    when its estimated Jaccard similarity (fraction of equal signature
+    values) with the bucket representative reaches threshold.
+    """
+    count = len(signatures)
+    union_find = _UnionFind(count)
+    bands, rows = lsh_banding(threshold)
+
+    for band in range(bands):
+        band_rows = signatures[:, band * rows:(band + 1) * rows]
+        _, bucket_ids = np.unique(band_rows, axis=0, return_inverse=True)
+        bucket_ids = bucket_ids.reshape(-1)
+
+        order = np.argsort(bucket_ids, kind="stable")
+        boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+        for members in np.split(order, boundaries):
+            if len(members) < 2:
+                continue
+            roots = [union_find.find(int(member)) for member in members]
+            if len(set(roots)) == 1:
+                continue  # Already merged through another band
+
+            # Compare the rest of the bucket against one representative at a
+            # time, so large buckets of duplicates cost O(n) rather than O(n^2)
+            remaining = members
+            while len(remaining) > 1:
+                representative, others = remaining[0], remaining[1:]
+                similarity = (signatures[others] == signatures[representative]).mean(axis=1)
+                matched = similarity >= threshold
+                for member in others[matched]:
+                    union_find.union(int(representative), int(member))
+                remaining = others[~matched]
+
+    clusters: Dict[int, List[int]] = {}
+    for item in range(count):
+        clusters.setdefault(union_find.find(item), []).append(item)
+    return list(clusters.values())
+
+def scenario_diversity(db: Session, scenario_id: uuid.UUID, threshold: float) -> Dict[str, Any]:
+    """Near-duplicate clusters and a diversity score for a scenario's mediator responses"""
+    ensure_signatures(db, scenario_id)
+    rows = db.query(ResponseSignature).filter(
+        ResponseSignature.scenario_id == scenario_id,
+        ResponseSignature.message_index != UNSIGNED_MARKER_INDEX
+    ).order_by(ResponseSignature.id).all()
+
+    if not rows:
+        return {
+            "scenario_id": scenario_id,
+            "threshold": threshold,
+            "message_count": 0,
+            "cluster_count": 0,
+            "diversity_score": None,
+            "clusters": [],
+        }
+
+    signatures = np.stack([np.frombuffer(row.signature, dtype=np.uint32) for row in rows])
+    clusters = cluster_signatures(signatures, threshold)
+
+    duplicate_clusters = sorted(
+        (members for members in clusters if len(members) > 1),
+        key=len,
+        reverse=True
+    )
+
+    return {
+        "scenario_id": scenario_id,
+        "threshold": threshold,
+        "message_count": len(rows),
+        "cluster_count": len(clusters),
+        # 1.0 when every response is distinct, approaching 0 when all are near-duplicates
+        "diversity_score": len(clusters) / len(rows),
+        "clusters": [
+            {
+                "size": len(members),
+                "members": [
+                    {
+                        "run_id": rows[member].run_id,
+                        "message_index": rows[member].message_index,
+                        "preview": rows[member].preview,
+                    }
+                    for member in members
+                ],
+            }
+            for members in duplicate_clusters
+        ],
+    }
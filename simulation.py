@@ -1,62 +1,327 @@
+import asyncio
+import copy
+import hashlib
+import json
 import os
 import openai
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 from datetime import datetime
 
+from scheduler import simulation_scheduler
+from token_budget import (
+    fit_messages, estimate_budget, PromptBudgetExceeded, record_usage, track_usage, add_usage,
+    count_message_tokens, count_tokens
+)
+from cassettes import llm_cassette, CassetteMiss
+from tracing import Trace, start_trace, span, begin_span, end_span, event, attach_trace, trace_http_request
+
+# Default deadline for one simulation, overridable per scenario via settings.deadline_seconds
+DEFAULT_DEADLINE_SECONDS = float(os.getenv("RUN_DEADLINE_SECONDS", "120"))
+
+def _parse_endpoints(value: str) -> Dict[str, str]:
+    """Parse "name=base_url,name=base_url" into a dict"""
+    endpoints = {}
+    for entry in value.split(","):
+        if entry.strip():
+            name, _, base_url = entry.partition("=")
+            endpoints[name.strip()] = base_url.strip()
+    return endpoints
+
+# OpenAI-compatible endpoints a scenario or model fan-out can target by name
+# (settings.endpoint); the API key of endpoint "local" is read from
+# LLM_ENDPOINT_LOCAL_API_KEY. Without an endpoint, requests go to OpenAI.
+LLM_ENDPOINTS = _parse_endpoints(os.getenv("LLM_ENDPOINTS", ""))
+
+class SimulationTimeout(Exception):
+    """Raised when a simulation runs past its deadline; carries the log produced so far"""
+    
+    def __init__(self, deadline_seconds: float, conversation_log: List[Dict[str, Any]]):
+        super().__init__(f"Simulation exceeded its {deadline_seconds:g}s deadline")
+        self.deadline_seconds = deadline_seconds
+        self.conversation_log = conversation_log
+
+class _SingleFlight:
+    """Shares one in-flight call between concurrent callers with the same key.
+
+    Callers wait on the shared task through asyncio.shield, so one caller
+    being cancelled does not affect the others; the task itself is only
+    cancelled once every caller waiting on it has gone away.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, Tuple[asyncio.Task, List[int]]] = {}
+        self.coalesced_count = 0  # Callers that joined an existing in-flight call
+    
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
+    
+    async def do(self, key: str, call):
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(call())
+            entry = (task, [0])
+            self._calls[key] = entry
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced_count += 1
+        
+        task, waiters = entry
+        waiters[0] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if waiters[0] == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            waiters[0] -= 1
+    
+    def _forget(self, key: str, task: asyncio.Task):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+
 class SimulationEngine:
-    """Handles OpenAI GPT-4 simulation - AI responds to each participant's initial message"""
+    """Handles OpenAI GPT-4 simulation - all participants speak, then the AI mediates"""
     
     def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=os.getenv("OPENAI_API_KEY")
+        self.client = openai.AsyncOpenAI(
+            # Replaying cassettes needs no credentials
+            api_key=os.getenv("OPENAI_API_KEY") or ("unused" if llm_cassette.mode == "replay" else None),
+            # Connection and transfer stages show up in run traces
+            http_client=openai.DefaultAsyncHttpxClient(event_hooks={"request": [trace_http_request]})
         )
+        self._endpoint_clients: Dict[str, openai.AsyncOpenAI] = {}
+        self._single_flight = _SingleFlight()
+    
+    @property
+    def endpoints(self) -> List[str]:
+        return list(LLM_ENDPOINTS)
+    
+    def _client(self, endpoint: Optional[str]) -> openai.AsyncOpenAI:
+        """Client for a named endpoint, created on first use; None is OpenAI"""
+        if endpoint is None:
+            return self.client
+        if endpoint not in LLM_ENDPOINTS:
+            raise ValueError(f"Unknown LLM endpoint: {endpoint}")
+        if endpoint not in self._endpoint_clients:
+            self._endpoint_clients[endpoint] = openai.AsyncOpenAI(
+                base_url=LLM_ENDPOINTS[endpoint],
+                # Local servers usually accept any key
+                api_key=os.getenv(f"LLM_ENDPOINT_{endpoint.upper()}_API_KEY") or "unused",
+                http_client=openai.DefaultAsyncHttpxClient(event_hooks={"request": [trace_http_request]})
+            )
+        return self._endpoint_clients[endpoint]
     
     async def run_simulation(
         self, 
         participants: List[Dict[str, Any]], 
         system_prompt: str, 
-        settings: Dict[str, Any]
+        settings: Dict[str, Any],
+        priority: str = "interactive",
+        shed: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Run a group mediation simulation where all participants speak first, then AI mediates
         
+        In "group" mode (default) the mediator sends one reply to the whole group.
+        In "per_participant" mode it replies to each participant individually,
+        with full group context; those calls run concurrently and the replies
+        are logged in participant order.
+        
+        Deterministic simulations (temperature 0) with identical inputs and
+        priority that are requested while one is already in flight share that
+        single LLM call: only the first waits for a scheduler slot, and every
+        caller gets its own copy of the log, with the call's token usage and
+        trace spans recorded in its own context.
+        
+        The simulation is aborted once it runs past settings["deadline_seconds"]
+        (default RUN_DEADLINE_SECONDS). Cancelling the caller, e.g. because the
+        client disconnected, cancels the in-flight LLM requests as well, unless
+        another caller is still waiting on a coalesced call.
+        
+        The simulation first waits for a slot from the scheduler in its
+        priority class (see scheduler.py). The deadline starts when the
+        simulation is requested, so it bounds the time spent queued as well.
+        With shed=True it is refused instead of queued while that class is
+        saturated.
+        
         Args:
             participants: List of participant dictionaries with initial_message
             system_prompt: AI mediator system prompt
-            settings: Model settings (temperature, max_tokens, etc.)
+            settings: Model settings (temperature, max_tokens, mediation_mode, etc.)
+            priority: Scheduler priority class ("interactive" or "bulk")
+            shed: Refuse rather than queue when the scheduler is saturated
         
         Returns:
             List of conversation log entries
+        
+        Raises:
+            SimulationTimeout: the deadline passed; its log holds the participant messages
+            SchedulerSaturated: shed=True and the priority class is saturated
         """
-        conversation_log = []
+        deadline = settings.get("deadline_seconds") or DEFAULT_DEADLINE_SECONDS
+        key = self._coalescing_key(participants, system_prompt, settings)
+        with span("simulation", priority=priority, deadline_seconds=deadline) as record:
+            try:
+                if key is None:
+                    return await asyncio.wait_for(
+                        self._run_in_slot(priority, shed, participants, system_prompt, settings),
+                        timeout=deadline
+                    )
+                
+                key = f"{priority}:{key}"  # Never waits behind a call queued in another class
+                if self._single_flight.in_flight(key):
+                    if record is not None:
+                        record["attributes"]["coalesced"] = True
+                elif shed:
+                    simulation_scheduler.check_admission(priority)
+                return await asyncio.wait_for(
+                    self._run_coalesced(key, priority, participants, system_prompt, settings),
+                    timeout=deadline
+                )
+            except asyncio.TimeoutError:
+                raise SimulationTimeout(deadline, self._opening_messages(participants))
+    
+    async def _run_in_slot(
+        self,
+        priority: str,
+        shed: bool,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        async with simulation_scheduler.slot(priority, shed=shed):
+            return await self._run_simulation(participants, system_prompt, settings)
+    
+    async def _run_coalesced(
+        self,
+        key: str,
+        priority: str,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Run one simulation, sharing the call with identical deterministic ones in flight"""
+        conversation_log, usage, trace = await self._single_flight.do(
+            key,
+            lambda: self._run_shared(priority, participants, system_prompt, settings)
+        )
+        add_usage(usage)
+        attach_trace(trace)
+        return copy.deepcopy(conversation_log)
+    
+    async def _run_shared(
+        self,
+        priority: str,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Trace]:
+        """Run a simulation on behalf of every caller coalesced on it, in one slot, with its own usage and trace"""
+        with start_trace("simulation.shared") as trace, track_usage() as usage:
+            async with simulation_scheduler.slot(priority):
+                conversation_log = await self._run_simulation(participants, system_prompt, settings)
+        return conversation_log, usage, trace
+    
+    def _coalescing_key(
+        self,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> Optional[str]:
+        """Key identifying identical deterministic simulations, or None if the run is sampled"""
+        if settings.get("temperature", 0.7) != 0:
+            return None
+        
+        # The deadline only bounds how long a caller waits, not what is generated
+        generation_settings = {name: value for name, value in settings.items() if name != "deadline_seconds"}
+        payload = json.dumps(
+            {"participants": participants, "system_prompt": system_prompt, "settings": generation_settings},
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    async def _run_simulation(
+        self,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        """Run one simulation without coalescing"""
+        mediation_mode = settings.get("mediation_mode", "group")
         
-        # Build context for the AI
-        context = self._build_context(participants, system_prompt)
+        with span("context.build", mediation_mode=mediation_mode):
+            # Build context for the AI
+            context = self._build_context(participants, system_prompt, mediation_mode)
+            
+            # Step 1: All participants share their initial messages first
+            conversation_log = self._opening_messages(participants)
         
-        # Step 1: All participants share their initial messages first
-        for participant in participants:
+        # Step 2: AI mediator responds
+        if mediation_mode == "per_participant":
+            # One reply per participant, requested concurrently
+            replies = await asyncio.gather(*(
+                self._get_ai_participant_response(context, conversation_log, participant, settings)
+                for participant in participants
+            ))
+            
+            for participant, (ai_response, completed_at) in zip(participants, replies):
+                conversation_log.append({
+                    "speaker": "AI",
+                    "content": ai_response,
+                    "timestamp": completed_at,
+                    "in_reply_to": participant["name"]
+                })
+        else:
+            ai_response = await self._get_ai_group_response(
+                context,
+                conversation_log,
+                settings
+            )
+            
             conversation_log.append({
-                "speaker": participant["name"],
-                "content": participant["initial_message"],
+                "speaker": "AI",
+                "content": ai_response,
                 "timestamp": datetime.utcnow().isoformat()
             })
         
-        # Step 2: AI mediator responds to the full group conversation
-        ai_response = await self._get_ai_group_response(
-            context,
-            conversation_log,
-            settings
-        )
-        
-        conversation_log.append({
-            "speaker": "AI",
-            "content": ai_response,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        
         return conversation_log
     
-    def _build_context(self, participants: List[Dict[str, Any]], system_prompt: str) -> str:
+    def _opening_messages(self, participants: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Log entries for every participant's initial message"""
+        return [
+            {
+                "speaker": participant["name"],
+                "content": participant["initial_message"],
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            for participant in participants
+        ]
+    
+    def estimate_tokens(
+        self,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Estimate the prompt tokens of the requests a simulation would send, without sending them"""
+        mediation_mode = settings.get("mediation_mode", "group")
+        context = self._build_context(participants, system_prompt, mediation_mode)
+        conversation_log = self._opening_messages(participants)
+        
+        if mediation_mode == "per_participant":
+            requests = [self._build_messages(context, conversation_log, participant) for participant in participants]
+        else:
+            requests = [self._build_messages(context, conversation_log)]
+        return estimate_budget(requests, settings)
+    
+    def _build_context(
+        self,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        mediation_mode: str = "group"
+    ) -> str:
         """Build context for the AI mediator"""
         context = f"{system_prompt}\n\n"
         context += "PARTICIPANTS IN THIS SESSION:\n"
@@ -69,13 +334,61 @@ class SimulationEngine:
         context += "IMPORTANT INSTRUCTIONS:\n"
         context += "- You are the AI mediator facilitating a group conversation.\n"
         context += "- All participants have shared their opening thoughts.\n"
-        context += "- Respond to the group as a whole, addressing themes and facilitating dialogue.\n" 
+        if mediation_mode == "per_participant":
+            context += "- Respond to one participant at a time, keeping the whole group's perspectives in mind.\n"
+        else:
+            context += "- Respond to the group as a whole, addressing themes and facilitating dialogue.\n" 
         context += "- Do not include any speaker labels or prefixes in your response.\n"
         context += "- Do not simulate or speak for participants.\n"
-        context += "- Your response should be your direct words to the group.\n\n"
+        if mediation_mode == "per_participant":
+            context += "- Your response should be your direct words to the participant you are answering.\n\n"
+        else:
+            context += "- Your response should be your direct words to the group.\n\n"
         
         return context
     
+    def _build_messages(
+        self,
+        context: str,
+        conversation_log: List[Dict[str, Any]],
+        participant: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """Build the chat messages for the next mediator reply
+        
+        Participant messages are grouped into user turns and earlier mediator
+        replies become assistant turns, so multi-step conversations keep their
+        history. The final user turn asks for a reply to the group, or to
+        `participant` when given.
+        """
+        messages = [{"role": "system", "content": context}]
+        pending = []
+        opening = True
+        
+        for msg in conversation_log:
+            if msg["speaker"] == "AI":
+                if pending:
+                    messages.append({"role": "user", "content": self._format_participant_turn(pending, opening)})
+                    pending = []
+                    opening = False
+                messages.append({"role": "assistant", "content": msg["content"]})
+            else:
+                pending.append(msg)
+        
+        if participant is not None:
+            closing = f"As the group mediator, please respond directly to {participant['name']}, acknowledging what they shared while helping them understand the other participants."
+        else:
+            closing = "As the group mediator, please respond to facilitate dialogue and understanding between all participants."
+        
+        messages.append({"role": "user", "content": f"{self._format_participant_turn(pending, opening)}\n\n{closing}"})
+        return messages
+    
+    def _format_participant_turn(self, participant_messages: List[Dict[str, Any]], opening: bool) -> str:
+        """Format consecutive participant messages as one user turn"""
+        conversation_text = "\n\n".join(f"{msg['speaker']}: {msg['content']}" for msg in participant_messages)
+        if opening:
+            return f"Here's what each participant has shared:\n\n{conversation_text}"
+        return conversation_text
+    
     async def _get_ai_group_response(
         self, 
         context: str, 
@@ -83,33 +396,153 @@ class SimulationEngine:
         settings: Dict[str, Any]
     ) -> str:
         """Get AI mediator response to the full group conversation"""
+        messages = self._build_messages(context, conversation_log)
+        return await self._chat(messages, settings)
+    
+    async def _get_ai_participant_response(
+        self,
+        context: str,
+        conversation_log: List[Dict[str, Any]],
+        participant: Dict[str, Any],
+        settings: Dict[str, Any]
+    ) -> Tuple[str, str]:
+        """Get AI mediator response addressed to one participant, with the full group conversation as context
+        
+        Returns:
+            Tuple of (response text, ISO timestamp of when the response completed)
+        """
+        messages = self._build_messages(context, conversation_log, participant)
+        ai_response = await self._chat(messages, settings)
+        return ai_response, datetime.utcnow().isoformat()
+    
+    async def stream_mediator_reply(
+        self,
+        participants: List[Dict[str, Any]],
+        system_prompt: str,
+        settings: Dict[str, Any],
+        conversation_log: List[Dict[str, Any]],
+        participant: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[str]:
+        """Stream the next mediator reply for a conversation as text chunks
+        
+        Used by the live WebSocket channel. The reply is addressed to the group,
+        or to `participant` when given. Errors propagate to the caller.
+        """
+        mediation_mode = "per_participant" if participant is not None else "group"
+        context = self._build_context(participants, system_prompt, mediation_mode)
+        messages = self._build_messages(context, conversation_log, participant)
+        
+        async for delta in self._chat_stream(messages, settings):
+            yield delta
+    
+    def _chat_request(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completion parameters for a request, after the local prompt budget check"""
+        return {
+            "model": settings.get("model", "gpt-4"),
+            "messages": fit_messages(messages, settings),
+            "temperature": settings.get("temperature", 0.7),
+            "max_tokens": settings.get("max_tokens", 400)
+        }
+    
+    async def _chat(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> str:
+        """Send one chat completion request and return the reply text
+        
+        The prompt budget is checked locally first; PromptBudgetExceeded
+        propagates instead of being logged as an AI error, as does a missing
+        recording in cassette replay mode (see cassettes.py).
+        """
         try:
-            # Format all participant messages for the AI
-            participant_messages = []
-            for msg in conversation_log:
-                if msg["speaker"] != "AI":
-                    participant_messages.append(f"{msg['speaker']}: {msg['content']}")
-            
-            conversation_text = "\n\n".join(participant_messages)
-            
-            user_message = f"Here's what each participant has shared:\n\n{conversation_text}\n\nAs the group mediator, please respond to facilitate dialogue and understanding between all participants."
-            
-            messages = [
-                {"role": "system", "content": context},
-                {"role": "user", "content": user_message}
-            ]
-            
-            response = self.client.chat.completions.create(
-                model=settings.get("model", "gpt-4"),
-                messages=messages,
-                temperature=settings.get("temperature", 0.7),
-                max_tokens=settings.get("max_tokens", 400)
-            )
-            
-            return response.choices[0].message.content.strip()
+            return await self.complete(messages, settings)
             
+        except (PromptBudgetExceeded, CassetteMiss):
+            raise
         except Exception as e:
             return f"[AI Error: Unable to generate response - {str(e)}]"
+    
+    async def complete(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> str:
+        """Send one chat completion request and return the reply text; errors propagate
+        
+        Token usage is added to the enclosing token_budget.track_usage() block.
+        """
+        request = self._chat_request(messages, settings)
+        endpoint = settings.get("endpoint")
+        provider_usage: Dict[str, int] = {}
+        with span("llm.call", model=request["model"], endpoint=endpoint):
+            reply = await llm_cassette.complete(
+                request,
+                lambda request: self._complete(request, endpoint, provider_usage)
+            )
+        
+        if provider_usage:
+            record_usage(provider_usage["prompt_tokens"], provider_usage["completion_tokens"])
+        else:
+            # Replayed from a cassette, or the endpoint reports no usage
+            record_usage(
+                count_message_tokens(request["messages"], request["model"]),
+                count_tokens(reply, request["model"]),
+                estimated=True
+            )
+        return reply
+    
+    async def _complete(
+        self,
+        request: Dict[str, Any],
+        endpoint: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> str:
+        response = await self._client(endpoint).chat.completions.create(**request)
+        if usage is not None and getattr(response, "usage", None) is not None:
+            usage["prompt_tokens"] = response.usage.prompt_tokens
+            usage["completion_tokens"] = response.usage.completion_tokens
+        return response.choices[0].message.content.strip()
+
+    async def _chat_stream(self, messages: List[Dict[str, str]], settings: Dict[str, Any]) -> AsyncIterator[str]:
+        """Send one streaming chat completion request and yield the reply text as it arrives
+        
+        Token usage of a completed stream is added to the enclosing
+        token_budget.track_usage() block, as complete() does.
+        """
+        request = self._chat_request(messages, settings)
+        endpoint = settings.get("endpoint")
+        provider_usage: Dict[str, int] = {}
+        record = begin_span("llm.stream", model=request["model"], endpoint=endpoint)
+        received = []
+        try:
+            async for delta in llm_cassette.stream(request, lambda request: self._stream(request, endpoint, provider_usage)):
+                if not received:
+                    event("llm.first_token")
+                received.append(delta)
+                yield delta
+        finally:
+            end_span(record, chunks=len(received))
+        
+        if provider_usage:
+            record_usage(provider_usage["prompt_tokens"], provider_usage["completion_tokens"])
+        else:
+            # Replayed from a cassette, or the endpoint reports no usage
+            record_usage(
+                count_message_tokens(request["messages"], request["model"]),
+                count_tokens("".join(received), request["model"]),
+                estimated=True
+            )
+    
+    async def _stream(
+        self,
+        request: Dict[str, Any],
+        endpoint: Optional[str] = None,
+        usage: Optional[Dict[str, int]] = None
+    ) -> AsyncIterator[str]:
+        # The last chunk then carries the request's token usage, with no choices
+        stream = await self._client(endpoint).chat.completions.create(
+            **request, stream=True, stream_options={"include_usage": True}
+        )
+        
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if usage is not None and getattr(chunk, "usage", None) is not None:
+                usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                usage["completion_tokens"] = chunk.usage.completion_tokens
 
 # Global simulation engine instance
 simulation_engine = SimulationEngine()
\ No newline at end of file
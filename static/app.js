@@ -5,6 +5,7 @@ class DriftwoodApp {
         this.currentView = 'scenario';
         this.participants = [];
         this.currentScenarioId = null;
+        this.conversationScenario = null;
         this.init();
     }
 
@@ -74,7 +75,10 @@ class DriftwoodApp {
             const response = await fetch(endpoint, config);
             
             if (!response.ok) {
-                throw new Error(`HTTP error! status: ${response.status}`);
+                // Surface the server's explanation when it gives one (e.g. prompt budget errors)
+                const body = await response.json().catch(() => null);
+                const detail = body && body.detail && (body.detail.message || body.detail);
+                throw new Error(typeof detail === 'string' ? detail : `HTTP error! status: ${response.status}`);
             }
             
             return await response.json();
@@ -90,11 +94,75 @@ class DriftwoodApp {
 
         addParticipantBtn.addEventListener('click', () => this.addParticipant());
         scenarioForm.addEventListener('submit', (e) => this.saveAndRunScenario(e));
+        document.getElementById('new-scenario').addEventListener('click', () => this.newScenario());
 
         // Add initial participant
         this.addParticipant();
     }
 
+    // The scenario shown in the form; saving the form stores a new version of it.
+    // null while the form holds a new scenario.
+    setEditingScenario(scenario) {
+        this.currentScenarioId = scenario ? scenario.id : null;
+        const note = document.getElementById('scenario-editing');
+        note.textContent = scenario ? `Editing "${scenario.name}". Running saves a new version of it.` : '';
+        note.classList.toggle('hidden', !scenario);
+        document.getElementById('new-scenario').classList.toggle('hidden', !scenario);
+    }
+
+    newScenario() {
+        document.getElementById('scenario-form').reset();
+        document.getElementById('participants-container').innerHTML = '';
+        this.participants = [];
+        this.addParticipant();
+        this.setEditingScenario(null);
+    }
+
+    // Load a saved scenario into the form to edit or re-run it
+    editScenario(scenario) {
+        const form = document.getElementById('scenario-form');
+        form.reset();
+        document.getElementById('scenario-name').value = scenario.name;
+        document.getElementById('system-prompt').value = scenario.system_prompt;
+        ['model', 'temperature', 'max_tokens', 'mediation_mode', 'budget_strategy'].forEach(name => {
+            const value = scenario.settings[name];
+            if (value === undefined || value === null) {
+                return;
+            }
+            const field = form.elements[name];
+            if (field.tagName === 'SELECT' && ![...field.options].some(option => option.value === String(value))) {
+                field.add(new Option(value, value));  // e.g. a model missing from the list
+            }
+            field.value = value;
+        });
+
+        document.getElementById('participants-container').innerHTML = '';
+        this.participants = [];
+        scenario.participants.forEach((source, index) => {
+            const participant = {
+                id: `participant-${Date.now()}-${index}`,
+                name: source.name,
+                role: source.role,
+                perspective: source.perspective,
+                meta_tags: [...source.meta_tags],
+                initial_message: source.initial_message
+            };
+            this.participants.push(participant);
+            this.renderParticipant(participant);
+            const card = document.querySelector(`[data-participant-id="${participant.id}"]`);
+            card.querySelector('[name="participant-name"]').value = participant.name;
+            card.querySelector('[name="participant-role"]').value = participant.role;
+            card.querySelector('[name="participant-perspective"]').value = participant.perspective;
+            card.querySelector('[name="participant-initial-message"]').value = participant.initial_message;
+            participant.meta_tags.slice(0, 3).forEach((tag, tagIndex) => {
+                card.querySelector(`[name="participant-meta-tag-${tagIndex + 1}"]`).value = tag;
+            });
+        });
+
+        this.setEditingScenario(scenario);
+        this.showView('scenario');
+    }
+
     addParticipant() {
         const participantId = `participant-${Date.now()}`;
         const participant = {
@@ -248,17 +316,39 @@ class DriftwoodApp {
             settings: {
                 model: formData.get('model'),
                 temperature: parseFloat(formData.get('temperature')),
-                max_tokens: parseInt(formData.get('max_tokens'))
-            }
+                max_tokens: parseInt(formData.get('max_tokens')),
+                mediation_mode: formData.get('mediation_mode'),
+                budget_strategy: formData.get('budget_strategy')
+            },
+            // Edits to a loaded or just-run scenario are stored as a new version of it
+            parent_id: this.currentScenarioId
         };
 
+        let scenarioResponse;
         try {
-            this.showLoading(true, 'Creating scenario and running simulation...');
+            this.showLoading(true, 'Creating scenario...');
             
             // Step 1: Save scenario
-            const scenarioResponse = await this.apiCall('/scenarios', 'POST', scenarioData);
+            scenarioResponse = await this.apiCall('/scenarios', 'POST', scenarioData);
+            // Running the form again, with or without changes, continues this scenario
+            this.setEditingScenario(scenarioResponse);
+            
+        } catch (error) {
+            this.showNotification(`Failed to run simulation: ${error.message}`, 'error');
+            return;
+        } finally {
+            this.showLoading(false);
+        }
+        
+        // Step 2: Run simulation immediately, streaming it live when possible
+        if ('WebSocket' in window) {
+            this.startLiveSimulation(scenarioResponse);
+            return;
+        }
+        
+        try {
+            this.showLoading(true, 'Running simulation...');
             
-            // Step 2: Run simulation immediately
             const runResponse = await this.apiCall(`/run?scenario_id=${scenarioResponse.id}`, 'POST');
             
             this.showNotification('Simulation completed successfully!', 'success');
@@ -273,6 +363,182 @@ class DriftwoodApp {
         }
     }
 
+    // Live simulation over /ws/simulate (see live.py for the event protocol)
+    startLiveSimulation(scenario) {
+        this.closeLiveSimulation();
+        this.conversationGeneration += 1;
+        
+        this.liveScenario = scenario;
+        this.liveStatus = 'connecting';
+        this.liveReplyEls = new Map();
+        this.liveMessageCount = 0;
+        
+        // Open the conversation viewer straight away and fill it as events arrive
+        this.conversationScenario = scenario;
+        this.populateConversationContext(scenario, { timestamp: new Date().toISOString() });
+        document.getElementById('chat-log').innerHTML = '';
+        this.updateLiveMessageCount();
+        
+        const speakerSelect = document.getElementById('live-inject-speaker');
+        speakerSelect.innerHTML = scenario.participants.map(participant => `
+            <option value="${participant.name}">${participant.name}</option>
+        `).join('');
+        
+        document.getElementById('live-controls').classList.remove('hidden');
+        this.setLiveStatus('connecting');
+        this.showView('conversation');
+        
+        const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+        const socket = new WebSocket(
+            `${protocol}://${window.location.host}/ws/simulate?scenario_id=${scenario.id}&interactive=true`
+        );
+        this.liveSocket = socket;
+        
+        socket.addEventListener('message', (event) => {
+            if (this.liveSocket === socket) {
+                this.handleLiveEvent(JSON.parse(event.data));
+            }
+        });
+        socket.addEventListener('close', () => {
+            if (this.liveSocket === socket) {
+                if (!['completed', 'timed_out', 'cancelled', 'error'].includes(this.liveStatus)) {
+                    this.showNotification('Live simulation connection closed', 'error');
+                }
+                this.liveSocket = null;
+                document.getElementById('live-controls').classList.add('hidden');
+            }
+        });
+    }
+
+    handleLiveEvent(event) {
+        const chatLogEl = document.getElementById('chat-log');
+        
+        switch (event.type) {
+            case 'status':
+                this.setLiveStatus(event.status);
+                if (event.status === 'completed') {
+                    this.showNotification('Simulation completed successfully!', 'success');
+                } else if (event.status === 'cancelled') {
+                    this.showNotification('Simulation cancelled', 'info');
+                }
+                break;
+            
+            case 'message':
+                chatLogEl.appendChild(this.createMessageElement(event.message));
+                this.liveMessageCount += 1;
+                this.updateLiveMessageCount();
+                break;
+            
+            case 'mediator_start': {
+                const messageEl = this.createMessageElement({
+                    speaker: 'AI',
+                    content: '',
+                    in_reply_to: event.in_reply_to,
+                    timestamp: new Date().toISOString()
+                });
+                messageEl.classList.add('streaming');
+                messageEl.dataset.buffer = '';
+                chatLogEl.appendChild(messageEl);
+                this.liveReplyEls.set(event.step, messageEl);
+                break;
+            }
+            
+            case 'mediator_chunk': {
+                const messageEl = this.liveReplyEls.get(event.step);
+                if (messageEl) {
+                    messageEl.dataset.buffer += event.delta;
+                    messageEl.querySelector('.message-content').innerHTML = this.formatMessageContent(messageEl.dataset.buffer);
+                }
+                break;
+            }
+            
+            case 'mediator_done': {
+                const messageEl = this.liveReplyEls.get(event.step);
+                if (messageEl) {
+                    const finalEl = this.createMessageElement(event.message);
+                    messageEl.replaceWith(finalEl);
+                    this.liveReplyEls.set(event.step, finalEl);
+                }
+                this.liveMessageCount += 1;
+                this.updateLiveMessageCount();
+                break;
+            }
+            
+            case 'metrics': {
+                const messageEl = this.liveReplyEls.get(event.step);
+                if (messageEl) {
+                    const metricsEl = document.createElement('div');
+                    metricsEl.className = 'message-metrics';
+                    const firstToken = event.first_token_ms !== null ? ` · first token ${(event.first_token_ms / 1000).toFixed(1)}s` : '';
+                    metricsEl.textContent = `⏱ ${(event.latency_ms / 1000).toFixed(1)}s${firstToken} · ${event.characters} characters`;
+                    messageEl.appendChild(metricsEl);
+                }
+                break;
+            }
+            
+            case 'run':
+                document.getElementById('conversation-timestamp').textContent = new Date(event.run.timestamp).toLocaleString();
+                break;
+            
+            case 'error':
+                this.showNotification(event.detail, 'error');
+                break;
+        }
+        
+        // Keep the newest output in view
+        chatLogEl.scrollTop = chatLogEl.scrollHeight;
+    }
+
+    setLiveStatus(status) {
+        this.liveStatus = status;
+        
+        const statusEl = document.getElementById('live-status');
+        statusEl.textContent = status;
+        statusEl.className = `live-status ${status}`;
+        
+        const active = !['completed', 'timed_out', 'cancelled', 'error'].includes(status);
+        document.getElementById('live-pause').textContent = status === 'paused' ? 'Resume' : 'Pause';
+        document.getElementById('live-pause').disabled = !active;
+        document.getElementById('live-cancel').disabled = !active;
+        document.getElementById('live-finish').disabled = !active;
+        document.getElementById('live-inject').classList.toggle('hidden', !active);
+    }
+
+    updateLiveMessageCount() {
+        document.getElementById('message-count').textContent = `${this.liveMessageCount} messages`;
+    }
+
+    sendLiveControl(control) {
+        if (this.liveSocket && this.liveSocket.readyState === WebSocket.OPEN) {
+            this.liveSocket.send(JSON.stringify(control));
+        }
+    }
+
+    injectLiveMessage(event) {
+        event.preventDefault();
+        
+        const contentEl = document.getElementById('live-inject-content');
+        const content = contentEl.value.trim();
+        if (!content) {
+            return;
+        }
+        
+        this.sendLiveControl({
+            type: 'inject',
+            speaker: document.getElementById('live-inject-speaker').value,
+            content
+        });
+        contentEl.value = '';
+    }
+
+    // Save the conversation so far when leaving a live simulation that is waiting for input
+    closeLiveSimulation() {
+        if (this.liveSocket && this.liveStatus === 'waiting') {
+            this.sendLiveControl({ type: 'finish' });
+        }
+        document.getElementById('live-controls').classList.add('hidden');
+    }
+
     setupHistoryViewer() {
         const filterAllBtn = document.getElementById('filter-all');
         const filterStarredBtn = document.getElementById('filter-starred');
@@ -290,39 +556,108 @@ class DriftwoodApp {
             this.deleteAllUnstarred();
         });
         
+        const listEl = document.getElementById('history-list');
+        listEl.addEventListener('scroll', () => this.scheduleHistoryRender());
+        window.addEventListener('resize', () => {
+            if (this.currentView === 'history' && this.historyTotal > 0) {
+                this.updateHistorySpacer();
+                this.renderVisibleHistory(true);
+            }
+        });
+        
         this.currentHistoryFilter = 'all';
-        this.runsCache = null;
+        this.historyPageSize = 50;
+        this.historyRows = [];
+        this.historyTotal = 0;
+        this.historyRowEls = new Map();
+        this.historyPagesInFlight = new Set();
+        this.historyGeneration = 0;
+        this.historyRenderPending = false;
+        
+        // Persistent history kept current through the change feed (see history-cache.js)
+        this.historyCache = HistoryCache.isSupported() ? new HistoryCache() : null;
+        this.historyCacheRuns = null;
+        this.historyCacheVersion = 0;
+        this.historySync = null;
     }
 
     setupConversationViewer() {
         const closeBtn = document.getElementById('close-conversation');
         closeBtn.addEventListener('click', () => {
+            this.closeLiveSimulation();
+            this.conversationGeneration += 1;
             this.showView('history');
         });
+        document.getElementById('edit-scenario').addEventListener('click', () => {
+            if (this.conversationScenario) {
+                this.editScenario(this.conversationScenario);
+            }
+        });
+        
+        // Live simulation controls
+        document.getElementById('live-pause').addEventListener('click', () => {
+            this.sendLiveControl({ type: this.liveStatus === 'paused' ? 'resume' : 'pause' });
+        });
+        document.getElementById('live-cancel').addEventListener('click', () => {
+            this.sendLiveControl({ type: 'cancel' });
+        });
+        document.getElementById('live-finish').addEventListener('click', () => {
+            this.sendLiveControl({ type: 'finish' });
+        });
+        document.getElementById('live-inject').addEventListener('submit', (e) => this.injectLiveMessage(e));
+        document.getElementById('toggle-trace').addEventListener('click', () => this.toggleTrace());
+        
+        this.liveSocket = null;
+        this.liveStatus = null;
+        this.traceRunId = null;
+        this.conversationPageSize = 100;
+        this.conversationGeneration = 0;
     }
 
     async showConversation(runData) {
+        this.closeLiveSimulation();
+        
+        // Pages still loading for a previously opened run are discarded
+        this.conversationGeneration += 1;
+        const generation = this.conversationGeneration;
+        let remainingMessages = null;
+        
         try {
             this.showLoading(true, 'Loading conversation...');
 
-            // Get full run details if we only have basic data
-            let fullRunData = runData;
+            // Runs from the history list come without their log: fetch the header and
+            // the first page of messages, and load the rest once the view is open
+            let header = runData;
+            let firstPage = runData.log;
             if (!runData.log) {
-                fullRunData = await this.apiCall(`/runs/${runData.id}`);
+                [header, firstPage] = await Promise.all([
+                    this.apiCall(`/runs/${runData.id}/header`),
+                    this.apiCall(`/runs/${runData.id}/messages?limit=${this.conversationPageSize}`)
+                ]);
             }
 
-            // Get scenario details
-            const scenario = await this.apiCall(`/scenarios`);
-            const runScenario = scenario.find(s => s.id === fullRunData.scenario_id);
-
-            if (!runScenario) {
+            // Get scenario details (the version the run was made with)
+            let runScenario;
+            try {
+                runScenario = await this.apiCall(`/scenarios/${header.scenario_id}`);
+            } catch (error) {
                 this.showNotification('Scenario not found', 'error');
                 return;
             }
+            if (generation !== this.conversationGeneration) {
+                return;
+            }
 
             // Populate the conversation viewer
-            this.populateConversationContext(runScenario, fullRunData);
-            this.populateConversationLog(fullRunData.log);
+            this.conversationScenario = runScenario;
+            this.populateConversationContext(runScenario, header);
+            if (runData.log) {
+                this.populateConversationLog(runData.log);
+            } else {
+                this.resetConversationLog(header.message_count);
+                this.appendConversationMessages(firstPage);
+                remainingMessages = () => this.loadRemainingMessages(header.id, firstPage.length, header.message_count, generation);
+            }
 
             // Switch to conversation view
             this.showView('conversation');
@@ -332,6 +667,31 @@ class DriftwoodApp {
         } finally {
             this.showLoading(false);
         }
+        
+        if (remainingMessages) {
+            await remainingMessages();
+        }
+    }
+
+    async loadRemainingMessages(runId, offset, total, generation) {
+        // Appended page by page in the background so the view is usable straight away
+        try {
+            while (offset < total) {
+                const messages = await this.apiCall(
+                    `/runs/${runId}/messages?offset=${offset}&limit=${this.conversationPageSize}`
+                );
+                if (generation !== this.conversationGeneration || messages.length === 0) {
+                    return;
+                }
+                await new Promise(resolve => requestAnimationFrame(resolve));
+                this.appendConversationMessages(messages);
+                offset += messages.length;
+            }
+        } catch (error) {
+            if (generation === this.conversationGeneration) {
+                this.showNotification(`Failed to load the rest of the conversation: ${error.message}`, 'error');
+            }
+        }
     }
 
     populateConversationContext(scenario, runData) {
@@ -357,6 +717,10 @@ class DriftwoodApp {
                 <span class="setting-label">Max Tokens:</span>
                 <span>${scenario.settings.max_tokens}</span>
             </div>
+            <div class="setting-item">
+                <span class="setting-label">Mediation:</span>
+                <span>${scenario.settings.mediation_mode === 'per_participant' ? 'Per participant' : 'Group'}</span>
+            </div>
         `;
 
         // Participants
@@ -374,48 +738,149 @@ class DriftwoodApp {
             </div>
         `).join('');
 
+        // Evaluation scores (computed in the background shortly after a run is saved)
+        const scores = Object.entries(runData.scores || {});
+        document.getElementById('context-scores-section').classList.toggle('hidden', scores.length === 0);
+        document.getElementById('context-scores').innerHTML = scores.map(([scorer, value]) => `
+            <div class="setting-item">
+                <span class="setting-label">${scorer.replace(/_/g, ' ')}:</span>
+                <span>${Number.isInteger(value) ? value : value.toFixed(2)}</span>
+            </div>
+        `).join('');
+
         // Update conversation timestamp
         const timestampEl = document.getElementById('conversation-timestamp');
         const timestamp = new Date(runData.timestamp).toLocaleString();
         timestampEl.textContent = timestamp;
+
+        this.resetTrace(runData.id);
     }
 
-    populateConversationLog(conversationLog) {
-        const chatLogEl = document.getElementById('chat-log');
-        const messageCountEl = document.getElementById('message-count');
+    resetTrace(runId) {
+        // Only saved runs have a trace; live conversations show no timing button
+        this.traceRunId = runId || null;
+        const toggleBtn = document.getElementById('toggle-trace');
+        toggleBtn.textContent = 'Show timing';
+        toggleBtn.classList.toggle('hidden', !this.traceRunId);
+        const panelEl = document.getElementById('trace-panel');
+        panelEl.classList.add('hidden');
+        panelEl.innerHTML = '';
+    }
 
-        // Update message count
-        messageCountEl.textContent = `${conversationLog.length} messages`;
+    async toggleTrace() {
+        const toggleBtn = document.getElementById('toggle-trace');
+        const panelEl = document.getElementById('trace-panel');
+        if (!panelEl.classList.contains('hidden')) {
+            panelEl.classList.add('hidden');
+            toggleBtn.textContent = 'Show timing';
+            return;
+        }
 
-        // Clear existing messages
-        chatLogEl.innerHTML = '';
+        const runId = this.traceRunId;
+        panelEl.innerHTML = '<p class="trace-empty">Loading timing...</p>';
+        panelEl.classList.remove('hidden');
+        toggleBtn.textContent = 'Hide timing';
+        try {
+            const trace = await this.apiCall(`/runs/${runId}/trace`);
+            if (runId === this.traceRunId) {
+                this.renderTrace(trace);
+            }
+        } catch (error) {
+            if (runId === this.traceRunId) {
+                panelEl.innerHTML = '<p class="trace-empty">No timing was recorded for this run.</p>';
+            }
+        }
+    }
 
-        // Add messages
-        conversationLog.forEach((message, index) => {
-            const messageEl = document.createElement('div');
-            const isAI = message.speaker === 'AI';
-            
-            messageEl.className = `message ${isAI ? 'ai-message' : 'participant-message'}`;
-            
-            const timestamp = new Date(message.timestamp).toLocaleTimeString();
-            
-            messageEl.innerHTML = `
-                <div class="message-header">
-                    <span class="message-speaker ${isAI ? 'ai' : 'participant'}">
-                        ${isAI ? '🤖 AI (Driftwood)' : '👤 ' + message.speaker}
-                    </span>
-                    <span class="message-timestamp">${timestamp}</span>
-                </div>
-                <div class="message-content">${this.formatMessageContent(message.content)}</div>
-            `;
+    renderTrace(trace) {
+        const panelEl = document.getElementById('trace-panel');
+        const total = trace.duration_ms || Math.max(1, ...trace.spans.map(s => s.start_ms + (s.duration_ms || 0)));
 
-            chatLogEl.appendChild(messageEl);
+        // Depth-first order, so every stage sits under the stage that contains it
+        const children = new Map();
+        trace.spans.forEach(s => {
+            const siblings = children.get(s.parent_id) || [];
+            siblings.push(s);
+            children.set(s.parent_id, siblings);
         });
+        const rows = [];
+        const visit = (parentId, depth) => {
+            (children.get(parentId) || []).forEach(s => {
+                rows.push({ span: s, depth });
+                visit(s.id, depth + 1);
+            });
+        };
+        visit(null, 0);
+
+        const formatMs = ms => ms >= 1000 ? `${(ms / 1000).toFixed(2)}s` : `${ms.toFixed(1)}ms`;
+        panelEl.innerHTML = `
+            <div class="trace-summary">${trace.name} · ${formatMs(total)} · ${trace.spans.length} stages</div>
+            ${rows.map(({ span, depth }) => {
+                const duration = span.duration_ms || 0;
+                const left = Math.min(100, span.start_ms / total * 100);
+                const width = Math.max(0.3, Math.min(100 - left, duration / total * 100));
+                const label = span.duration_ms === null ? 'unfinished' : formatMs(duration);
+                const errorClass = span.attributes.error ? ' trace-bar-error' : '';
+                return `
+                    <div class="trace-row" title="${span.name} @ ${formatMs(span.start_ms)} ${JSON.stringify(span.attributes).replace(/"/g, '&quot;')}">
+                        <span class="trace-name" style="padding-left: ${depth * 0.75}rem">${span.name}</span>
+                        <span class="trace-track">
+                            <span class="trace-bar trace-${span.name.split('.')[0]}${errorClass}" style="left: ${left}%; width: ${width}%"></span>
+                        </span>
+                        <span class="trace-duration">${label}</span>
+                    </div>
+                `;
+            }).join('')}
+        `;
+    }
+
+    populateConversationLog(conversationLog) {
+        const chatLogEl = document.getElementById('chat-log');
+
+        this.resetConversationLog(conversationLog.length);
+        this.appendConversationMessages(conversationLog);
 
         // Scroll to bottom
         chatLogEl.scrollTop = chatLogEl.scrollHeight;
     }
 
+    resetConversationLog(messageCount) {
+        const chatLogEl = document.getElementById('chat-log');
+        document.getElementById('message-count').textContent = `${messageCount} messages`;
+        chatLogEl.innerHTML = '';
+        chatLogEl.scrollTop = 0;
+    }
+
+    appendConversationMessages(messages) {
+        // One DOM insertion per page
+        const fragment = document.createDocumentFragment();
+        messages.forEach((message) => {
+            fragment.appendChild(this.createMessageElement(message));
+        });
+        document.getElementById('chat-log').appendChild(fragment);
+    }
+
+    createMessageElement(message) {
+        const messageEl = document.createElement('div');
+        const isAI = message.speaker === 'AI';
+        
+        messageEl.className = `message ${isAI ? 'ai-message' : 'participant-message'}`;
+        
+        const timestamp = new Date(message.timestamp).toLocaleTimeString();
+        
+        messageEl.innerHTML = `
+            <div class="message-header">
+                <span class="message-speaker ${isAI ? 'ai' : 'participant'}">
+                    ${isAI ? '🤖 AI (Driftwood)' + (message.in_reply_to ? ' → ' + message.in_reply_to : '') : '👤 ' + message.speaker}
+                </span>
+                <span class="message-timestamp">${timestamp}</span>
+            </div>
+            <div class="message-content">${this.formatMessageContent(message.content)}</div>
+        `;
+        
+        return messageEl;
+    }
+
     formatMessageContent(content) {
         // Basic formatting - convert line breaks to <br> and preserve whitespace
         return content
@@ -432,37 +897,284 @@ class DriftwoodApp {
     }
 
     // History Management Methods
+    //
+    // The history list is virtualized: only the rows inside the scroll
+    // viewport (plus a small overscan) exist in the DOM. Rows are absolutely
+    // positioned at index * rowHeight inside a spacer sized for the total
+    // number of runs, and pages are fetched from GET /runs as they scroll
+    // into view.
     async loadHistory() {
+        const loadingEl = document.getElementById('history-loading');
+        const emptyEl = document.getElementById('history-empty');
+        const listEl = document.getElementById('history-list');
+
+        // Reset list state; responses from older generations are discarded
+        this.historyGeneration += 1;
+        this.historyRows = [];
+        this.historyTotal = 0;
+        this.historyPagesInFlight.clear();
+        this.historyRowEls.forEach(el => el.remove());
+        this.historyRowEls.clear();
+        listEl.scrollTop = 0;
+
+        // Show loading state
+        loadingEl.style.display = 'flex';
+        emptyEl.classList.add('hidden');
+        listEl.classList.add('hidden');
+
         try {
-            const loadingEl = document.getElementById('history-loading');
-            const emptyEl = document.getElementById('history-empty');
-            const listEl = document.getElementById('history-list');
-            
-            // Show loading state
-            loadingEl.style.display = 'flex';
-            emptyEl.classList.add('hidden');
-            listEl.innerHTML = '';
-            
-            // Fetch runs from API
-            const runs = await this.apiCall('/runs');
-            this.runsCache = runs;
-            
+            const generation = this.historyGeneration;
+            const cached = this.historyCache !== null && await this.syncHistory();
+            if (generation !== this.historyGeneration) {
+                return;
+            }
+            if (cached) {
+                this.showCachedHistory();
+            } else {
+                await this.fetchHistoryPage(0);
+                if (generation !== this.historyGeneration) {
+                    return;
+                }
+            }
+
             // Hide loading state
             loadingEl.style.display = 'none';
-            
+
             // Show empty state or populate list
-            if (runs.length === 0) {
+            if (this.historyTotal === 0) {
+                emptyEl.querySelector('p').textContent = this.currentHistoryFilter === 'starred'
+                    ? 'No runs found for this filter.'
+                    : 'No simulation runs found. Create your first scenario to get started!';
                 emptyEl.classList.remove('hidden');
             } else {
-                this.renderHistory(runs);
+                listEl.classList.remove('hidden');
+                this.updateHistorySpacer();
+                this.renderVisibleHistory(true);
             }
-            
+
         } catch (error) {
-            document.getElementById('history-loading').style.display = 'none';
+            loadingEl.style.display = 'none';
             this.showNotification(`Failed to load history: ${error.message}`, 'error');
         }
     }
 
+    // Bring the IndexedDB copy of the history up to date; false if IndexedDB is unusable
+    async syncHistory() {
+        if (!this.historySync) {
+            this.historySync = this.syncHistoryCache().finally(() => {
+                this.historySync = null;
+            });
+        }
+        return this.historySync;
+    }
+
+    async syncHistoryCache() {
+        if (!this.historyCacheRuns) {
+            try {
+                const cached = await this.historyCache.load();
+                this.historyCacheRuns = new Map(cached.runs.map(run => [run.id, run]));
+                this.historyCacheVersion = cached.version;
+            } catch (error) {
+                // E.g. storage disabled in a private window: page through /runs instead
+                console.warn('History cache unavailable:', error);
+                this.historyCache = null;
+                return false;
+            }
+        }
+
+        let hasMore = true;
+        while (hasMore) {
+            const changes = await this.apiCall(`/runs/changes?since=${this.historyCacheVersion}`);
+            if (changes.reset) {
+                // The server's database was replaced since the cache was filled
+                await this.historyCache.clear();
+                this.historyCacheRuns.clear();
+                this.historyCacheVersion = 0;
+                continue;
+            }
+            changes.runs.forEach(run => this.historyCacheRuns.set(run.id, run));
+            changes.deleted.forEach(runId => this.historyCacheRuns.delete(runId));
+            await this.historyCache.apply(changes.runs, changes.deleted, changes.version);
+            this.historyCacheVersion = changes.version;
+            hasMore = changes.has_more;
+        }
+        return true;
+    }
+
+    showCachedHistory() {
+        const starredOnly = this.currentHistoryFilter === 'starred';
+        this.historyRows = [...this.historyCacheRuns.values()]
+            .filter(run => !starredOnly || run.starred)
+            .sort((a, b) => b.timestamp.localeCompare(a.timestamp) || b.id.localeCompare(a.id));
+        this.historyTotal = this.historyRows.length;
+    }
+
+    async fetchHistoryPage(page) {
+        if (this.historyPagesInFlight.has(page)) {
+            return;
+        }
+
+        const generation = this.historyGeneration;
+        const offset = page * this.historyPageSize;
+        let endpoint = `/runs?offset=${offset}&limit=${this.historyPageSize}`;
+        if (this.currentHistoryFilter === 'starred') {
+            endpoint += '&starred=true';
+        }
+
+        this.historyPagesInFlight.add(page);
+        try {
+            const response = await fetch(endpoint);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const runs = await response.json();
+
+            // The list was reset or mutated while this page was in flight
+            if (generation !== this.historyGeneration) {
+                return;
+            }
+
+            this.historyTotal = parseInt(response.headers.get('X-Total-Count'), 10) || 0;
+            runs.forEach((run, index) => {
+                if (!this.historyRows[offset + index]) {
+                    this.historyRows[offset + index] = run;
+                }
+            });
+        } finally {
+            if (generation === this.historyGeneration) {
+                this.historyPagesInFlight.delete(page);
+            }
+        }
+    }
+
+    getHistoryRowHeight() {
+        const listEl = document.getElementById('history-list');
+        const value = getComputedStyle(listEl).getPropertyValue('--history-row-height');
+        return parseFloat(value) || 180;
+    }
+
+    updateHistorySpacer() {
+        const spacerEl = document.getElementById('history-spacer');
+        spacerEl.style.height = `${this.historyTotal * this.getHistoryRowHeight()}px`;
+    }
+
+    scheduleHistoryRender() {
+        if (this.historyRenderPending) {
+            return;
+        }
+        this.historyRenderPending = true;
+        requestAnimationFrame(() => {
+            this.historyRenderPending = false;
+            this.renderVisibleHistory();
+        });
+    }
+
+    renderVisibleHistory(force = false) {
+        const listEl = document.getElementById('history-list');
+        const rowHeight = this.getHistoryRowHeight();
+        const overscan = 4;
+
+        if (this.historyTotal === 0) {
+            return;
+        }
+
+        const first = Math.max(0, Math.floor(listEl.scrollTop / rowHeight) - overscan);
+        const last = Math.min(
+            this.historyTotal - 1,
+            Math.ceil((listEl.scrollTop + listEl.clientHeight) / rowHeight) + overscan
+        );
+
+        // Drop rows that scrolled out of the window (or everything on a forced re-render)
+        this.historyRowEls.forEach((el, index) => {
+            if (force || index < first || index > last) {
+                el.remove();
+                this.historyRowEls.delete(index);
+            }
+        });
+
+        // Add rows that scrolled into the window
+        const missingPages = new Set();
+        for (let index = first; index <= last; index++) {
+            const run = this.historyRows[index];
+            if (!run) {
+                missingPages.add(Math.floor(index / this.historyPageSize));
+            }
+
+            const existing = this.historyRowEls.get(index);
+            if (existing && (existing.dataset.runId || null) === (run ? run.id : null)) {
+                continue;
+            }
+            if (existing) {
+                existing.remove();
+            }
+
+            const rowEl = this.createHistoryRow(run);
+            rowEl.style.top = `${index * rowHeight}px`;
+            listEl.appendChild(rowEl);
+            this.historyRowEls.set(index, rowEl);
+        }
+
+        missingPages.forEach(page => {
+            this.fetchHistoryPage(page)
+                .then(() => this.scheduleHistoryRender())
+                .catch(error => this.showNotification(`Failed to load history: ${error.message}`, 'error'));
+        });
+    }
+
+    createHistoryRow(run) {
+        const template = document.createElement('template');
+        template.innerHTML = run
+            ? this.renderHistoryItem(run).trim()
+            : '<div class="history-item history-item-placeholder"><p>Loading...</p></div>';
+        return template.content.firstElementChild;
+    }
+
+    // Replace a single rendered row in place after its data changed
+    patchHistoryRow(index) {
+        const existing = this.historyRowEls.get(index);
+        if (!existing) {
+            return;
+        }
+        const rowEl = this.createHistoryRow(this.historyRows[index]);
+        rowEl.style.top = existing.style.top;
+        existing.replaceWith(rowEl);
+        this.historyRowEls.set(index, rowEl);
+    }
+
+    // Remove a row from the list; only rows in the visible window are re-laid out
+    removeHistoryRow(index) {
+        this.historyGeneration += 1;
+        this.historyPagesInFlight.clear();
+        this.historyRows.splice(index, 1);
+        this.historyTotal = Math.max(0, this.historyTotal - 1);
+
+        if (this.historyTotal === 0) {
+            this.loadHistory();
+            return;
+        }
+
+        const rowHeight = this.getHistoryRowHeight();
+        const shifted = new Map();
+        this.historyRowEls.forEach((el, rowIndex) => {
+            if (rowIndex === index) {
+                el.remove();
+            } else if (rowIndex > index) {
+                el.style.top = `${(rowIndex - 1) * rowHeight}px`;
+                shifted.set(rowIndex - 1, el);
+            } else {
+                shifted.set(rowIndex, el);
+            }
+        });
+        this.historyRowEls = shifted;
+
+        this.updateHistorySpacer();
+        this.renderVisibleHistory();
+    }
+
+    findHistoryIndex(runId) {
+        return this.historyRows.findIndex(run => run && run.id === runId);
+    }
+
     setHistoryFilter(filter) {
         this.currentHistoryFilter = filter;
         
@@ -477,31 +1189,8 @@ class DriftwoodApp {
             document.getElementById('filter-starred').classList.add('active');
         }
         
-        // Re-render history with filter
-        if (this.runsCache) {
-            this.renderHistory(this.runsCache);
-        }
-    }
-
-    renderHistory(runs) {
-        const listEl = document.getElementById('history-list');
-        
-        // Filter runs based on current filter
-        let filteredRuns = runs;
-        if (this.currentHistoryFilter === 'starred') {
-            filteredRuns = runs.filter(run => run.starred);
-        }
-        
-        // Sort by timestamp (latest first)
-        filteredRuns.sort((a, b) => new Date(b.timestamp) - new Date(a.timestamp));
-        
-        // Render filtered runs
-        if (filteredRuns.length === 0) {
-            listEl.innerHTML = '<div class="history-empty"><p>No runs found for this filter.</p></div>';
-            return;
-        }
-        
-        listEl.innerHTML = filteredRuns.map(run => this.renderHistoryItem(run)).join('');
+        // Start again from the top (filtered locally when the history is cached)
+        this.loadHistory();
     }
 
     renderHistoryItem(run) {
@@ -527,6 +1216,11 @@ class DriftwoodApp {
                         <span>💬</span>
                         <span>${this.getMessageCount(run)} messages</span>
                     </div>
+                    ${run.status === 'timed_out' ? `
+                    <div class="history-item-meta-item history-item-timed-out">
+                        <span>⏱️</span>
+                        <span>Timed out</span>
+                    </div>` : ''}
                 </div>
                 
                 <div class="history-item-actions">
@@ -544,21 +1238,19 @@ class DriftwoodApp {
 
     async toggleStar(runId, starred) {
         try {
-            const response = await this.apiCall(`/runs/${runId}/star`, 'PATCH', { starred });
+            await this.apiCall(`/runs/${runId}/star`, 'PATCH', { starred });
             
-            // Update the cache
-            if (this.runsCache) {
-                const run = this.runsCache.find(r => r.id === runId);
-                if (run) {
-                    run.starred = starred;
+            // Update the loaded row and patch it in place
+            const index = this.findHistoryIndex(runId);
+            if (index !== -1) {
+                if (!starred && this.currentHistoryFilter === 'starred') {
+                    this.removeHistoryRow(index);
+                } else {
+                    this.historyRows[index] = { ...this.historyRows[index], starred };
+                    this.patchHistoryRow(index);
                 }
             }
             
-            // Re-render the history
-            if (this.runsCache) {
-                this.renderHistory(this.runsCache);
-            }
-            
             this.showNotification(starred ? 'Run starred!' : 'Star removed', 'success');
             
         } catch (error) {
@@ -568,12 +1260,13 @@ class DriftwoodApp {
 
     async viewHistoryItem(runId) {
         try {
-            // Find the run in cache or fetch it
-            let run = this.runsCache ? this.runsCache.find(r => r.id === runId) : null;
+            // Find the run in the loaded rows or fetch it
+            const index = this.findHistoryIndex(runId);
+            let run = index !== -1 ? this.historyRows[index] : null;
             
             if (!run) {
-                // Fetch specific run if not in cache
-                run = await this.apiCall(`/runs/${runId}`);
+                // Not loaded yet; showConversation fetches it page by page
+                run = { id: runId };
             }
             
             // Show the conversation
@@ -592,14 +1285,10 @@ class DriftwoodApp {
         try {
             await this.apiCall(`/runs/${runId}`, 'DELETE');
             
-            // Remove from cache
-            if (this.runsCache) {
-                this.runsCache = this.runsCache.filter(run => run.id !== runId);
-            }
-            
-            // Re-render history
-            if (this.runsCache) {
-                this.renderHistory(this.runsCache);
+            // Remove the row; the rest of the list is left untouched
+            const index = this.findHistoryIndex(runId);
+            if (index !== -1) {
+                this.removeHistoryRow(index);
             }
             
             this.showNotification('Run deleted successfully', 'success');
@@ -610,7 +1299,14 @@ class DriftwoodApp {
     }
 
     async deleteAllUnstarred() {
-        const unstarredCount = this.runsCache ? this.runsCache.filter(run => !run.starred).length : 0;
+        let unstarredCount = 0;
+        try {
+            const response = await fetch('/runs?starred=false&limit=0');
+            unstarredCount = parseInt(response.headers.get('X-Total-Count'), 10) || 0;
+        } catch (error) {
+            this.showNotification(`Failed to count runs: ${error.message}`, 'error');
+            return;
+        }
         
         if (unstarredCount === 0) {
             this.showNotification('No unstarred runs to delete', 'info');
@@ -626,15 +1322,8 @@ class DriftwoodApp {
             
             const response = await this.apiCall('/runs', 'DELETE');
             
-            // Update cache - keep only starred runs
-            if (this.runsCache) {
-                this.runsCache = this.runsCache.filter(run => run.starred);
-            }
-            
-            // Re-render history
-            if (this.runsCache) {
-                this.renderHistory(this.runsCache);
-            }
+            // Bulk change - start again from the first page
+            await this.loadHistory();
             
             this.showNotification(`Deleted ${response.deleted_count} unstarred runs`, 'success');
             
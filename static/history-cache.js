@@ -0,0 +1,71 @@
+// Persistent copy of the run history in IndexedDB.
+//
+// The cache holds the summaries shown in the History view and the feed version
+// they are current as of. Opening the history applies only the changes since
+// that version (GET /runs/changes), so an unchanged history costs one small
+// request instead of the whole run list.
+class HistoryCache {
+    constructor(name = 'driftwood-history') {
+        this.name = name;
+        this.db = null;
+    }
+
+    static isSupported() {
+        return 'indexedDB' in window;
+    }
+
+    open() {
+        if (this.db) {
+            return Promise.resolve(this.db);
+        }
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open(this.name, 1);
+            request.onupgradeneeded = () => {
+                request.result.createObjectStore('runs', { keyPath: 'id' });
+                request.result.createObjectStore('meta');
+            };
+            request.onsuccess = () => {
+                this.db = request.result;
+                resolve(this.db);
+            };
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async transaction(mode, work) {
+        const db = await this.open();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(['runs', 'meta'], mode);
+            const result = work(tx.objectStore('runs'), tx.objectStore('meta'));
+            tx.oncomplete = () => resolve(result);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    // Cached summaries and the feed version they reflect
+    async load() {
+        const state = { version: 0, runs: [] };
+        await this.transaction('readonly', (runs, meta) => {
+            runs.getAll().onsuccess = (event) => { state.runs = event.target.result; };
+            meta.get('version').onsuccess = (event) => { state.version = event.target.result || 0; };
+        });
+        return state;
+    }
+
+    // Store one page of the change feed atomically, together with its version
+    apply(changedRuns, deletedIds, version) {
+        return this.transaction('readwrite', (runs, meta) => {
+            changedRuns.forEach(run => runs.put(run));
+            deletedIds.forEach(id => runs.delete(id));
+            meta.put(version, 'version');
+        });
+    }
+
+    clear() {
+        return this.transaction('readwrite', (runs, meta) => {
+            runs.clear();
+            meta.clear();
+        });
+    }
+}
@@ -0,0 +1,75 @@
+import mimetypes
+import os
+import re
+from typing import Set
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# Static file serving with precompressed variants and cache headers.
+#
+# When build_static.py has produced static/dist, a request for a file is
+# answered with its .br or .gz sibling if the client accepts that encoding.
+# Fingerprinted files (a content hash in the name) never change, so they are
+# cached for a year as immutable; everything else, index.html included, must
+# be revalidated (ETag / If-None-Match) on every use.
+#
+# The built index.html is only served while it is at least as new as the
+# sources, so editing a file in static/ takes effect without rebuilding.
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Preferred first
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+
+_FINGERPRINTED = re.compile(r"\.[0-9a-f]{10}\.\w+$")
+
+def _accepted_encodings(header: str) -> Set[str]:
+    """Encodings named in Accept-Encoding, except those refused with q=0"""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if name and not re.fullmatch(r"q=0(\.0*)?", quality.replace(" ", "")):
+            accepted.add(name.strip().lower())
+    return accepted
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+
+        response = None
+        accepted = _accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding, suffix in PRECOMPRESSED:
+            variant = f"{full_path}{suffix}"
+            if encoding in accepted and os.path.isfile(variant):
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    stat_result=os.stat(variant),
+                    media_type=media_type,
+                    headers={"Content-Encoding": encoding}
+                )
+                break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+
+        response.headers["Vary"] = "Accept-Encoding"
+        response.headers["Cache-Control"] = IMMUTABLE if _FINGERPRINTED.search(str(full_path)) else REVALIDATE
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+def index_path(static_dir: str = "static") -> str:
+    """Path of index.html below `static_dir`: the built one unless a source is newer"""
+    manifest = os.path.join(static_dir, "dist", "manifest.json")
+    if not os.path.isfile(manifest):
+        return "index.html"
+    built_at = os.path.getmtime(manifest)
+    sources = [entry for entry in os.scandir(static_dir) if entry.is_file()]
+    if any(entry.stat().st_mtime > built_at for entry in sources):
+        return "index.html"
+    return "dist/index.html"
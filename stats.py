@@ -0,0 +1,180 @@
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Iterable, Dict, Any, List, Optional
+import uuid
+
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+
+from database import Run, ScenarioStats, ScenarioStatsBucket
+
+# Lower bounds of the histogram buckets for each metric; the last bucket is open-ended
+HISTOGRAM_BOUNDS = {
+    "reply_length": [0, 100, 250, 500, 1000, 2000, 4000],  # characters per mediator message
+    "latency_ms": [0, 1000, 2000, 5000, 10000, 20000, 60000],  # milliseconds per run
+}
+
+ERROR_PREFIX = "[AI Error:"
+
+def is_error_reply(content: str) -> bool:
+    """Whether a mediator message records a failed LLM call"""
+    return content.startswith(ERROR_PREFIX)
+
+def _bucket(metric: str, value: float) -> int:
+    return max(0, bisect_right(HISTOGRAM_BOUNDS[metric], value) - 1)
+
+def _insert(db: Session):
+    """Dialect-specific INSERT supporting ON CONFLICT DO UPDATE"""
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+def _increment(db: Session, model, keys: Dict[str, Any], deltas: Dict[str, int]):
+    """Atomically add deltas to a row, creating it if needed.
+
+    The addition happens in SQL so concurrent writers never lose updates.
+    """
+    table = model.__table__
+    stmt = _insert(db)(table).values(**keys, **deltas)
+    updates = {name: table.c[name] + stmt.excluded[name] for name in deltas}
+    if "updated_at" in table.c:
+        updates["updated_at"] = datetime.utcnow()
+    stmt = stmt.on_conflict_do_update(index_elements=list(keys), set_=updates)
+    db.execute(stmt)
+
+def _apply(db: Session, runs: Iterable[Run], sign: int):
+    """Add (sign=1) or remove (sign=-1) runs from their scenarios' aggregates"""
+    totals: Dict[uuid.UUID, Counter] = defaultdict(Counter)
+    buckets: Dict[uuid.UUID, Counter] = defaultdict(Counter)
+
+    for run in runs:
+        replies = [message["content"] for message in run.log if message["speaker"] == "AI"]
+        scenario_totals = totals[run.scenario_id]
+        scenario_totals["run_count"] += sign
+        scenario_totals["starred_count"] += sign if run.starred else 0
+        failed = run.status == "timed_out" or any(is_error_reply(reply) for reply in replies)
+        scenario_totals["error_count"] += sign if failed else 0
+        scenario_totals["reply_count"] += sign * len(replies)
+        scenario_totals["reply_length_total"] += sign * sum(len(reply) for reply in replies)
+
+        for reply in replies:
+            buckets[run.scenario_id][("reply_length", _bucket("reply_length", len(reply)))] += sign
+
+        if run.latency_ms is not None:
+            scenario_totals["latency_count"] += sign
+            scenario_totals["latency_total_ms"] += sign * run.latency_ms
+            buckets[run.scenario_id][("latency_ms", _bucket("latency_ms", run.latency_ms))] += sign
+
+    for scenario_id, deltas in totals.items():
+        _increment(db, ScenarioStats, {"scenario_id": scenario_id}, dict(deltas))
+        for (metric, bucket), count in buckets[scenario_id].items():
+            _increment(
+                db,
+                ScenarioStatsBucket,
+                {"scenario_id": scenario_id, "metric": metric, "bucket": bucket},
+                {"count": count}
+            )
+
+def record_runs_added(db: Session, runs: Iterable[Run]):
+    """Fold newly inserted runs into their scenarios' aggregates"""
+    _apply(db, runs, 1)
+
+def record_runs_removed(db: Session, runs: Iterable[Run]):
+    """Take deleted runs out of their scenarios' aggregates"""
+    _apply(db, runs, -1)
+
+def record_star_changed(db: Session, run: Run, starred: bool):
+    """Adjust the starred count after a run's starred flag changed to `starred`"""
+    _increment(
+        db,
+        ScenarioStats,
+        {"scenario_id": run.scenario_id},
+        {"starred_count": 1 if starred else -1}
+    )
+
+def rebuild_scenario_stats(db: Session, scenario_ids: Optional[List[uuid.UUID]] = None):
+    """Recompute the aggregates of some scenarios (default: all) from the runs table.
+
+    Only needed for runs saved before the aggregate tables existed; afterwards
+    they are kept up to date incrementally.
+    """
+    buckets, stats, runs = db.query(ScenarioStatsBucket), db.query(ScenarioStats), db.query(Run)
+    if scenario_ids is not None:
+        buckets = buckets.filter(ScenarioStatsBucket.scenario_id.in_(scenario_ids))
+        stats = stats.filter(ScenarioStats.scenario_id.in_(scenario_ids))
+        runs = runs.filter(Run.scenario_id.in_(scenario_ids))
+    buckets.delete(synchronize_session=False)
+    stats.delete(synchronize_session=False)
+    batch = []
+    for run in runs.yield_per(500):
+        batch.append(run)
+        if len(batch) >= 500:
+            record_runs_added(db, batch)
+            batch = []
+    if batch:
+        record_runs_added(db, batch)
+    db.commit()
+
+def ensure_scenario_stats(db: Session):
+    """Backfill the aggregates of scenarios whose run count does not match their runs"""
+    run_counts = (
+        db.query(Run.scenario_id.label("scenario_id"), func.count(Run.id).label("runs"))
+        .group_by(Run.scenario_id)
+        .subquery()
+    )
+    # Scenarios with uncounted runs, and counted scenarios whose runs are gone
+    uncounted = db.query(run_counts.c.scenario_id).outerjoin(
+        ScenarioStats, ScenarioStats.scenario_id == run_counts.c.scenario_id
+    ).filter(or_(ScenarioStats.run_count.is_(None), ScenarioStats.run_count != run_counts.c.runs))
+    stale = db.query(ScenarioStats.scenario_id).filter(
+        ScenarioStats.run_count != 0,
+        ScenarioStats.scenario_id.not_in(select(run_counts.c.scenario_id))
+    )
+    scenario_ids = [scenario_id for (scenario_id,) in uncounted.union(stale).all()]
+    if scenario_ids:
+        rebuild_scenario_stats(db, scenario_ids)
+
+def _histogram(metric: str, counts: Dict[int, int]):
+    bounds = HISTOGRAM_BOUNDS[metric]
+    return [
+        {
+            "lower": lower,
+            "upper": bounds[index + 1] if index + 1 < len(bounds) else None,
+            "count": counts.get(index, 0),
+        }
+        for index, lower in enumerate(bounds)
+    ]
+
+def get_scenario_stats(db: Session, scenario_id: uuid.UUID) -> Dict[str, Any]:
+    """Read a scenario's aggregates; cost is independent of its number of runs"""
+    stats: Optional[ScenarioStats] = db.query(ScenarioStats).filter(
+        ScenarioStats.scenario_id == scenario_id
+    ).first()
+    bucket_rows = db.query(ScenarioStatsBucket).filter(
+        ScenarioStatsBucket.scenario_id == scenario_id
+    ).all()
+
+    counts: Dict[str, Dict[int, int]] = defaultdict(dict)
+    for row in bucket_rows:
+        counts[row.metric][row.bucket] = row.count
+
+    run_count = stats.run_count if stats else 0
+    reply_count = stats.reply_count if stats else 0
+    latency_count = stats.latency_count if stats else 0
+
+    return {
+        "scenario_id": scenario_id,
+        "run_count": run_count,
+        "starred_count": stats.starred_count if stats else 0,
+        "error_count": stats.error_count if stats else 0,
+        "error_rate": stats.error_count / run_count if run_count else 0.0,
+        "reply_count": reply_count,
+        "avg_reply_length": stats.reply_length_total / reply_count if reply_count else None,
+        "avg_latency_ms": stats.latency_total_ms / latency_count if latency_count else None,
+        "reply_length_histogram": _histogram("reply_length", counts["reply_length"]),
+        "latency_histogram": _histogram("latency_ms", counts["latency_ms"]),
+        "updated_at": stats.updated_at if stats else None,
+    }
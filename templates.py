@@ -0,0 +1,319 @@
+import asyncio
+import functools
+import itertools
+import logging
+import math
+import os
+import random
+import re
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, Scenario, ScenarioTemplate, TemplateExpansion, SimulationJob
+from jobs import enqueue_jobs, job_worker
+from schemas import ScenarioCreate
+from simulation import simulation_engine
+
+# Scenario templates.
+#
+# A template is a scenario whose strings contain {placeholders}, plus the list
+# of values each placeholder takes. A string that is exactly one placeholder
+# is replaced by the value itself, so a variable can supply a list of
+# meta_tags, a whole participant list (to vary the participant count) or a
+# number; placeholders inside longer strings are interpolated as text.
+#
+# Variants are numbered: in product mode, variant i is the i-th combination of
+# values (the last variable changes fastest); in sample mode, `count` distinct
+# combinations are drawn at random, reproducibly from a seed. A variant is
+# computed from its number alone, so nothing is materialized ahead of use.
+#
+# An expansion feeds the variants into the job queue chunk by chunk: when
+# fewer than a chunk's worth of its jobs are still queued or running, the
+# feeder saves the next chunk of variants as scenarios and queues their runs,
+# in one transaction that also advances the expansion's cursor. The jobs share
+# the expansion's ID as their batch ID. Expansions resume from the cursor
+# after a restart.
+
+TEMPLATE_FEED_SECONDS = float(os.getenv("TEMPLATE_FEED_SECONDS", "1"))
+MAX_EXPANSION_VARIANTS = 100000
+SAMPLE_CACHE_SIZE = 8  # Expansions whose drawn sample is kept between chunks
+
+_PLACEHOLDER = re.compile(r"\{(\w+)\}")
+
+logger = logging.getLogger(__name__)
+
+class TemplateError(ValueError):
+    """A template is malformed or renders an invalid scenario"""
+
+def placeholders(value: Any) -> Set[str]:
+    """Names of the placeholders used anywhere in a template body"""
+    if isinstance(value, str):
+        return set(_PLACEHOLDER.findall(value))
+    if isinstance(value, dict):
+        return set().union(*(placeholders(item) for item in value.values()))
+    if isinstance(value, list):
+        return set().union(*(placeholders(item) for item in value))
+    return set()
+
+def render(value: Any, assignment: Dict[str, Any]) -> Any:
+    """Substitute the assigned values into a template body"""
+    if isinstance(value, str):
+        whole = _PLACEHOLDER.fullmatch(value)
+        if whole and whole.group(1) in assignment:
+            return assignment[whole.group(1)]
+        return _PLACEHOLDER.sub(
+            lambda match: str(assignment[match.group(1)]) if match.group(1) in assignment else match.group(0),
+            value
+        )
+    if isinstance(value, dict):
+        return {key: render(item, assignment) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render(item, assignment) for item in value]
+    return value
+
+def validate_template(body: Dict[str, Any], variables: Dict[str, List[Any]]):
+    """Check that every placeholder is declared and every variable is used and has values"""
+    used = placeholders(body)
+    undeclared = sorted(used - set(variables))
+    if undeclared:
+        raise TemplateError(f"Undeclared template variables: {', '.join(undeclared)}")
+    unused = sorted(set(variables) - used)
+    if unused:
+        raise TemplateError(f"Template variables not used in the scenario: {', '.join(unused)}")
+    empty = sorted(name for name, values in variables.items() if not values)
+    if empty:
+        raise TemplateError(f"Template variables without values: {', '.join(empty)}")
+
+def count_variants(variables: Dict[str, List[Any]]) -> int:
+    """Number of value combinations"""
+    return math.prod(len(values) for values in variables.values())
+
+def variant_assignment(variables: Dict[str, List[Any]], index: int) -> Dict[str, Any]:
+    """Values of combination `index` in product order, decoded like a mixed-radix number"""
+    assignment = {}
+    for name in reversed(list(variables)):
+        index, position = divmod(index, len(variables[name]))
+        assignment[name] = variables[name][position]
+    return {name: assignment[name] for name in variables}
+
+def _variant_indices(size: int, mode: str, count: int, seed: Optional[int]) -> Sequence[int]:
+    if mode == "product":
+        return range(count)
+    # Only the combination numbers are drawn up front, never the variants
+    return _sample_indices(size, count, seed)
+
+@functools.lru_cache(maxsize=SAMPLE_CACHE_SIZE)
+def _sample_indices(size: int, count: int, seed: Optional[int]) -> Tuple[int, ...]:
+    """`count` distinct combination numbers below `size`, drawn once per expansion
+
+    random.sample() needs len(range(size)), which overflows past sys.maxsize,
+    so large spaces are sampled by rejection instead. Both paths draw exactly
+    what random.sample() would (it rejects the same way in sparse spaces), so
+    an expansion resumes with the same sample whichever path it takes.
+    """
+    rng = random.Random(seed)
+    dense_limit = 21 + (4 ** math.ceil(math.log(count * 3, 4)) if count > 5 else 0)
+    if size <= dense_limit:
+        return tuple(rng.sample(range(size), count))
+    drawn: Set[int] = set()
+    indices = []
+    for _ in range(count):
+        index = rng.randrange(size)
+        while index in drawn:
+            index = rng.randrange(size)
+        drawn.add(index)
+        indices.append(index)
+    return tuple(indices)
+
+def iter_variants(
+    body: Dict[str, Any],
+    variables: Dict[str, List[Any]],
+    mode: str = "product",
+    count: Optional[int] = None,
+    seed: Optional[int] = None,
+    start: int = 0
+) -> Iterator[Tuple[int, Dict[str, Any], Dict[str, Any]]]:
+    """Lazily yield (combination number, assignment, rendered body) for variants start..count-1"""
+    size = count_variants(variables)
+    count = size if count is None else count
+    if count > size:
+        raise TemplateError(f"Template has {size} variants; cannot take {count}")
+    for index in _variant_indices(size, mode, count, seed)[start:]:
+        assignment = variant_assignment(variables, index)
+        yield index, assignment, render(body, assignment)
+
+def build_scenario(template: ScenarioTemplate, rendered: Dict[str, Any]) -> Scenario:
+    """Validate a rendered variant and turn it into an (unsaved) scenario"""
+    try:
+        scenario = ScenarioCreate(**rendered)
+    except (TypeError, ValidationError) as e:
+        raise TemplateError(f"Variant is not a valid scenario: {e}")
+    if scenario.settings.endpoint is not None and scenario.settings.endpoint not in simulation_engine.endpoints:
+        raise TemplateError(f"Unknown LLM endpoint: {scenario.settings.endpoint}")
+
+    scenario_id = uuid.uuid4()
+    return Scenario(
+        id=scenario_id,
+        lineage_id=scenario_id,
+        template_id=template.id,
+        name=scenario.name,
+        participants=[participant.dict() for participant in scenario.participants],
+        system_prompt=scenario.system_prompt,
+        settings=scenario.settings.dict()
+    )
+
+def expansion_backlog(db: Session, expansion_id: uuid.UUID) -> int:
+    """Jobs of an expansion that are queued or running"""
+    return db.query(func.count(SimulationJob.id)).filter(
+        SimulationJob.batch_id == expansion_id,
+        SimulationJob.status.in_(["queued", "running"])
+    ).scalar()
+
+def feed_expansion(db: Session, expansion: TemplateExpansion) -> int:
+    """Queue the next chunk of an expansion's variants if its backlog allows; returns variants queued"""
+    if expansion_backlog(db, expansion.id) >= expansion.chunk_size * expansion.runs_per_variant:
+        return 0
+
+    template = db.get(ScenarioTemplate, expansion.template_id)
+    chunk = list(itertools.islice(
+        iter_variants(template.body, template.variables, expansion.mode, expansion.total, expansion.seed, expansion.cursor),
+        expansion.chunk_size
+    ))
+    cursor = expansion.cursor + len(chunk)
+    now = datetime.utcnow()
+
+    # Claim the chunk by moving the cursor; another feeder that got there first wins
+    claimed = db.execute(
+        update(TemplateExpansion)
+        .where(
+            TemplateExpansion.id == expansion.id,
+            TemplateExpansion.cursor == expansion.cursor,
+            TemplateExpansion.status == "running"
+        )
+        .values(cursor=cursor, status="completed" if cursor >= expansion.total else "running", updated_at=now)
+    )
+    if claimed.rowcount == 0:
+        db.rollback()
+        return 0
+
+    try:
+        scenarios = [build_scenario(template, rendered) for _, _, rendered in chunk]
+    except TemplateError as e:
+        db.rollback()
+        db.execute(
+            update(TemplateExpansion)
+            .where(TemplateExpansion.id == expansion.id)
+            .values(status="failed", last_error=str(e), updated_at=now)
+        )
+        db.commit()
+        return 0
+
+    db.add_all(scenarios)
+    db.flush()
+    for scenario in scenarios:
+        enqueue_jobs(
+            db, scenario.id, expansion.runs_per_variant, expansion.priority, expansion.max_attempts,
+            batch_id=expansion.id, commit=False
+        )
+    db.commit()
+    return len(chunk)
+
+def create_expansion(
+    db: Session,
+    template: ScenarioTemplate,
+    mode: str,
+    count: Optional[int],
+    seed: Optional[int],
+    runs_per_variant: int,
+    priority: str,
+    max_attempts: int,
+    chunk_size: int
+) -> TemplateExpansion:
+    """Start feeding a template's variants into the job queue"""
+    size = count_variants(template.variables)
+    if count is None:
+        if mode == "sample":
+            raise TemplateError("Sample mode needs a count")
+        count = size
+    if count > size:
+        raise TemplateError(f"Template has {size} variants; cannot take {count}")
+    if count > MAX_EXPANSION_VARIANTS:
+        raise TemplateError(f"Expansions are limited to {MAX_EXPANSION_VARIANTS} variants; pass a smaller count")
+
+    now = datetime.utcnow()
+    expansion = TemplateExpansion(
+        id=uuid.uuid4(),
+        template_id=template.id,
+        mode=mode,
+        # Fixed up front so the sample is the same after a restart
+        seed=random.randrange(2 ** 31) if mode == "sample" and seed is None else seed,
+        total=count,
+        cursor=0,
+        chunk_size=chunk_size,
+        runs_per_variant=runs_per_variant,
+        priority=priority,
+        max_attempts=max_attempts,
+        status="running",
+        created_at=now,
+        updated_at=now
+    )
+    db.add(expansion)
+    db.commit()
+    db.refresh(expansion)
+    return expansion
+
+class TemplateFeeder:
+    """Keeps running expansions fed into the job queue, one chunk at a time"""
+
+    def __init__(self, poll_seconds: float = TEMPLATE_FEED_SECONDS):
+        self.poll_seconds = poll_seconds
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._feed_loop())
+
+    def wake(self):
+        """Feed now instead of at the next poll"""
+        self._wake.set()
+
+    async def stop(self):
+        if self._loop_task is None:
+            return
+        self._loop_task.cancel()
+        await asyncio.gather(self._loop_task, return_exceptions=True)
+        self._loop_task = None
+
+    async def _feed_loop(self):
+        while True:
+            try:
+                if self.feed():
+                    job_worker.wake()
+            except Exception:
+                logger.exception("Feeding template expansions failed")
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def feed(self) -> int:
+        """One pass over the running expansions; returns variants queued"""
+        db = SessionLocal()
+        try:
+            expansions = db.query(TemplateExpansion).filter(
+                TemplateExpansion.status == "running"
+            ).order_by(TemplateExpansion.created_at).all()
+            return sum(feed_expansion(db, expansion) for expansion in expansions)
+        finally:
+            db.close()
+
+# Global template feeder, started with the application
+template_feeder = TemplateFeeder()
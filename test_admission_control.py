@@ -0,0 +1,85 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_admission_control():
+    """Test that excess runs are refused with 429 and /ready reports saturation
+
+    Start the server with small limits to see runs refused, e.g.
+    SCHEDULER_MAX_CONCURRENCY=2 ADMISSION_MAX_QUEUED=2
+    """
+
+    print("🧪 Testing Admission Control")
+    print()
+
+    scenario_data = {
+        "name": "Admission Control Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 50}
+    }
+
+    try:
+        ready = requests.get(f"{BASE_URL}/ready")
+        print("✅ Ready while idle" if ready.status_code == 200 else f"❌ /ready returned {ready.status_code}: {ready.text}")
+
+        scenario_response = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if scenario_response.status_code != 200:
+            print(f"❌ Failed to create scenario: {scenario_response.status_code}")
+            return
+        scenario_id = scenario_response.json()["id"]
+
+        metrics = requests.get(f"{BASE_URL}/scheduler/metrics").json()
+        burst = metrics["max_concurrency"] + metrics["max_queued"] + 4
+
+        def run():
+            response = requests.post(f"{BASE_URL}/run?scenario_id={scenario_id}")
+            return response.status_code, response.headers.get("Retry-After")
+
+        print(f"🚀 Sending {burst} runs at once...")
+        with ThreadPoolExecutor(max_workers=burst) as pool:
+            runs = [pool.submit(run) for _ in range(burst)]
+            time.sleep(0.5)
+            ready = requests.get(f"{BASE_URL}/ready")
+            print(f"   /ready while busy: {ready.status_code} {ready.json()['reasons']}")
+            results = [future.result() for future in runs]
+
+        completed = sum(1 for status, _ in results if status == 200)
+        refused = [retry_after for status, retry_after in results if status == 429]
+        print(f"   {completed} completed, {len(refused)} refused")
+        if refused and all(retry_after and int(retry_after) >= 1 for retry_after in refused):
+            print(f"✅ Excess runs refused with Retry-After ({refused[0]}s)")
+        else:
+            print("❌ Expected some runs refused with a Retry-After header")
+        print("✅ Saturated worker reported not ready" if ready.status_code == 503 else "❌ /ready did not report saturation")
+
+        ready = requests.get(f"{BASE_URL}/ready")
+        print("✅ Ready again once drained" if ready.status_code == 200 else f"❌ /ready returned {ready.status_code}")
+
+        metrics = requests.get(f"{BASE_URL}/scheduler/metrics").json()
+        for priority_class in metrics["classes"]:
+            print(f"   {priority_class['priority']}: {priority_class['rejected']} rejected, "
+                  f"average hold {priority_class['avg_hold_seconds']:.1f}s")
+
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_admission_control()
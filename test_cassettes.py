@@ -0,0 +1,83 @@
+import asyncio
+import os
+import tempfile
+
+from cassettes import Cassette, CassetteMiss
+
+def test_cassettes():
+    """Test recording an LLM call and replaying it without network access (no server or API key needed)"""
+
+    print("🧪 Testing LLM Cassettes")
+    print()
+
+    request = {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "You are a neutral mediator."},
+            {"role": "user", "content": "Sarah: I feel unheard."}
+        ],
+        "temperature": 0.7,
+        "max_tokens": 50
+    }
+    other_request = {**request, "temperature": 0.2}
+    provider_calls = []
+
+    async def provider(request):
+        provider_calls.append(request)
+        return f"Recorded reply #{len(provider_calls)}"
+
+    async def streaming_provider(request):
+        provider_calls.append(request)
+        for delta in ["Streamed ", "reply"]:
+            yield delta
+
+    async def no_network(request):
+        raise ConnectionError("Network access is disabled in replay")
+
+    async def collect(stream):
+        return "".join([delta async for delta in stream])
+
+    async def run():
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "test.jsonl.gz")
+
+            recorder = Cassette(path, mode="record")
+            first = await recorder.complete(request, provider)
+            second = await recorder.complete(request, provider)
+            streamed = await collect(recorder.stream(other_request, streaming_provider))
+            print(f"✅ Recorded {recorder.recorded} calls" if recorder.recorded == 3 else f"❌ Recorded {recorder.recorded} calls, expected 3")
+
+            # A fresh cassette reads the file, as a new process would
+            player = Cassette(path, mode="replay")
+            replayed = [await player.complete(request, no_network) for _ in range(3)]
+            if replayed == [first, second, first]:
+                print("✅ Identical requests replayed in recording order, cycling")
+            else:
+                print(f"❌ Unexpected replay: {replayed}")
+            replayed_stream = await collect(player.stream(other_request, no_network))
+            print("✅ Streamed response replayed" if replayed_stream == streamed else f"❌ Stream replayed as {replayed_stream!r}")
+            print("✅ Replay made no provider calls" if len(provider_calls) == 3 else "❌ Replay called the provider")
+
+            unrecorded = {**request, "max_tokens": 10}
+            try:
+                await player.complete(unrecorded, no_network)
+                print("❌ Unrecorded request did not raise CassetteMiss")
+            except CassetteMiss:
+                print("✅ Unrecorded request raises CassetteMiss (LLM_CASSETTE_MISS=error)")
+
+            passthrough = Cassette(path, mode="replay", miss="passthrough")
+            reply = await passthrough.complete(unrecorded, provider)
+            if reply == "Recorded reply #4" and passthrough.recorded == 0:
+                print("✅ Unrecorded request passed through to the provider without recording")
+            else:
+                print(f"❌ Passthrough returned {reply!r} and recorded {passthrough.recorded}")
+
+            print(f"   {player.stats()}")
+
+    try:
+        asyncio.run(run())
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_cassettes()
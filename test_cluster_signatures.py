@@ -0,0 +1,65 @@
+import random
+
+import numpy as np
+
+from similarity import cluster_signatures, lsh_banding, minhash_signature
+
+def test_cluster_signatures():
+    """Test near-duplicate clustering of response signatures across thresholds (no server needed)"""
+
+    print("🧪 Testing Response Clustering")
+    print()
+
+    # Groups of lightly edited copies of unrelated responses
+    rng = random.Random(5)
+    vocabulary = [f"word{index}" for index in range(400)]
+    texts, groups = [], []
+    for group in range(6):
+        base = [rng.choice(vocabulary) for _ in range(60)]
+        for _ in range(8):
+            words = list(base)
+            for _ in range(rng.randint(1, 6)):
+                words[rng.randrange(len(words))] = rng.choice(vocabulary)
+            texts.append(" ".join(words))
+            groups.append(group)
+    signatures = np.stack([minhash_signature(text) for text in texts])
+
+    try:
+        for threshold in (0.5, 0.6, 0.7, 0.8, 0.9):
+            bands, rows = lsh_banding(threshold)
+            clusters = cluster_signatures(signatures, threshold)
+            cluster_of = {member: index for index, cluster in enumerate(clusters) for member in cluster}
+
+            similar_pairs = missed_candidates = split_pairs = 0
+            for a in range(len(texts)):
+                for b in range(a + 1, len(texts)):
+                    if (signatures[a] == signatures[b]).mean() < threshold:
+                        continue
+                    similar_pairs += 1
+                    shares_band = any(
+                        (signatures[a, band * rows:(band + 1) * rows] == signatures[b, band * rows:(band + 1) * rows]).all()
+                        for band in range(bands)
+                    )
+                    missed_candidates += not shares_band
+                    split_pairs += cluster_of[a] != cluster_of[b]
+
+            print(f"   threshold {threshold}: {bands} bands of {rows} rows, {len(clusters)} clusters, "
+                  f"{similar_pairs} similar pairs, {split_pairs} in different clusters")
+            if missed_candidates == 0:
+                print(f"✅ Every pair at or above {threshold} shares a band")
+            else:
+                print(f"❌ {missed_candidates} pairs at or above {threshold} share no band")
+            if all(len({groups[member] for member in cluster}) == 1 for cluster in clusters):
+                print(f"✅ No cluster at {threshold} mixes unrelated responses")
+            else:
+                print(f"❌ A cluster at {threshold} mixes unrelated responses")
+
+        identical = np.stack([signatures[0]] * 3 + [signatures[8]])
+        clusters = sorted(map(sorted, cluster_signatures(identical, 1.0)))
+        print("✅ Identical responses cluster at threshold 1.0" if clusters == [[0, 1, 2], [3]] else f"❌ Unexpected clusters at 1.0: {clusters}")
+
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_cluster_signatures()
@@ -0,0 +1,51 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_database_backend():
+    """Test JSON storage and querying on the configured database backend"""
+    
+    print("🧪 Testing Database Backend")
+    print()
+    
+    scenario_data = {
+        "name": "Backend Test",
+        "participants": [
+            {
+                "name": "Priya",
+                "role": "Client seeking guidance",
+                "perspective": "Unsure whether to change careers",
+                "meta_tags": ["uncertain", "hopeful"],
+                "initial_message": "I'm thinking about leaving my job to go back to school."
+            }
+        ],
+        "system_prompt": "You are a supportive career coach. Keep replies brief.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    
+    try:
+        health = requests.get(f"{BASE_URL}/health").json()
+        print(f"✅ Server is using {health['database']}")
+        
+        scenario = requests.post(f"{BASE_URL}/scenarios", json=scenario_data).json()
+        stored = requests.get(f"{BASE_URL}/scenarios/{scenario['id']}").json()
+        print("✅ Scenario JSON round-trips" if stored["participants"] == scenario_data["participants"] else "❌ Stored participants differ")
+        
+        run = requests.post(f"{BASE_URL}/run?scenario_id={scenario['id']}").json()
+        matching = requests.get(f"{BASE_URL}/runs", params={"speaker": "Priya", "limit": 50}).json()
+        print("✅ Run found by speaker" if any(r["id"] == run["id"] for r in matching) else "❌ Run missing from the speaker filter")
+        
+        others = requests.get(f"{BASE_URL}/runs", params={"speaker": "Nobody By This Name"}).json()
+        print("✅ Speaker filter excludes other runs" if not others else f"❌ {len(others)} unexpected runs matched")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_database_backend()
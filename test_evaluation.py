@@ -0,0 +1,67 @@
+import time
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_evaluation():
+    """Test that saved runs are scored in the background"""
+    
+    print("🧪 Testing Run Evaluation")
+    print()
+    
+    scenario_data = {
+        "name": "Evaluation Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Employee",
+                "perspective": "Feels her workload is unfair",
+                "meta_tags": ["frustrated"],
+                "initial_message": "I keep getting assigned the projects nobody else wants."
+            },
+            {
+                "name": "Tom",
+                "role": "Team lead",
+                "perspective": "Believes assignments are based on skills",
+                "meta_tags": ["defensive"],
+                "initial_message": "I give Sarah those projects because she's the best at them."
+            }
+        ],
+        "system_prompt": "You are a neutral workplace mediator. Keep replies brief.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 200}
+    }
+    
+    try:
+        scenario = requests.post(f"{BASE_URL}/scenarios", json=scenario_data).json()
+        run = requests.post(f"{BASE_URL}/run?scenario_id={scenario['id']}").json()
+        
+        # Scoring happens after the run is saved; give the workers a moment
+        scores = []
+        for _ in range(20):
+            scores = requests.get(f"{BASE_URL}/runs/{run['id']}/scores").json()
+            if scores:
+                break
+            time.sleep(0.5)
+        
+        if not scores:
+            print("❌ Run was not scored")
+            return
+        print(f"✅ Run scored by {len(scores)} scorers")
+        for score in scores:
+            print(f"   {score['scorer']} v{score['version']}: {score['value']:.2f}")
+        
+        run_details = requests.get(f"{BASE_URL}/runs/{run['id']}").json()
+        print("✅ Scores included with the run" if run_details["scores"] else "❌ Run details have no scores")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_evaluation()
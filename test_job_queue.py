@@ -0,0 +1,71 @@
+import time
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_job_queue():
+    """Test that a queued batch runs to completion and creates one run per job"""
+    
+    print("🧪 Testing Durable Job Queue")
+    print()
+    
+    scenario_data = {
+        "name": "Job Queue Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 50}
+    }
+    
+    try:
+        scenario_response = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if scenario_response.status_code != 200:
+            print(f"❌ Failed to create scenario: {scenario_response.status_code}")
+            return
+        scenario_id = scenario_response.json()["id"]
+        
+        print("🚀 Queueing a batch of 5 runs...")
+        batch_response = requests.post(f"{BASE_URL}/jobs", json={"scenario_id": scenario_id, "count": 5})
+        if batch_response.status_code != 200:
+            print(f"❌ Failed to queue batch: {batch_response.status_code}")
+            return
+        batch_id = batch_response.json()["batch_id"]
+        print(f"✅ Batch {batch_id} queued")
+        
+        progress = None
+        for _ in range(120):
+            progress = requests.get(f"{BASE_URL}/jobs/batches/{batch_id}").json()
+            if progress["queued"] + progress["running"] == 0:
+                break
+            time.sleep(1)
+        print(f"   Completed: {progress['completed']}, failed: {progress['failed']}")
+        print("✅ Batch drained" if progress["completed"] == 5 else "❌ Batch did not complete")
+        
+        jobs = requests.get(f"{BASE_URL}/jobs/batches/{batch_id}/jobs").json()
+        missing = [job for job in jobs if requests.get(f"{BASE_URL}/runs/{job['run_id']}").status_code != 200]
+        print("✅ Every job saved its run" if not missing else f"❌ {len(missing)} jobs have no run")
+        
+        print("🛑 Queueing and cancelling a second batch...")
+        batch_id = requests.post(f"{BASE_URL}/jobs", json={"scenario_id": scenario_id, "count": 50}).json()["batch_id"]
+        cancel_response = requests.delete(f"{BASE_URL}/jobs/batches/{batch_id}").json()
+        print(f"✅ Cancelled {cancel_response['cancelled_count']} queued jobs")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_job_queue()
@@ -0,0 +1,56 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_model_fanout():
+    """Test running one scenario against several models in one call"""
+    
+    print("🧪 Testing Multi-Model Fan-Out")
+    print()
+    
+    scenario_data = {
+        "name": "Model Fan-Out Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    models = ["gpt-4o-mini", "gpt-4o"]
+    
+    try:
+        scenario = requests.post(f"{BASE_URL}/scenarios", json=scenario_data).json()
+        response = requests.post(
+            f"{BASE_URL}/run/models?scenario_id={scenario['id']}",
+            json={"models": [{"model": model} for model in models]}
+        )
+        if response.status_code != 200:
+            print(f"❌ Fan-out returned {response.status_code}")
+            return
+        
+        results = response.json()["results"]
+        print(f"✅ {len(results)} models ran" if len(results) == len(models) else f"❌ Expected {len(models)} results, got {len(results)}")
+        for result in results:
+            usage = result["usage"] or {}
+            print(f"   {result['model']}: {result['status']}, {result['latency_ms']}ms, {usage.get('total_tokens')} tokens")
+        
+        run = requests.get(f"{BASE_URL}/runs/{results[0]['run_id']}").json()
+        print("✅ Run tagged with its model" if run["model"] == models[0] else f"❌ Run model is {run['model']}")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_model_fanout()
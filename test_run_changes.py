@@ -0,0 +1,51 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_run_changes():
+    """Test the run change feed used by the history cache"""
+    
+    print("🧪 Testing Run Change Feed")
+    print()
+    
+    try:
+        # Catch up from the beginning
+        version = 0
+        runs = {}
+        while True:
+            changes = requests.get(f"{BASE_URL}/runs/changes?since={version}").json()
+            runs.update({run["id"]: run for run in changes["runs"]})
+            for run_id in changes["deleted"]:
+                runs.pop(run_id, None)
+            version = changes["version"]
+            if not changes["has_more"]:
+                break
+        
+        total = int(requests.get(f"{BASE_URL}/runs?limit=0").headers["X-Total-Count"])
+        print(f"   Version {version}: {len(runs)} runs")
+        print("✅ Feed covers every run" if len(runs) == total else f"❌ Feed has {len(runs)} runs, /runs has {total}")
+        if not runs:
+            print("❌ No runs found. Run a simulation first")
+            return
+        
+        response = requests.get(f"{BASE_URL}/runs/changes?since={version}")
+        print(f"   Nothing changed: {len(response.content)} bytes")
+        
+        run = next(iter(runs.values()))
+        requests.patch(f"{BASE_URL}/runs/{run['id']}/star", json={"starred": not run["starred"]})
+        changes = requests.get(f"{BASE_URL}/runs/changes?since={version}").json()
+        changed = [changed_run["id"] for changed_run in changes["runs"]]
+        print("✅ Starring shows up in the feed" if run["id"] in changed else "❌ Starred run missing from the feed")
+        requests.patch(f"{BASE_URL}/runs/{run['id']}/star", json={"starred": run["starred"]})
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_changes()
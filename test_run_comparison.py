@@ -0,0 +1,96 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_run_comparison():
+    """Test comparing several runs of the same scenario with POST /runs/compare"""
+    
+    print("🧪 Testing Run Comparison")
+    print("Testing: aligned messages, mediator diffs and length statistics")
+    print()
+    
+    scenario_data = {
+        "name": "Comparison Test",
+        "participants": [
+            {
+                "name": "Jordan",
+                "role": "Upset with Alex",
+                "perspective": "Feels unheard",
+                "meta_tags": ["angry"],
+                "initial_message": "I feel like you never listen to me anymore, Alex."
+            },
+            {
+                "name": "Alex",
+                "role": "Defensive partner",
+                "perspective": "Feels criticized",
+                "meta_tags": ["defensive"],
+                "initial_message": "I don't understand why you think I don't listen."
+            }
+        ],
+        "system_prompt": "You are Driftwood, a neutral AI conflict mediator. Keep your response brief.",
+        "settings": {"model": "gpt-4", "temperature": 1.0, "max_tokens": 150}
+    }
+    
+    try:
+        print("📝 Creating test scenario...")
+        scenario_response = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if scenario_response.status_code != 200:
+            print(f"❌ Failed to create scenario: {scenario_response.status_code}")
+            return
+        scenario_id = scenario_response.json()["id"]
+        
+        print("🚀 Running the scenario three times...")
+        run_ids = []
+        for _ in range(3):
+            run_response = requests.post(f"{BASE_URL}/run?scenario_id={scenario_id}")
+            if run_response.status_code != 200:
+                print(f"❌ Simulation failed: {run_response.status_code}")
+                return
+            run_ids.append(run_response.json()["id"])
+        
+        print("🔍 Comparing runs...")
+        compare_response = requests.post(f"{BASE_URL}/runs/compare", json={"run_ids": run_ids})
+        if compare_response.status_code != 200:
+            print(f"❌ Comparison failed: {compare_response.status_code}")
+            print(f"Error: {compare_response.text}")
+            return
+        
+        comparison = compare_response.json()
+        print(f"✅ Baseline run: {comparison['baseline_run_id']}")
+        print(f"✅ Aligned message slots: {len(comparison['aligned_messages'])}")
+        for slot in comparison["aligned_messages"]:
+            status = "identical" if slot["identical"] else "differs"
+            print(f"   {slot['speaker']} (turn {slot['turn']}): {status}")
+        for diff in comparison["mediator_diffs"]:
+            print(f"   Run {diff['run_id'][:8]}... similarity to baseline: {diff['similarity']:.2f}")
+        for stats in comparison["run_stats"]:
+            print(f"   Run {stats['run_id'][:8]}...: {stats['mediator_words']} words, ~{stats['mediator_tokens']} tokens")
+        
+        # The same set of ids in a different order is served from the cache
+        reversed_response = requests.post(f"{BASE_URL}/runs/compare", json={"run_ids": run_ids[::-1]})
+        if reversed_response.json() == comparison:
+            print("✅ Comparison is independent of run id order")
+        else:
+            print("❌ Comparison changed with run id order")
+        
+        # Unknown run ids are rejected
+        missing_response = requests.post(
+            f"{BASE_URL}/runs/compare",
+            json={"run_ids": [run_ids[0], "00000000-0000-0000-0000-000000000000"]}
+        )
+        if missing_response.status_code == 404:
+            print("✅ Unknown run ids return 404")
+        else:
+            print(f"❌ Expected 404 for unknown run ids, got {missing_response.status_code}")
+            
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_comparison()
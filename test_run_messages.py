@@ -0,0 +1,44 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_run_messages():
+    """Test opening a run through its header and paged messages"""
+    
+    print("🧪 Testing Paged Run Messages")
+    print()
+    
+    try:
+        runs = requests.get(f"{BASE_URL}/runs?limit=1").json()
+        if not runs:
+            print("❌ No runs found. Run a simulation first")
+            return
+        run_id = runs[0]["id"]
+        
+        header = requests.get(f"{BASE_URL}/runs/{run_id}/header").json()
+        full_run = requests.get(f"{BASE_URL}/runs/{run_id}").json()
+        print(f"   Run {run_id}: {header['message_count']} messages")
+        print("✅ Header has no log" if "log" not in header else "❌ Header includes the log")
+        print("✅ Message count matches the log" if header["message_count"] == len(full_run["log"]) else "❌ Message count differs from the log")
+        
+        messages = []
+        while len(messages) < header["message_count"]:
+            response = requests.get(f"{BASE_URL}/runs/{run_id}/messages?offset={len(messages)}&limit=2")
+            page = response.json()
+            if not page:
+                break
+            messages.extend(page)
+        print(f"   X-Total-Count: {response.headers.get('X-Total-Count')}")
+        print("✅ Pages add up to the full log" if messages == full_run["log"] else "❌ Pages differ from the full log")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_messages()
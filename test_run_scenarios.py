@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def test_run_scenarios():
+    """Test running a scenario file with the headless runner (no server needed)"""
+
+    print("🧪 Testing Headless Scenario Runner")
+    print()
+
+    scenarios = [
+        {
+            "name": f"Headless Test {mood}",
+            "participants": [
+                {
+                    "name": "Sarah",
+                    "role": "Client seeking guidance",
+                    "perspective": "Feeling overwhelmed with work stress",
+                    "meta_tags": [mood],
+                    "initial_message": f"I've been feeling really {mood} at work lately."
+                }
+            ],
+            "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+            "settings": {"model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 50}
+        }
+        for mood in ["stressed", "tired"]
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "scenarios.jsonl")
+        with open(path, "w", encoding="utf-8") as scenario_file:
+            scenario_file.write("\n".join(json.dumps(scenario) for scenario in scenarios) + "\n")
+
+        try:
+            result = subprocess.run(
+                [sys.executable, "run_scenarios.py", path, "--runs", "2", "--concurrency", "4"],
+                capture_output=True, text=True, timeout=300
+            )
+            print(result.stdout)
+            print("✅ Runner exited cleanly" if result.returncode == 0 else f"❌ Runner exited with {result.returncode}: {result.stderr[-500:]}")
+            print("✅ All 4 runs completed" if "Runs: 4 completed" in result.stdout else "❌ Not every run completed")
+
+            with open(path, "a", encoding="utf-8") as scenario_file:
+                scenario_file.write('{"name": "Broken"}\n')
+            result = subprocess.run(
+                [sys.executable, "run_scenarios.py", path], capture_output=True, text=True, timeout=60
+            )
+            print("✅ Invalid scenario file rejected" if result.returncode != 0 and "invalid" in result.stderr else "❌ Invalid scenario file was accepted")
+
+        except Exception as e:
+            print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_scenarios()
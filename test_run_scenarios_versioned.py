@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import tempfile
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Runs in a child process against a throwaway database, with a stand-in model
+# client that answers instantly and reports the system prompt it was sent
+CHILD_SCRIPT = '''
+import asyncio, sys, types
+
+import simulation
+from database import init_db, SessionLocal, Scenario
+from versioning import create_version
+import run_scenarios
+
+class Completions:
+    async def create(self, **request):
+        print("SYSTEM PROMPT:", request["messages"][0]["content"].splitlines()[0])
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content="Let's talk it through."))],
+            usage=types.SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        )
+
+simulation.simulation_engine.client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=Completions()))
+
+init_db()
+db = SessionLocal()
+original = Scenario(
+    name="Versioned Headless Test",
+    participants=[{"name": "Sarah", "role": "Client", "perspective": "Stressed", "meta_tags": [], "initial_message": "Hi."}],
+    system_prompt="You are a supportive therapist.",
+    settings={"model": "gpt-4o-mini", "max_tokens": 50}
+)
+db.add(original)
+db.commit()
+original.lineage_id = original.id
+db.commit()
+version = create_version(db, original, original.name, {
+    "participants": original.participants,
+    "system_prompt": "You are a patient, supportive therapist.",
+    "settings": original.settings
+})
+print("COPY-ON-WRITE:", version.changes is not None)
+version_id = str(version.id)
+db.close()
+sys.exit(run_scenarios.main(["--scenario-id", version_id, "--runs", "2"]))
+'''
+
+def test_run_scenarios_versioned():
+    """Test that the headless runner runs a copy-on-write scenario version (no server or API key needed)"""
+
+    print("🧪 Testing Headless Runner with a Scenario Version")
+    print()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(directory, 'runner.db')}"
+        env.setdefault("OPENAI_API_KEY", "not-used")
+        env["EVAL_WORKERS"] = "0"
+
+        try:
+            result = subprocess.run(
+                [sys.executable, "-c", CHILD_SCRIPT], capture_output=True, text=True, timeout=120, env=env
+            )
+            print(result.stdout)
+            print("✅ Version stored as changes" if "COPY-ON-WRITE: True" in result.stdout else "❌ Version was not stored as changes")
+            print("✅ Runner exited cleanly" if result.returncode == 0 else f"❌ Runner exited with {result.returncode}: {result.stderr[-500:]}")
+            print("✅ Both runs completed" if "Runs: 2 completed" in result.stdout else "❌ Not every run completed")
+            if "SYSTEM PROMPT: You are a patient, supportive therapist." in result.stdout:
+                print("✅ Runs used the version's own system prompt")
+            else:
+                print("❌ Runs did not use the version's system prompt")
+
+        except Exception as e:
+            print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_scenarios_versioned()
@@ -0,0 +1,55 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_run_trace():
+    """Test that a run records a stage timing trace"""
+    
+    print("🧪 Testing Run Tracing")
+    print()
+    
+    scenario_data = {
+        "name": "Trace Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    
+    try:
+        scenario = requests.post(f"{BASE_URL}/scenarios", json=scenario_data).json()
+        run = requests.post(f"{BASE_URL}/run?scenario_id={scenario['id']}").json()
+        
+        trace_response = requests.get(f"{BASE_URL}/runs/{run['id']}/trace")
+        if trace_response.status_code != 200:
+            print(f"❌ Trace request returned {trace_response.status_code}")
+            return
+        trace = trace_response.json()
+        print(f"✅ Trace recorded: {trace['duration_ms']:.0f}ms across {len(trace['spans'])} stages")
+        
+        stages = {span["name"] for span in trace["spans"]}
+        for stage in ["scenario.load", "scheduler.wait", "llm.call", "db.commit"]:
+            print(f"✅ {stage} timed" if stage in stages else f"❌ {stage} missing from the trace")
+        
+        for span in trace["spans"]:
+            if span["name"] in ("scheduler.wait", "llm.call", "http.wait_response", "db.commit"):
+                print(f"   {span['name']}: {span['duration_ms']:.1f}ms")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_run_trace()
@@ -0,0 +1,75 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_scenario_stats():
+    """Test that GET /scenarios/{id}/stats follows inserts, stars and deletes"""
+    
+    print("🧪 Testing Scenario Statistics")
+    print()
+    
+    scenario_data = {
+        "name": "Statistics Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    
+    try:
+        scenario_response = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if scenario_response.status_code != 200:
+            print(f"❌ Failed to create scenario: {scenario_response.status_code}")
+            return
+        scenario_id = scenario_response.json()["id"]
+        stats_url = f"{BASE_URL}/scenarios/{scenario_id}/stats"
+        
+        stats = requests.get(stats_url).json()
+        print(f"✅ New scenario has {stats['run_count']} runs")
+        
+        print("🚀 Running the scenario twice...")
+        run_ids = []
+        for _ in range(2):
+            run_response = requests.post(f"{BASE_URL}/run?scenario_id={scenario_id}")
+            if run_response.status_code != 200:
+                print(f"❌ Simulation failed: {run_response.status_code}")
+                return
+            run_ids.append(run_response.json()["id"])
+        
+        stats = requests.get(stats_url).json()
+        print(f"   Runs: {stats['run_count']}, errors: {stats['error_count']} ({stats['error_rate']:.0%})")
+        print(f"   Average reply length: {stats['avg_reply_length']}")
+        print(f"   Average latency: {stats['avg_latency_ms']} ms")
+        print(f"   Latency histogram: {[bucket['count'] for bucket in stats['latency_histogram']]}")
+        print("✅ Run count updated" if stats["run_count"] == 2 else "❌ Run count not updated")
+        
+        requests.patch(f"{BASE_URL}/runs/{run_ids[0]}/star", json={"starred": True})
+        stats = requests.get(stats_url).json()
+        print("✅ Starred count updated" if stats["starred_count"] == 1 else "❌ Starred count not updated")
+        
+        requests.delete(f"{BASE_URL}/runs/{run_ids[1]}")
+        stats = requests.get(stats_url).json()
+        length_total = sum(bucket["count"] for bucket in stats["reply_length_histogram"])
+        if stats["run_count"] == 1 and length_total == stats["reply_count"]:
+            print("✅ Counts and histograms updated after delete")
+        else:
+            print("❌ Statistics out of date after delete")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_scenario_stats()
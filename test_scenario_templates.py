@@ -0,0 +1,77 @@
+import time
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_scenario_templates():
+    """Test expanding a scenario template into queued runs"""
+
+    print("🧪 Testing Scenario Templates")
+    print()
+
+    template_data = {
+        "name": "Template Test",
+        "scenario": {
+            "name": "Template Test / {mood} / {role}",
+            "participants": [
+                {
+                    "name": "Sarah",
+                    "role": "{role}",
+                    "perspective": "Feeling overlooked at home",
+                    "meta_tags": "{tags}",
+                    "initial_message": "I'm {mood} that nobody helps with the chores."
+                }
+            ],
+            "system_prompt": "You are a neutral mediator. Keep replies brief.",
+            "settings": {"model": "gpt-4o-mini", "temperature": 0.7, "max_tokens": 60}
+        },
+        "variables": {
+            "mood": ["frustrated", "calm"],
+            "role": ["parent", "roommate"],
+            "tags": [["defensive"], ["tired", "anxious"]]
+        }
+    }
+
+    try:
+        response = requests.post(f"{BASE_URL}/templates", json=template_data)
+        if response.status_code != 200:
+            print(f"❌ Creating the template returned {response.status_code}: {response.text}")
+            return
+        template = response.json()
+        print("✅ 8 variants" if template["variant_count"] == 8 else f"❌ Expected 8 variants, got {template['variant_count']}")
+
+        variants = requests.get(f"{BASE_URL}/templates/{template['id']}/variants?limit=2").json()
+        print(f"   First variant: {variants[0]['scenario']['name']} {variants[0]['scenario']['participants'][0]['meta_tags']}")
+
+        bad_template = dict(template_data, variables={"mood": ["calm"]})
+        status = requests.post(f"{BASE_URL}/templates", json=bad_template).status_code
+        print("✅ Undeclared variables rejected" if status == 422 else f"❌ Expected 422, got {status}")
+
+        expansion = requests.post(
+            f"{BASE_URL}/templates/{template['id']}/expansions",
+            json={"mode": "sample", "count": 3, "seed": 1, "chunk_size": 2}
+        ).json()
+        print(f"   Expansion {expansion['id']}: {expansion['total']} variants")
+
+        for _ in range(120):
+            expansion = requests.get(f"{BASE_URL}/templates/expansions/{expansion['id']}").json()
+            jobs = expansion["jobs"] or {}
+            if expansion["status"] == "completed" and jobs.get("completed", 0) + jobs.get("failed", 0) == 3:
+                break
+            time.sleep(1)
+
+        print(f"   Produced {expansion['produced']}, jobs: {expansion['jobs']}")
+        print("✅ All variants ran" if (expansion["jobs"] or {}).get("completed") == 3 else "❌ Not all variants ran")
+
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_scenario_templates()
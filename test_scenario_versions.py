@@ -0,0 +1,64 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_scenario_versions():
+    """Test that edits saved with parent_id become versions that store only their changes"""
+    
+    print("🧪 Testing Scenario Versioning")
+    print()
+    
+    scenario_data = {
+        "name": "Versioning Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    
+    try:
+        first = requests.post(f"{BASE_URL}/scenarios", json=scenario_data).json()
+        print(f"✅ Created version {first['version']}")
+        
+        edited = dict(scenario_data, parent_id=first["id"])
+        edited["system_prompt"] = "You are a supportive therapist. Provide brief, practical guidance."
+        edited["settings"] = dict(scenario_data["settings"], temperature=0.3)
+        second = requests.post(f"{BASE_URL}/scenarios", json=edited).json()
+        print("✅ Edit saved as version 2" if second["version"] == 2 else f"❌ Edit saved as version {second['version']}")
+        
+        fetched = requests.get(f"{BASE_URL}/scenarios/{second['id']}").json()
+        if fetched["system_prompt"] == edited["system_prompt"] and fetched["participants"] == scenario_data["participants"]:
+            print("✅ Version resolves to the edited content")
+        else:
+            print("❌ Version content does not match the edit")
+        
+        unchanged = requests.post(f"{BASE_URL}/scenarios", json=dict(edited, parent_id=second["id"])).json()
+        print("✅ Unchanged save reuses the version" if unchanged["id"] == second["id"] else "❌ Unchanged save created a version")
+        
+        versions = requests.get(f"{BASE_URL}/scenarios/{first['id']}/versions").json()
+        for version in versions:
+            print(f"   v{version['version']}: {version['storage']}, changed {version['changed_fields']}")
+        
+        comparison = requests.get(
+            f"{BASE_URL}/scenarios/{first['id']}/versions/compare", params={"other": second["id"]}
+        ).json()
+        print(f"✅ Changed fields: {[change['path'] for change in comparison['changes']]}")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_scenario_versions()
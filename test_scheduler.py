@@ -0,0 +1,80 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_scheduler_priorities():
+    """Test that interactive runs are admitted ahead of a queued bulk workload"""
+    
+    print("🧪 Testing Priority Scheduling")
+    print()
+    
+    scenario_data = {
+        "name": "Scheduler Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress",
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 50}
+    }
+    
+    try:
+        scenario_response = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if scenario_response.status_code != 200:
+            print(f"❌ Failed to create scenario: {scenario_response.status_code}")
+            return
+        scenario_id = scenario_response.json()["id"]
+        
+        def timed_run(priority):
+            started = time.perf_counter()
+            response = requests.post(f"{BASE_URL}/run?scenario_id={scenario_id}&priority={priority}")
+            return response.status_code, time.perf_counter() - started
+        
+        print("🚀 Queueing 12 bulk runs, then one interactive run...")
+        with ThreadPoolExecutor(max_workers=13) as pool:
+            bulk = [pool.submit(timed_run, "bulk") for _ in range(12)]
+            time.sleep(0.5)
+            interactive = pool.submit(timed_run, "interactive")
+            
+            metrics = requests.get(f"{BASE_URL}/scheduler/metrics").json()
+            for priority_class in metrics["classes"]:
+                print(f"   {priority_class['priority']}: {priority_class['running']} running, {priority_class['queue_depth']} queued")
+            
+            interactive_status, interactive_seconds = interactive.result()
+            bulk_results = [future.result() for future in bulk]
+        
+        slowest_bulk = max(seconds for _, seconds in bulk_results)
+        print(f"   Interactive run: {interactive_status} in {interactive_seconds:.1f}s")
+        print(f"   Slowest bulk run: {slowest_bulk:.1f}s")
+        if interactive_seconds < slowest_bulk:
+            print("✅ Interactive run finished before the bulk backlog drained")
+        else:
+            print("❌ Interactive run waited behind the bulk backlog")
+        
+        metrics = requests.get(f"{BASE_URL}/scheduler/metrics").json()
+        for priority_class in metrics["classes"]:
+            print(f"   {priority_class['priority']}: max queue depth {priority_class['max_queue_depth']}, "
+                  f"average wait {priority_class['avg_wait_ms'] or 0:.0f} ms")
+        
+        invalid = requests.post(f"{BASE_URL}/run?scenario_id={scenario_id}&priority=urgent")
+        print("✅ Unknown priority rejected" if invalid.status_code == 422 else f"❌ Unknown priority returned {invalid.status_code}")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_scheduler_priorities()
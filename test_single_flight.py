@@ -0,0 +1,139 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+@contextmanager
+def placeholder_api_key():
+    """Let the OpenAI client be created without a key; the stand-in client below makes the calls"""
+    if os.getenv("OPENAI_API_KEY"):
+        yield
+        return
+    os.environ["OPENAI_API_KEY"] = "not-used"
+    try:
+        yield
+    finally:
+        # Not left behind for other tests, which would take it for a real key
+        del os.environ["OPENAI_API_KEY"]
+
+with placeholder_api_key():
+    from simulation import SimulationEngine
+    from scheduler import simulation_scheduler
+    from token_budget import track_usage
+    from tracing import start_trace
+
+class StubCompletions:
+    """Answers chat completions once released, counting upstream calls"""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.release = asyncio.Event()
+
+    async def create(self, **request):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Let's hear from each of you."))],
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        )
+
+def test_single_flight():
+    """Test that identical temperature-0 simulations share one upstream call (no server or API key needed)"""
+
+    print("🧪 Testing Single-Flight Coalescing")
+    print()
+
+    participants = [
+        {"name": "Sarah", "role": "Client", "perspective": "Stressed", "meta_tags": [], "initial_message": "I feel unheard."}
+    ]
+    system_prompt = "You are a neutral mediator."
+    settings = {"model": "gpt-4o-mini", "temperature": 0, "max_tokens": 50}
+
+    def engine_with_stub():
+        with placeholder_api_key():
+            engine = SimulationEngine()
+        completions = StubCompletions()
+        engine.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        return engine, completions
+
+    async def traced_run(engine):
+        with start_trace("test") as trace, track_usage() as usage:
+            await engine.run_simulation(participants, system_prompt, settings)
+        return usage, [record["name"] for record in trace.spans]
+
+    async def start(engine, count, run=None):
+        callers = [
+            asyncio.create_task(run(engine) if run else engine.run_simulation(participants, system_prompt, settings))
+            for _ in range(count)
+        ]
+        await asyncio.sleep(0.05)  # Every caller is now waiting on the upstream call
+        return callers
+
+    async def run():
+        engine, completions = engine_with_stub()
+        callers = await start(engine, 6)
+        completions.release.set()
+        logs = await asyncio.gather(*callers)
+        if completions.calls == 1:
+            print("✅ 6 concurrent identical simulations made 1 upstream call")
+        else:
+            print(f"❌ 6 concurrent identical simulations made {completions.calls} upstream calls")
+        if all(log == logs[0] for log in logs) and logs[0] is not logs[1]:
+            print("✅ Every caller got its own copy of the same conversation")
+        else:
+            print("❌ Callers did not get separate copies of one conversation")
+
+        engine, completions = engine_with_stub()
+        callers = await start(engine, 4, traced_run)
+        running = simulation_scheduler.metrics()["running"]
+        print("✅ 4 coalesced callers hold 1 scheduler slot" if running == 1 else f"❌ 4 coalesced callers hold {running} scheduler slots")
+        assert running == 1
+        completions.release.set()
+        results = await asyncio.gather(*callers)
+        for usage, span_names in results:
+            assert usage["requests"] == 1 and usage["total_tokens"] == 15, usage
+            assert "llm.call" in span_names, span_names
+        print("✅ Every coalesced caller's usage and trace include the shared call")
+
+        engine, completions = engine_with_stub()
+        callers = await start(engine, 3)
+        callers[0].cancel()
+        await asyncio.sleep(0)
+        completions.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        others_completed = all(isinstance(result, list) for result in results[1:])
+        if isinstance(results[0], asyncio.CancelledError) and others_completed and completions.cancelled == 0:
+            print("✅ Cancelling one caller left the shared call and the other callers running")
+        else:
+            print(f"❌ Cancelling one caller affected the others: {results}")
+
+        engine, completions = engine_with_stub()
+        callers = await start(engine, 2)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        if completions.cancelled == 1:
+            print("✅ Cancelling every caller cancelled the upstream call")
+        else:
+            print("❌ Upstream call kept running after every caller went away")
+
+    try:
+        asyncio.run(run())
+    except AssertionError:
+        raise
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_single_flight()
@@ -0,0 +1,41 @@
+import re
+
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_static_assets():
+    """Test compression and cache headers of the frontend assets (run build_static.py first)"""
+    
+    print("🧪 Testing Static Assets")
+    print()
+    
+    try:
+        index = requests.get(f"{BASE_URL}/", headers={"Accept-Encoding": "gzip"})
+        print(f"   index.html: Cache-Control {index.headers.get('Cache-Control')}, Content-Encoding {index.headers.get('Content-Encoding')}")
+        print("✅ index.html is revalidated" if index.headers.get("Cache-Control") == "no-cache" else "❌ index.html may be cached without revalidation")
+        
+        script = re.search(r'src="(/static/dist/app\.[0-9a-f]+\.js)"', index.text)
+        if script is None:
+            print("❌ index.html does not reference built assets. Run python build_static.py")
+            return
+        
+        response = requests.get(f"{BASE_URL}{script.group(1)}", headers={"Accept-Encoding": "br, gzip"})
+        print(f"   {script.group(1)}: Cache-Control {response.headers.get('Cache-Control')}, Content-Encoding {response.headers.get('Content-Encoding')}")
+        print("✅ Fingerprinted script is immutable" if "immutable" in response.headers.get("Cache-Control", "") else "❌ Fingerprinted script is not immutable")
+        print("✅ Precompressed variant served" if response.headers.get("Content-Encoding") in ("br", "gzip") else "❌ Script sent uncompressed")
+        
+        revalidated = requests.get(f"{BASE_URL}{script.group(1)}", headers={"Accept-Encoding": "br, gzip", "If-None-Match": response.headers.get("ETag", "")})
+        print(f"   Conditional request: {revalidated.status_code}")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_static_assets()
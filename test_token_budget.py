@@ -0,0 +1,53 @@
+import requests
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+BASE_URL = "http://localhost:8000"
+
+def test_token_budget():
+    """Test that oversized scenarios are rejected at save time unless a budget strategy applies"""
+    
+    print("🧪 Testing Prompt Budget Enforcement")
+    print()
+    
+    scenario_data = {
+        "name": "Budget Test",
+        "participants": [
+            {
+                "name": "Sarah",
+                "role": "Client seeking guidance",
+                "perspective": "Feeling overwhelmed with work stress. " * 2000,
+                "meta_tags": ["stressed"],
+                "initial_message": "I've been feeling really stressed at work lately."
+            }
+        ],
+        "system_prompt": "You are a supportive therapist. Provide brief, helpful guidance.",
+        "settings": {"model": "gpt-4", "temperature": 0.7, "max_tokens": 100}
+    }
+    
+    try:
+        estimate = requests.post(f"{BASE_URL}/scenarios/estimate", json=scenario_data).json()
+        print(f"   ~{estimate['prompt_tokens']} prompt tokens, {estimate['context_window']}-token window")
+        
+        rejected = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        print("✅ Oversized scenario rejected" if rejected.status_code == 422 else f"❌ Oversized scenario returned {rejected.status_code}")
+        
+        scenario_data["settings"]["budget_strategy"] = "truncate"
+        accepted = requests.post(f"{BASE_URL}/scenarios", json=scenario_data)
+        if accepted.status_code != 200:
+            print(f"❌ Truncating scenario returned {accepted.status_code}")
+            return
+        print("✅ Scenario with the truncate strategy accepted")
+        
+        run_response = requests.post(f"{BASE_URL}/run?scenario_id={accepted.json()['id']}")
+        print("✅ Truncated simulation ran" if run_response.status_code == 200 else f"❌ Simulation returned {run_response.status_code}")
+        
+    except requests.exceptions.ConnectionError:
+        print("❌ Could not connect to server. Make sure it's running on localhost:8000")
+    except Exception as e:
+        print(f"❌ Test failed: {e}")
+
+if __name__ == "__main__":
+    test_token_budget()
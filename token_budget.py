@@ -0,0 +1,229 @@
+import math
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: falls back to a character-based estimate
+    tiktoken = None
+
+# Pre-flight token budgeting.
+#
+# Before a chat request is sent, its messages are counted locally and checked
+# against the model's context window (prompt + max_tokens for the reply).
+# Scenarios choose what happens when a request does not fit:
+#   error     refuse the request (the default)
+#   truncate  shorten the longest messages until it fits
+#   compact   collapse whitespace, then drop the oldest earlier turns of a
+#             multi-step conversation, then truncate what is left
+# Counts use tiktoken when it is installed and ~4 characters per token otherwise.
+#
+# track_usage() totals the tokens actually spent by the requests made inside
+# it, as reported by the provider, or counted locally when the provider does
+# not say (replayed cassettes).
+
+CONTEXT_WINDOWS = {
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+    "gpt-4-turbo": 128000,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Chat formatting overhead (per message, and to prime the reply), per OpenAI's guidance
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+TRUNCATION_MARKER = " [...]"
+
+_encodings: Dict[str, Any] = {}
+_current_usage: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_usage", default=None)
+
+class PromptBudgetExceeded(Exception):
+    """A request's prompt plus its reply budget does not fit the model's context window"""
+
+    def __init__(self, prompt_tokens: int, max_tokens: int, context_window: int, model: str):
+        super().__init__(
+            f"Prompt of ~{prompt_tokens} tokens plus max_tokens={max_tokens} exceeds "
+            f"the {context_window}-token context window of {model}"
+        )
+        self.prompt_tokens = prompt_tokens
+        self.max_tokens = max_tokens
+        self.context_window = context_window
+        self.model = model
+
+def context_window(model: str) -> int:
+    """Context window of a model; dated snapshots (e.g. gpt-4o-2024-08-06) match their family"""
+    if model in CONTEXT_WINDOWS:
+        return CONTEXT_WINDOWS[model]
+    family = max((name for name in CONTEXT_WINDOWS if model.startswith(name)), key=len, default=None)
+    return CONTEXT_WINDOWS[family] if family else DEFAULT_CONTEXT_WINDOW
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[model]
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    """Tokens in a piece of text"""
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding(model).encode(text))
+    return math.ceil(len(text) / 4)
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str = "gpt-4") -> int:
+    """Prompt tokens of a chat request, including formatting overhead"""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message["content"], model) for message in messages) + TOKENS_PER_REPLY
+
+def _truncate_text(text: str, tokens: int, model: str) -> str:
+    """Cut text down to about `tokens` tokens by removing its middle
+
+    The start and end are kept, so the framing and closing instructions of
+    a message survive.
+    """
+    head = max(1, tokens * 2 // 3)
+    tail = max(0, tokens - head)
+    if tiktoken is not None:
+        encoded = _encoding(model).encode(text)
+        if len(encoded) <= tokens:
+            return text
+        encoding = _encoding(model)
+        return encoding.decode(encoded[:head]) + TRUNCATION_MARKER + (encoding.decode(encoded[-tail:]) if tail else "")
+    if len(text) <= tokens * 4:
+        return text
+    return text[:head * 4] + TRUNCATION_MARKER + (text[-tail * 4:] if tail else "")
+
+def _truncate(messages: List[Dict[str, str]], budget: int, model: str) -> List[Dict[str, str]]:
+    """Cap every message at the same token count, chosen so the prompt fits `budget`
+
+    Short messages are kept whole and the remaining budget is shared equally
+    between the long ones (water-filling).
+    """
+    sizes = [count_tokens(message["content"], model) for message in messages]
+    marker = count_tokens(TRUNCATION_MARKER, model)
+    available = budget - len(messages) * TOKENS_PER_MESSAGE - TOKENS_PER_REPLY
+
+    def total(cap: int) -> int:
+        return sum(size if size <= cap else cap + marker for size in sizes)
+
+    low, high = 0, max(sizes, default=0)
+    while low < high:
+        cap = (low + high + 1) // 2
+        if total(cap) <= available:
+            low = cap
+        else:
+            high = cap - 1
+
+    # Counting the cut text can differ slightly from the estimate; tighten until it fits
+    cap = low
+    while True:
+        fitted = [
+            dict(message, content=_truncate_text(message["content"], cap, model)) if size > cap else dict(message)
+            for message, size in zip(messages, sizes)
+        ]
+        if count_message_tokens(fitted, model) <= budget or cap == 0:
+            return fitted
+        cap = max(0, cap - max(1, cap // 50))
+
+def _compact(messages: List[Dict[str, str]], budget: int, model: str) -> List[Dict[str, str]]:
+    messages = [
+        {"role": message["role"], "content": re.sub(r"\n{3,}", "\n\n", re.sub(r"[ \t]+", " ", message["content"])).strip()}
+        for message in messages
+    ]
+    # Keep the system message, the opening turn and the latest turn; drop the oldest turns in between
+    while count_message_tokens(messages, model) > budget and len(messages) > 3:
+        del messages[2]
+    return _truncate(messages, budget, model)
+
+def fit_messages(messages: List[Dict[str, str]], settings: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Apply the scenario's budget strategy to a chat request before it is sent
+
+    Raises:
+        PromptBudgetExceeded: the request does not fit and cannot be made to fit
+    """
+    model = settings.get("model", "gpt-4")
+    max_tokens = settings.get("max_tokens", 400)
+    window = context_window(model)
+    budget = window - max_tokens
+
+    prompt_tokens = count_message_tokens(messages, model)
+    if prompt_tokens <= budget:
+        return messages
+
+    strategy = settings.get("budget_strategy", "error")
+    if strategy == "truncate":
+        messages = _truncate(messages, budget, model)
+    elif strategy == "compact":
+        messages = _compact(messages, budget, model)
+
+    fitted_tokens = count_message_tokens(messages, model)
+    if fitted_tokens > budget:
+        raise PromptBudgetExceeded(prompt_tokens, max_tokens, window, model)
+    return messages
+
+def estimate_budget(requests: List[List[Dict[str, str]]], settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Token estimate for the chat requests a simulation will make"""
+    model = settings.get("model", "gpt-4")
+    max_tokens = settings.get("max_tokens", 400)
+    window = context_window(model)
+    prompt_tokens = max((count_message_tokens(messages, model) for messages in requests), default=0)
+
+    fits_after_strategy: Optional[bool] = None
+    strategy = settings.get("budget_strategy", "error")
+    if prompt_tokens + max_tokens > window and strategy != "error":
+        try:
+            for messages in requests:
+                fit_messages(messages, settings)
+            fits_after_strategy = True
+        except PromptBudgetExceeded:
+            fits_after_strategy = False
+
+    return {
+        "model": model,
+        "context_window": window,
+        "max_tokens": max_tokens,
+        "prompt_tokens": prompt_tokens,
+        "requests": len(requests),
+        "fits": prompt_tokens + max_tokens <= window,
+        "budget_strategy": strategy,
+        "fits_after_strategy": fits_after_strategy,
+        "exact": tiktoken is not None,
+    }
+
+@contextmanager
+def track_usage():
+    """Total the token usage of every chat request made inside the block, including concurrent ones"""
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "requests": 0, "estimated": False}
+    token = _current_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _current_usage.reset(token)
+
+def record_usage(prompt_tokens: int, completion_tokens: int, estimated: bool = False):
+    """Add one request's usage to the enclosing track_usage() block, if any"""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    usage["prompt_tokens"] += prompt_tokens
+    usage["completion_tokens"] += completion_tokens
+    usage["total_tokens"] += prompt_tokens + completion_tokens
+    usage["requests"] += 1
+    usage["estimated"] = usage["estimated"] or estimated
+
+def add_usage(spent: Dict[str, Any]):
+    """Add the usage totalled by another track_usage() block (e.g. a shared call) to the enclosing one, if any"""
+    usage = _current_usage.get()
+    if usage is None:
+        return
+    for name in ("prompt_tokens", "completion_tokens", "total_tokens", "requests"):
+        usage[name] += spent[name]
+    usage["estimated"] = usage["estimated"] or spent["estimated"]
@@ -0,0 +1,166 @@
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Lightweight per-run tracing.
+#
+# A trace is started around one unit of work (a POST /run request, a queued
+# job) and spans record how long each stage inside it took. The current trace
+# and span live in context variables, so asyncio tasks created inside a span
+# (concurrent LLM calls, for instance) attach their spans to it. Outside a
+# trace every tracing call is a no-op.
+#
+# LLM requests are broken down further (connect, TLS, time to first byte, body)
+# through httpcore's trace extension; see trace_http_request.
+#
+# Traces are stored per run in run_traces (see persistence.store_trace); only
+# the newest TRACE_RETENTION are kept.
+
+TRACE_RETENTION = int(os.getenv("TRACE_RETENTION", "1000"))
+
+_current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("current_span", default=None)
+
+class Trace:
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._ids = itertools.count(1)
+        self.spans: List[Dict[str, Any]] = []
+        self.duration_ms: Optional[float] = None
+
+    def _now_ms(self) -> float:
+        return round((time.perf_counter() - self._started) * 1000, 3)
+
+    def begin(self, name: str, parent_id: Optional[int], attributes: Dict[str, Any]) -> Dict[str, Any]:
+        record = {
+            "id": next(self._ids),
+            "parent_id": parent_id,
+            "name": name,
+            "start_ms": self._now_ms(),
+            "duration_ms": None,
+            "attributes": attributes,
+        }
+        self.spans.append(record)
+        return record
+
+    def end(self, record: Dict[str, Any]):
+        record["duration_ms"] = round(self._now_ms() - record["start_ms"], 3)
+
+    def finish(self):
+        self.duration_ms = self._now_ms()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "attributes": self.attributes,
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": self.duration_ms,
+            "spans": self.spans,
+        }
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Trace the body of the block; spans opened inside it are recorded"""
+    trace = Trace(name, attributes)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        trace.finish()
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the body of the block as a child of the current span"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield None
+        return
+
+    record = trace.begin(name, _current_span.get(), attributes)
+    token = _current_span.set(record["id"])
+    try:
+        yield record
+    except BaseException as e:
+        record["attributes"]["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        trace.end(record)
+
+def begin_span(name: str, **attributes) -> Optional[Dict[str, Any]]:
+    """Open a span without making it current (for callbacks and async generators)"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    return trace.begin(name, _current_span.get(), attributes)
+
+def end_span(record: Optional[Dict[str, Any]], **attributes):
+    trace = _current_trace.get()
+    if trace is None or record is None:
+        return
+    record["attributes"].update(attributes)
+    trace.end(record)
+
+def attach_trace(recorded: Optional[Trace]):
+    """Copy the spans of a trace recorded elsewhere (e.g. in a worker thread) under the current span
+
+    The spans keep their actual start times, so they line up with the rest of
+    the current trace.
+    """
+    trace = _current_trace.get()
+    if trace is None or recorded is None:
+        return
+    offset_ms = (recorded._started - trace._started) * 1000
+    parent_id = _current_span.get()
+    ids: Dict[int, int] = {}
+    for record in recorded.spans:
+        ids[record["id"]] = next(trace._ids)
+        trace.spans.append({
+            **record,
+            "id": ids[record["id"]],
+            "parent_id": ids.get(record["parent_id"], parent_id),
+            "start_ms": round(record["start_ms"] + offset_ms, 3),
+            "attributes": dict(record["attributes"]),
+        })
+
+def event(name: str, **attributes):
+    """Record an instant (a zero-length span), e.g. the first streamed token"""
+    end_span(begin_span(name, **attributes))
+
+# httpcore stages reported through the "trace" request extension, and the spans they become
+HTTP_STAGES = {
+    "connect_tcp": "http.connect",
+    "start_tls": "http.tls",
+    "send_request_headers": "http.send",
+    "send_request_body": "http.send",
+    "receive_response_headers": "http.wait_response",  # Time to first byte
+    "receive_response_body": "http.receive_body",
+}
+
+async def trace_http_request(request):
+    """httpx request hook: record connection setup and transfer stages of the request as spans"""
+    if _current_trace.get() is None:
+        return
+    open_spans: Dict[str, Dict[str, Any]] = {}
+
+    async def on_stage(event_name: str, info: Dict[str, Any]):
+        stage, _, phase = event_name.rpartition(".")
+        name = HTTP_STAGES.get(stage.rpartition(".")[2])
+        if name is None:
+            return
+        if phase == "started":
+            open_spans[stage] = begin_span(name)
+        elif stage in open_spans:
+            end_span(open_spans.pop(stage), **({"error": type(info["exception"]).__name__} if phase == "failed" else {}))
+
+    request.extensions["trace"] = on_stage
@@ -0,0 +1,251 @@
+import re
+import uuid
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Scenario, ScenarioStats
+
+# Scenario versioning with copy-on-write storage.
+#
+# A version created from a parent stores only what changed in `changes`:
+#   system_prompt  word-level edit script against the parent's prompt: a list
+#                  of [start, end] token ranges to copy and literal strings
+#   participants   {"length": n, "set": {"<index>": {changed fields}}}
+#   settings       {"set": {changed keys}, "unset": [removed keys]}
+# The content columns of such a version are NULL. Every SNAPSHOT_INTERVAL
+# hops a version stores the full values instead (changes is NULL), so resolving
+# any version reads at most that many rows. Versions never change once created,
+# which makes resolved versions safe to cache.
+
+SNAPSHOT_INTERVAL = 10
+RESOLVED_CACHE_SIZE = 256
+VERSION_NUMBER_ATTEMPTS = 5
+
+_TOKEN_PATTERN = re.compile(r"\s+|\S+")
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text)
+
+def _diff_text(base: str, new: str) -> List[Any]:
+    base_tokens = _tokens(base)
+    matcher = SequenceMatcher(None, base_tokens, _tokens(new), autojunk=False)
+    script: List[Any] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            script.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            script.append("".join(matcher.b[j1:j2]))
+    return script
+
+def _patch_text(base: str, script: List[Any]) -> str:
+    base_tokens = _tokens(base)
+    return "".join(
+        "".join(base_tokens[item[0]:item[1]]) if isinstance(item, list) else item
+        for item in script
+    )
+
+def compute_changes(base: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """Encode how `new` differs from `base` (both resolved); empty if identical"""
+    changes: Dict[str, Any] = {}
+
+    if new["system_prompt"] != base["system_prompt"]:
+        changes["system_prompt"] = _diff_text(base["system_prompt"], new["system_prompt"])
+
+    if new["participants"] != base["participants"]:
+        changed = {}
+        for index, participant in enumerate(new["participants"]):
+            previous = base["participants"][index] if index < len(base["participants"]) else {}
+            fields = {key: value for key, value in participant.items() if previous.get(key) != value}
+            if fields:
+                changed[str(index)] = fields
+        changes["participants"] = {"length": len(new["participants"]), "set": changed}
+
+    if new["settings"] != base["settings"]:
+        changes["settings"] = {
+            "set": {key: value for key, value in new["settings"].items() if base["settings"].get(key) != value},
+            "unset": [key for key in base["settings"] if key not in new["settings"]],
+        }
+
+    return changes
+
+def apply_changes(base: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild a version's content from its parent's resolved content and its changes"""
+    resolved = dict(base)
+
+    if "system_prompt" in changes:
+        resolved["system_prompt"] = _patch_text(base["system_prompt"], changes["system_prompt"])
+
+    if "participants" in changes:
+        patch = changes["participants"]
+        participants = []
+        for index in range(patch["length"]):
+            fields = patch["set"].get(str(index))
+            if index < len(base["participants"]):
+                participant = {**base["participants"][index], **(fields or {})}
+            else:
+                participant = dict(fields)
+            participants.append(participant)
+        resolved["participants"] = participants
+
+    if "settings" in changes:
+        settings = {
+            key: value for key, value in base["settings"].items()
+            if key not in changes["settings"]["unset"]
+        }
+        settings.update(changes["settings"]["set"])
+        resolved["settings"] = settings
+
+    return resolved
+
+class _ResolvedCache:
+    """LRU of resolved version content and its distance from a snapshot"""
+
+    def __init__(self, max_entries: int = RESOLVED_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[uuid.UUID, Tuple[Dict[str, Any], int]]" = OrderedDict()
+
+    def get(self, scenario_id: uuid.UUID) -> Optional[Tuple[Dict[str, Any], int]]:
+        entry = self._entries.get(scenario_id)
+        if entry is not None:
+            self._entries.move_to_end(scenario_id)
+        return entry
+
+    def put(self, scenario_id: uuid.UUID, content: Dict[str, Any], depth: int):
+        self._entries[scenario_id] = (content, depth)
+        self._entries.move_to_end(scenario_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+resolved_cache = _ResolvedCache()
+
+def _snapshot_content(scenario: Scenario) -> Dict[str, Any]:
+    return {
+        "participants": scenario._participants,
+        "system_prompt": scenario._system_prompt,
+        "settings": scenario._settings,
+    }
+
+def _resolve_with_depth(db: Session, scenario: Scenario) -> Tuple[Dict[str, Any], int]:
+    if scenario.changes is None:
+        return _snapshot_content(scenario), 0
+
+    cached = resolved_cache.get(scenario.id)
+    if cached is not None:
+        return cached
+
+    # Walk up to the nearest snapshot or cached ancestor, then replay the changes
+    chain = [scenario]
+    while True:
+        parent = db.get(Scenario, chain[-1].parent_id)
+        if parent.changes is None:
+            content, depth = _snapshot_content(parent), 0
+            break
+        cached = resolved_cache.get(parent.id)
+        if cached is not None:
+            content, depth = cached
+            break
+        chain.append(parent)
+
+    for version in reversed(chain):
+        content = apply_changes(content, version.changes)
+        depth += 1
+        resolved_cache.put(version.id, content, depth)
+    return content, depth
+
+def resolve_scenario(db: Session, scenario: Scenario) -> Dict[str, Any]:
+    """A version's full participants, system_prompt and settings (treat as read-only)"""
+    return _resolve_with_depth(db, scenario)[0]
+
+def create_version(db: Session, parent: Scenario, name: str, content: Dict[str, Any]) -> Scenario:
+    """Store `content` as a new version of `parent`, or return `parent` if nothing changed"""
+    parent_content, parent_depth = _resolve_with_depth(db, parent)
+    changes = compute_changes(parent_content, content)
+    if not changes and name == parent.name:
+        return parent
+
+    lineage_id = parent.lineage_id or parent.id
+    parent_id, parent_version = parent.id, parent.version
+    for attempt in range(VERSION_NUMBER_ATTEMPTS):
+        latest_version = db.query(func.max(Scenario.version)).filter(Scenario.lineage_id == lineage_id).scalar()
+        version = Scenario(
+            name=name,
+            parent_id=parent_id,
+            lineage_id=lineage_id,
+            version=(latest_version or parent_version or 1) + 1,
+        )
+        if parent_depth + 1 >= SNAPSHOT_INTERVAL:
+            version._participants = content["participants"]
+            version._system_prompt = content["system_prompt"]
+            version._settings = content["settings"]
+        else:
+            version.changes = changes
+
+        db.add(version)
+        try:
+            db.commit()
+            break
+        except IntegrityError:
+            # A concurrent edit took this number first; take the next one
+            db.rollback()
+            if attempt == VERSION_NUMBER_ATTEMPTS - 1:
+                raise
+    db.refresh(version)
+    return version
+
+def ensure_scenario_lineage(db: Session):
+    """Make scenarios created before versioning the first version of their own lineage"""
+    db.execute(update(Scenario).where(Scenario.lineage_id.is_(None)).values(lineage_id=Scenario.id))
+    db.commit()
+
+def list_versions(db: Session, scenario: Scenario) -> List[Dict[str, Any]]:
+    """Every version in a scenario's lineage, oldest first, without resolving their content"""
+    rows = db.query(
+        Scenario.id, Scenario.version, Scenario.parent_id, Scenario.name, Scenario.created_at,
+        Scenario.changes, ScenarioStats.run_count
+    ).outerjoin(ScenarioStats, ScenarioStats.scenario_id == Scenario.id).filter(
+        Scenario.lineage_id == (scenario.lineage_id or scenario.id)
+    ).order_by(Scenario.version).all()
+
+    return [
+        {
+            "id": scenario_id,
+            "version": version,
+            "parent_id": parent_id,
+            "name": name,
+            "created_at": created_at,
+            "storage": "snapshot" if changes is None else "delta",
+            "changed_fields": sorted(changes) if changes is not None else None,
+            "run_count": run_count or 0,
+        }
+        for scenario_id, version, parent_id, name, created_at, changes, run_count in rows
+    ]
+
+def diff_versions(base: Dict[str, Any], other: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Field-level differences between two versions' resolved content (and names)"""
+    differences = []
+
+    def record(path: str, before: Any, after: Any):
+        if before != after:
+            differences.append({"path": path, "before": before, "after": after})
+
+    record("name", base.get("name"), other.get("name"))
+    record("system_prompt", base["system_prompt"], other["system_prompt"])
+
+    for key in sorted(set(base["settings"]) | set(other["settings"])):
+        record(f"settings.{key}", base["settings"].get(key), other["settings"].get(key))
+
+    for index in range(max(len(base["participants"]), len(other["participants"]))):
+        before = base["participants"][index] if index < len(base["participants"]) else None
+        after = other["participants"][index] if index < len(other["participants"]) else None
+        if before is None or after is None:
+            record(f"participants[{index}]", before, after)
+            continue
+        for key in sorted(set(before) | set(after)):
+            record(f"participants[{index}].{key}", before.get(key), after.get(key))
+
+    return differences